@@ -1,95 +1,248 @@
 #!/usr/bin/env python3
 import sqlite3
 import os
+from google.api_core.exceptions import NotFound
 from google.cloud import bigquery
 from google.oauth2 import service_account
-from datetime import datetime, timedelta
-import sys
+from datetime import datetime, timedelta, timezone
 
 # Configuration
 SQLITE_DB_PATH = 'podcast_transcriber/db.sqlite3'
 BIGQUERY_TABLE_ID = ''
+BIGQUERY_STAGING_TABLE_ID = ''  # Defaults to BIGQUERY_TABLE_ID with a _staging suffix
 CREDENTIALS_PATH = ''
-LAST_SYNC_FILE = 'last_sync_time.txt'
+LAST_SYNC_FILE = 'last_synced_change.txt'
+LEGACY_SYNC_FILE = 'last_sync_time.txt'  # Position of the earlier append-only export
 
-# Initialize BigQuery client
-credentials = service_account.Credentials.from_service_account_file(
-    CREDENTIALS_PATH, scopes=["https://www.googleapis.com/auth/cloud-platform"],
-)
-bq_client = bigquery.Client(credentials=credentials, project=credentials.project_id)
+BATCH_SIZE = 1000  # Changes applied per staged load and MERGE
+CHANGE_RETENTION_DAYS = 7  # Synced changes are kept this long, then deleted
+
+TRANSCRIPT_TABLE = 'podcast_transcriber_app_transcript'
+CHANGE_TABLE = 'podcast_transcriber_app_transcriptchange'
+
+SCHEMA = [
+    ('id', 'INT64'),
+    ('podcast_name', 'STRING'),
+    ('episode_title', 'STRING'),
+    ('transcript_text', 'STRING'),
+    ('created_at', 'TIMESTAMP'),
+    ('publication_date', 'TIMESTAMP'),
+    ('is_preview', 'BOOL'),
+    ('updated_at', 'TIMESTAMP'),
+]
+COLUMNS = [name for name, _ in SCHEMA]
+DELETED_COLUMN = '_deleted'
+
+
+def get_bigquery_client():
+    """Create a BigQuery client from the service account credentials."""
+    credentials = service_account.Credentials.from_service_account_file(
+        CREDENTIALS_PATH, scopes=["https://www.googleapis.com/auth/cloud-platform"],
+    )
+    return bigquery.Client(credentials=credentials, project=credentials.project_id)
 
 def connect_to_sqlite():
     """Connect to the SQLite database."""
     return sqlite3.connect(SQLITE_DB_PATH)
 
-def fetch_new_data(sqlite_conn, last_sync_time):
-    """Fetch new data from SQLite database."""
-    cursor = sqlite_conn.cursor()
-    query = f"""
-    SELECT * FROM podcast_transcriber_app_transcript
-    WHERE created_at > '{last_sync_time}'
-    ORDER BY created_at ASC
+def fetch_changes(sqlite_conn, last_change_id, limit=BATCH_SIZE):
+    """Fetch the changes recorded after the last synced one, oldest first."""
+    cursor = sqlite_conn.execute(
+        f"SELECT id, transcript_id FROM {CHANGE_TABLE} WHERE id > ? ORDER BY id ASC LIMIT ?",
+        (last_change_id, limit),
+    )
+    return cursor.fetchall()
+
+def fetch_transcript_ids(sqlite_conn, after_id, limit=BATCH_SIZE):
+    """Fetch the ids of finished transcripts after the given one, in order."""
+    cursor = sqlite_conn.execute(
+        f"SELECT id FROM {TRANSCRIPT_TABLE} WHERE id > ? AND is_preview = 0 ORDER BY id ASC LIMIT ?",
+        (after_id, limit),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+def fetch_latest_change(sqlite_conn):
+    """Fetch the id of the latest recorded change, or 0 if there is none."""
+    return sqlite_conn.execute(f"SELECT MAX(id) FROM {CHANGE_TABLE}").fetchone()[0] or 0
+
+def fetch_transcripts(sqlite_conn, transcript_ids):
+    """Fetch the current rows of transcripts, keyed by id. Previews are left out."""
+    rows = {}
+    ids = list(transcript_ids)
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        cursor = sqlite_conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM {TRANSCRIPT_TABLE} WHERE id IN ({', '.join('?' * len(chunk))}) AND is_preview = 0",
+            chunk,
+        )
+        for row in cursor.fetchall():
+            rows[row[0]] = dict(zip(COLUMNS, row))
+    return rows
+
+def build_staged_rows(sqlite_conn, changes):
+    """
+    Turn a batch of changes into one staged row per transcript.
+
+    Every change only says which transcript changed; its current row is read, so
+    several changes of a transcript collapse into one. Transcripts that no longer
+    exist, or are previews, are staged as deletions.
     """
-    cursor.execute(query)
-    columns = [description[0] for description in cursor.description]
-    rows = cursor.fetchall()
-    return columns, rows
-
-def process_rows(columns, rows):
-    """Process rows to remove numeric index if present."""
-    processed_rows = []
-    for row in rows:
-        if row and str(row[0]).isdigit():
-            processed_row = row[1:]
-            processed_columns = columns[1:]
+    transcript_ids = list(dict.fromkeys(transcript_id for _, transcript_id in changes))
+    current = fetch_transcripts(sqlite_conn, transcript_ids)
+    staged = []
+    for transcript_id in transcript_ids:
+        row = current.get(transcript_id)
+        if row is None:
+            staged.append({'id': transcript_id, DELETED_COLUMN: True})
         else:
-            processed_row = row
-            processed_columns = columns
-        processed_rows.append(dict(zip(processed_columns, processed_row)))
-    return processed_rows
-
-def append_to_bigquery(columns, rows):
-    """Append new data to BigQuery table."""
-    table = bq_client.get_table(BIGQUERY_TABLE_ID)
-    processed_rows = process_rows(columns, rows)
-    errors = bq_client.insert_rows_json(table, processed_rows)
-    if errors:
-        print(f"Errors occurred while inserting rows: {errors}")
-    else:
-        print(f"Successfully inserted {len(processed_rows)} rows into BigQuery")
-
-    return processed_rows
-
-def get_last_sync_time():
-    """Get the last sync time from file or return a default time."""
+            staged.append({**row, 'is_preview': bool(row['is_preview']), DELETED_COLUMN: False})
+    return staged
+
+def staging_table_id():
+    return BIGQUERY_STAGING_TABLE_ID or f"{BIGQUERY_TABLE_ID}_staging"
+
+def table_schema():
+    return [bigquery.SchemaField(name, field_type) for name, field_type in SCHEMA]
+
+def prepare_table(bq_client):
+    """
+    Make sure the BigQuery table has the columns of SCHEMA.
+
+    A missing table is created. A table filled by the earlier append-only export
+    has no id to merge on, and may hold several rows per transcript, so it is
+    replaced.
+
+    :return: bool, whether the table is new and needs a full load
+    """
+    try:
+        table = bq_client.get_table(BIGQUERY_TABLE_ID)
+    except NotFound:
+        table = None
+    if table is not None:
+        missing = set(COLUMNS) - {field.name for field in table.schema}
+        legacy = os.path.exists(LEGACY_SYNC_FILE) and not os.path.exists(LAST_SYNC_FILE)
+        if not missing and not legacy:
+            return False
+        reason = f"it lacks the columns {', '.join(sorted(missing))}" if missing else f"it was filled by the earlier export ({LEGACY_SYNC_FILE})"
+        print(f"Replacing {BIGQUERY_TABLE_ID} and reloading every transcript: {reason}")
+        bq_client.delete_table(BIGQUERY_TABLE_ID)
+    bq_client.create_table(bigquery.Table(BIGQUERY_TABLE_ID, schema=table_schema()))
+    return True
+
+def stage_rows(bq_client, rows):
+    """Load rows into the staging table, replacing its previous contents."""
+    schema = table_schema()
+    schema.append(bigquery.SchemaField(DELETED_COLUMN, 'BOOL'))
+    job_config = bigquery.LoadJobConfig(
+        schema=schema,
+        source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+        write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+    )
+    bq_client.load_table_from_json(rows, staging_table_id(), job_config=job_config).result()
+
+def merge_statement():
+    updates = ', '.join(f"{column} = S.{column}" for column in COLUMNS if column != 'id')
+    columns = ', '.join(COLUMNS)
+    values = ', '.join(f"S.{column}" for column in COLUMNS)
+    return f"""
+    MERGE `{BIGQUERY_TABLE_ID}` T
+    USING `{staging_table_id()}` S
+    ON T.id = S.id
+    WHEN MATCHED AND S.{DELETED_COLUMN} THEN DELETE
+    WHEN MATCHED THEN UPDATE SET {updates}
+    WHEN NOT MATCHED AND NOT S.{DELETED_COLUMN} THEN INSERT ({columns}) VALUES ({values})
+    """
+
+def merge_staged_rows(bq_client):
+    """Apply the staged rows to the BigQuery table in one MERGE."""
+    job = bq_client.query(merge_statement())
+    job.result()
+    return job.num_dml_affected_rows
+
+def get_last_synced_change():
+    """Get the id of the last change applied to BigQuery, or 0 if none was."""
     if os.path.exists(LAST_SYNC_FILE):
         with open(LAST_SYNC_FILE, 'r') as f:
-            return datetime.fromisoformat(f.read().strip())
-    return datetime.now() - timedelta(days=1)  # Default to 1 day ago
+            return int(f.read().strip() or 0)
+    return 0
 
-def save_last_sync_time(sync_time):
-    """Save the last sync time to a file."""
+def save_last_synced_change(change_id):
+    """Save the id of the last change applied to BigQuery."""
     with open(LAST_SYNC_FILE, 'w') as f:
-        f.write(sync_time)
+        f.write(str(change_id))
+
+def prune_changes(sqlite_conn, last_change_id):
+    """Delete synced changes older than CHANGE_RETENTION_DAYS."""
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=CHANGE_RETENTION_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    with sqlite_conn:
+        sqlite_conn.execute(f"DELETE FROM {CHANGE_TABLE} WHERE id <= ? AND changed_at < ?", (last_change_id, cutoff))
+
+def load_all(sqlite_conn, bq_client, batch_size=BATCH_SIZE):
+    """
+    Load every finished transcript into a new table, and save the position it is current up to.
+
+    The position is read before the transcripts, so changes made during the load
+    are applied again by the next sync, which MERGE does idempotently.
+
+    :return: int, number of transcripts loaded
+    """
+    last_change_id = fetch_latest_change(sqlite_conn)
+    loaded = last_id = 0
+    while True:
+        transcript_ids = fetch_transcript_ids(sqlite_conn, last_id, batch_size)
+        if not transcript_ids:
+            break
+        rows = build_staged_rows(sqlite_conn, [(None, transcript_id) for transcript_id in transcript_ids])
+        stage_rows(bq_client, rows)
+        merge_staged_rows(bq_client)
+        last_id = transcript_ids[-1]
+        loaded += len(transcript_ids)
+    save_last_synced_change(last_change_id)
+    if os.path.exists(LEGACY_SYNC_FILE):
+        os.remove(LEGACY_SYNC_FILE)
+        print(f"Removed {LEGACY_SYNC_FILE}; the position is now kept in {LAST_SYNC_FILE}")
+    print(f"Loaded {loaded} transcripts, current up to change {last_change_id}")
+    return loaded
+
+def sync(sqlite_conn, bq_client, batch_size=BATCH_SIZE):
+    """
+    Apply the recorded changes to BigQuery in order, one batch at a time.
+
+    The position is saved after each MERGE. A sync interrupted between the MERGE
+    and saving the position repeats that batch, which MERGE applies idempotently.
+
+    :return: int, number of changes applied
+    """
+    if prepare_table(bq_client):
+        load_all(sqlite_conn, bq_client, batch_size)
+    last_change_id = get_last_synced_change()
+    applied = 0
+    while True:
+        changes = fetch_changes(sqlite_conn, last_change_id, batch_size)
+        if not changes:
+            break
+        rows = build_staged_rows(sqlite_conn, changes)
+        stage_rows(bq_client, rows)
+        affected = merge_staged_rows(bq_client)
+        last_change_id = changes[-1][0]
+        save_last_synced_change(last_change_id)
+        applied += len(changes)
+        print(f"Applied {len(changes)} changes ({len(rows)} transcripts, {affected} rows affected) up to change {last_change_id}")
+    prune_changes(sqlite_conn, last_change_id)
+    return applied
 
 def main():
     print(f"Starting sync process at {datetime.now()}")
-    
-    last_sync_time = get_last_sync_time()
+
     sqlite_conn = connect_to_sqlite()
-    
-    columns, new_data = fetch_new_data(sqlite_conn, last_sync_time)
-    
-    if new_data:
-        added_rows = append_to_bigquery(columns, new_data)
-        last_sync_time = max(row["created_at"] for row in added_rows)
-        save_last_sync_time(last_sync_time)
-    else:
-        print("No new data to sync")
-    
-    sqlite_conn.close()
-    
+    try:
+        applied = sync(sqlite_conn, get_bigquery_client())
+        if not applied:
+            print("No new changes to sync")
+    finally:
+        sqlite_conn.close()
+
     print(f"Sync process completed at {datetime.now()}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'podcast_transcriber_app.profiling.ProfilingMiddleware',  # Only active with PROFILE_REQUEST_SAMPLE_RATE set
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,6 +79,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Readers do not block the writer in WAL mode; writers wait up to 20s for the lock
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'timeout': 20,
+            # Take the write lock when a transaction starts, so it never fails on upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
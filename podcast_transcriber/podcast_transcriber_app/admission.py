@@ -0,0 +1,209 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+
+from . import job_control
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_ENABLED = getattr(settings, 'ADMISSION_CONTROL_ENABLED', True)
+
+# Resources kept free for the rest of the host
+DISK_HEADROOM_BYTES = getattr(settings, 'ADMISSION_DISK_HEADROOM_BYTES', 1024 ** 3)
+MEMORY_HEADROOM_BYTES = getattr(settings, 'ADMISSION_MEMORY_HEADROOM_BYTES', 512 * 1024 ** 2)
+MAX_LOAD_PER_CPU = getattr(settings, 'ADMISSION_MAX_LOAD_PER_CPU', 2.0)
+
+# Footprint estimates: 16kHz mono 16-bit WAV, a 128 kbit/s download, and one whisper process
+WAV_BYTES_PER_SECOND = 16000 * 2
+COMPRESSED_BYTES_PER_SECOND = 128000 // 8
+JOB_MEMORY_BYTES = getattr(settings, 'ADMISSION_JOB_MEMORY_BYTES', 600 * 1024 ** 2)
+DEFAULT_DURATION_SECONDS = 60 * 60  # Assumed when neither the duration nor the file size is known
+
+# Deferred jobs check again this often, and give up after MAX_WAIT_SECONDS
+RETRY_SECONDS = 15
+MAX_WAIT_SECONDS = getattr(settings, 'ADMISSION_MAX_WAIT_SECONDS', 30 * 60)
+
+_reserved = {'disk': 0, 'memory': 0}
+_lock = threading.Lock()
+
+
+class AdmissionError(Exception):
+    """
+    Raised when a job could not be admitted within MAX_WAIT_SECONDS.
+    """
+
+
+def probe_content_length(audio_url):
+    """
+    Ask the server for the size of the audio file without downloading it.
+
+    :param audio_url: str, URL of the audio file
+    :return: int, size in bytes, or None if the server does not say
+    """
+    try:
+        response = requests.head(audio_url, allow_redirects=True, timeout=10)
+        response.raise_for_status()
+        return int(response.headers['Content-Length'])
+    except (requests.RequestException, KeyError, ValueError):
+        return None
+
+
+def estimate_footprint(duration=None, content_length=None):
+    """
+    Estimate the disk and memory a job needs.
+
+    :param duration: float, episode duration in seconds, or None
+    :param content_length: int, size of the audio file in bytes, or None
+    :return: dict with disk and memory in bytes
+    """
+    if not duration:
+        duration = content_length / COMPRESSED_BYTES_PER_SECOND if content_length else DEFAULT_DURATION_SECONDS
+    download_bytes = content_length or duration * COMPRESSED_BYTES_PER_SECOND
+    return {
+        'disk': int(download_bytes + duration * WAV_BYTES_PER_SECOND),
+        'memory': JOB_MEMORY_BYTES,
+    }
+
+
+def footprint_for(audio_url, duration=None):
+    """
+    Estimate the footprint of transcribing an episode, asking the server for the
+    file size if the duration is not known.
+
+    :param audio_url: str, URL of the audio file
+    :param duration: float, episode duration in seconds, or None
+    :return: dict with disk and memory in bytes
+    """
+    if not ADMISSION_ENABLED:
+        return {'disk': 0, 'memory': 0}
+    content_length = None if duration else probe_content_length(audio_url)
+    return estimate_footprint(duration, content_length)
+
+
+def available_memory():
+    """
+    Return the memory available to new processes, or None where it cannot be read.
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def scratch_usage():
+    """
+    Return the bytes currently written to the scratch directories of the jobs
+    running in this process. Other processes' jobs are not covered by this
+    process's reservations, so their files are left out.
+    """
+    total = 0
+    for scratch_dir in job_control.scratch_dirs():
+        for directory, _, file_names in os.walk(scratch_dir):
+            for file_name in file_names:
+                try:
+                    total += os.path.getsize(os.path.join(directory, file_name))
+                except OSError:
+                    pass
+    return total
+
+
+def process_memory():
+    """
+    Return the resident memory of the child processes of running jobs.
+    """
+    total = 0
+    for pid in job_control.tracked_pids():
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except (OSError, ValueError):
+            pass
+    return total
+
+
+def refusal_reason(footprint):
+    """
+    Check a footprint against live free disk, memory and CPU, minus what admitted jobs still need.
+
+    Admitted jobs have already written part of their files and loaded part of their
+    processes, which the free disk space and available memory account for, so only
+    the rest of their reservations is subtracted. Must be called with the lock held.
+
+    :return: str describing the shortage, or None if the job fits
+    """
+    os.makedirs(job_control.SCRATCH_ROOT, exist_ok=True)
+    pending_disk = max(_reserved['disk'] - scratch_usage(), 0)
+    free_disk = shutil.disk_usage(job_control.SCRATCH_ROOT).free - pending_disk - DISK_HEADROOM_BYTES
+    if footprint['disk'] > free_disk:
+        return f"Not enough disk space: needs {footprint['disk'] / 1024 ** 2:.0f} MB, {max(free_disk, 0) / 1024 ** 2:.0f} MB free"
+
+    free_memory = available_memory()
+    if free_memory is not None:
+        pending_memory = max(_reserved['memory'] - process_memory(), 0)
+        free_memory -= pending_memory + MEMORY_HEADROOM_BYTES
+        if footprint['memory'] > free_memory:
+            return f"Not enough memory: needs {footprint['memory'] / 1024 ** 2:.0f} MB, {max(free_memory, 0) / 1024 ** 2:.0f} MB free"
+
+    load = os.getloadavg()[0] / (os.cpu_count() or 1)
+    if load > MAX_LOAD_PER_CPU:
+        return f"CPU is overloaded: load {load:.1f} per core"
+    return None
+
+
+@contextmanager
+def admit(footprint, on_defer=None):
+    """
+    Wait until the host can take a job, and reserve its footprint while it runs.
+
+    :param footprint: dict from estimate_footprint
+    :param on_defer: callable taking the reason, called when the job starts waiting
+    :raises: AdmissionError if the job is not admitted within MAX_WAIT_SECONDS
+    :raises: job_control.JobCancelled if the job is cancelled while waiting
+    """
+    if not ADMISSION_ENABLED:
+        yield
+        return
+
+    deadline = time.monotonic() + MAX_WAIT_SECONDS
+    deferred = False
+    while True:
+        with _lock:
+            reason = refusal_reason(footprint)
+            if reason is None:
+                _reserved['disk'] += footprint['disk']
+                _reserved['memory'] += footprint['memory']
+                break
+        if time.monotonic() >= deadline:
+            raise AdmissionError(f"Job not admitted after {MAX_WAIT_SECONDS / 60:.0f} minutes. {reason}")
+        if not deferred:
+            deferred = True
+            logger.info(f"Deferring job: {reason}")
+            if on_defer:
+                on_defer(reason)
+        job = job_control.current_job()
+        if job is None:
+            time.sleep(RETRY_SECONDS)
+        elif job.cancelled.wait(RETRY_SECONDS):
+            job.check()
+
+    if deferred:
+        logger.info("Deferred job admitted")
+    try:
+        yield
+    finally:
+        with _lock:
+            _reserved['disk'] -= footprint['disk']
+            _reserved['memory'] -= footprint['memory']
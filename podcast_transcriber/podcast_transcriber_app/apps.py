@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class PodcastTranscriberAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'podcast_transcriber_app'
+
+    def ready(self):
+        # Configure logging and connect the signal receivers of these modules in
+        # every process, not only in those that happen to import views
+        from .logging_config import configure_logging
+        configure_logging()
+        from . import changes, dedup, http_cache, related  # noqa: F401
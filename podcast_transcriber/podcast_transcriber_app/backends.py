@@ -0,0 +1,228 @@
+import logging
+import re
+import subprocess
+import threading
+
+import requests
+from django.conf import settings
+
+from . import bootstrap, job_control, tuning
+
+logger = logging.getLogger(__name__)
+# Whisper output is logged on its own rate-limited logger, see logging_config
+line_logger = logging.getLogger('podcast_transcriber_app.transcription_lines')
+
+# Whisper.cpp output format
+WHISPER_SEGMENT_PATTERN = re.compile(r'^\[(\d+):(\d+):(\d+\.\d+) --> (\d+):(\d+):(\d+\.\d+)\]\s*(.*)$')
+
+DEFAULT_BACKEND = getattr(settings, 'TRANSCRIPTION_BACKEND', 'whisper_cpp')
+WHISPER_SERVER_URL = getattr(settings, 'WHISPER_SERVER_URL', 'http://127.0.0.1:8080')
+CTRANSLATE2_MODEL = getattr(settings, 'CTRANSLATE2_MODEL', 'base.en')
+CTRANSLATE2_PREVIEW_MODEL = getattr(settings, 'CTRANSLATE2_PREVIEW_MODEL', 'tiny.en')
+
+
+class TranscriptionError(Exception):
+    """
+    Raised when a backend fails to transcribe the audio.
+    """
+
+
+def parse_whisper_line(line):
+    """
+    Parse a line of whisper.cpp output into a timed segment.
+
+    whisper.cpp prints each segment as "[hh:mm:ss.mmm --> hh:mm:ss.mmm]  text".
+    Lines without timestamps are returned with start and end set to None.
+
+    :param line: str, stripped output line
+    :return: dict with start, end (seconds) and text
+    """
+    match = WHISPER_SEGMENT_PATTERN.match(line)
+    if not match:
+        return {'start': None, 'end': None, 'text': line}
+    h1, m1, s1, h2, m2, s2, text = match.groups()
+    return {
+        'start': int(h1) * 3600 + int(m1) * 60 + float(s1),
+        'end': int(h2) * 3600 + int(m2) * 60 + float(s2),
+        'text': text.strip(),
+    }
+
+
+class TranscriptionBackend:
+    """
+    Base class of transcription engines.
+
+    A backend turns a 16kHz mono WAV file into a stream of segments, each a dict
+    with start and end (seconds from the start of the file) and text.
+    """
+    name = None
+    preview_model = None  # Smaller, faster model used for preview transcripts, if supported
+
+    def __init__(self, model=None):
+        self.model = model
+
+    def transcribe(self, input_file, offset=0.0, duration=None):
+        """
+        Transcribe part of an audio file.
+
+        :param input_file: str, path to the WAV file
+        :param offset: float, seconds to skip from the start of the file
+        :param duration: float, seconds of audio to transcribe, or None for the rest of the file
+        :raises: TranscriptionError if the engine fails
+        :return: iterator of segment dicts, yielded as soon as they are available
+        """
+        raise NotImplementedError
+
+
+class WhisperCppBackend(TranscriptionBackend):
+    """
+    Run the whisper.cpp command line program and parse its output line by line.
+    """
+    name = 'whisper_cpp'
+    preview_model = bootstrap.PREVIEW_MODEL_PATH
+
+    def transcribe(self, input_file, offset=0.0, duration=None):
+        bootstrap.ensure_ready()
+        command = [
+            bootstrap.WHISPER_MAIN, "-m", self.model or bootstrap.MODEL_PATH,
+            "-f", input_file,
+            "--no-prints",
+            "--print-progress",
+        ] + tuning.whisper_args()
+        if offset:
+            command += ["--offset-t", str(int(offset * 1000))]
+        if duration is not None:
+            command += ["--duration", str(int(duration * 1000))]
+
+        # Wait for a free slot so concurrent jobs never run more whisper processes than the host is tuned for
+        with tuning.whisper_slot():
+            logger.info(f"Starting whisper.cpp transcription process (offset: {offset:.1f}s, duration: {duration})")
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, text=True)
+            # Cancelling the job kills the process, which ends the output and raises JobCancelled here
+            with job_control.track_process(process):
+                try:
+                    for line in process.stdout:
+                        line = line.strip()
+                        if line:
+                            line_logger.info("Transcription line: %s", line)
+                            segment = parse_whisper_line(line)
+                            if segment['start'] is None and segment['text'].startswith("output_txt"):
+                                continue
+                            if segment['text']:
+                                yield segment
+                    process.wait()
+                finally:
+                    if process.poll() is None:
+                        process.kill()
+                        process.wait()
+
+        if process.returncode != 0:
+            raise TranscriptionError(f"Transcription failed. Return code: {process.returncode}")
+
+
+class WhisperServerBackend(TranscriptionBackend):
+    """
+    Send the audio to a running whisper.cpp server (examples/server) over HTTP.
+
+    The server keeps the model loaded between requests, which avoids the model load
+    of every CLI invocation. Segments arrive together when the request completes.
+    """
+    name = 'whisper_server'
+
+    def __init__(self, model=None, url=None):
+        super().__init__(model)
+        self.url = url or WHISPER_SERVER_URL
+
+    def transcribe(self, input_file, offset=0.0, duration=None):
+        data = {'response_format': 'verbose_json', 'offset_t': int(offset * 1000)}
+        if duration is not None:
+            data['duration'] = int(duration * 1000)
+        job_control.check_cancelled()
+        logger.info(f"Sending audio to whisper.cpp server at {self.url} (offset: {offset:.1f}s, duration: {duration})")
+        try:
+            with open(input_file, 'rb') as f:
+                response = requests.post(f"{self.url}/inference", files={'file': f}, data=data, timeout=None)
+            response.raise_for_status()
+            result = response.json()
+        except (requests.RequestException, ValueError) as e:
+            raise TranscriptionError(f"Transcription failed on whisper.cpp server: {str(e)}")
+
+        job_control.check_cancelled()
+        for segment in result.get('segments', []):
+            text = segment.get('text', '').strip()
+            if text:
+                yield {'start': float(segment['start']), 'end': float(segment['end']), 'text': text}
+
+
+class CTranslate2Backend(TranscriptionBackend):
+    """
+    Transcribe with an int8-quantized CTranslate2 Whisper model through faster-whisper.
+
+    faster-whisper is an optional dependency and is only imported when this backend is used.
+    """
+    name = 'ctranslate2'
+    preview_model = CTRANSLATE2_PREVIEW_MODEL
+    _models = {}
+    _models_lock = threading.Lock()
+
+    def load_model(self):
+        model_name = self.model or CTRANSLATE2_MODEL
+        with self._models_lock:
+            if model_name not in self._models:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError:
+                    raise TranscriptionError("The ctranslate2 backend requires the faster-whisper package")
+                logger.info(f"Loading CTranslate2 model {model_name}")
+                self._models[model_name] = WhisperModel(
+                    model_name, device='cpu', compute_type='int8', cpu_threads=tuning.active_config()['threads']
+                )
+            return self._models[model_name]
+
+    def transcribe(self, input_file, offset=0.0, duration=None):
+        model = self.load_model()
+        clip = [offset] if duration is None else [offset, offset + duration]
+        with tuning.whisper_slot():
+            logger.info(f"Starting CTranslate2 transcription (offset: {offset:.1f}s, duration: {duration})")
+            try:
+                segments, _ = model.transcribe(input_file, clip_timestamps=clip, beam_size=1)
+                for segment in segments:
+                    job_control.check_cancelled()
+                    text = segment.text.strip()
+                    if text:
+                        yield {'start': segment.start, 'end': segment.end, 'text': text}
+            except job_control.JobCancelled:
+                raise
+            except Exception as e:
+                raise TranscriptionError(f"Transcription failed in CTranslate2: {str(e)}")
+
+
+BACKENDS = {backend.name: backend for backend in (WhisperCppBackend, WhisperServerBackend, CTranslate2Backend)}
+
+
+def get_backend(name=None, model=None):
+    """
+    Create the transcription backend with the given name.
+
+    :param name: str, backend name, or None for the TRANSCRIPTION_BACKEND setting
+    :param model: optional model path or name understood by the backend
+    :raises: ValueError if the backend is unknown
+    :return: TranscriptionBackend instance
+    """
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown transcription backend: {name}")
+    return BACKENDS[name](model=model)
+
+
+def get_preview_backend(name=None):
+    """
+    Create a backend that runs the preview model of the given backend.
+
+    :param name: str, backend name, or None for the TRANSCRIPTION_BACKEND setting
+    :return: TranscriptionBackend instance, or None if the backend has no preview model
+    """
+    backend_class = BACKENDS[name or DEFAULT_BACKEND]
+    if not backend_class.preview_model:
+        return None
+    return backend_class(model=backend_class.preview_model)
@@ -0,0 +1,272 @@
+import bisect
+import concurrent.futures
+import itertools
+import logging
+import os
+import shutil
+import threading
+import wave
+
+from django.conf import settings
+
+from . import backends, job_control
+
+logger = logging.getLogger(__name__)
+
+# Transcribe short episodes together, so one backend run and model load serves several of them
+BATCHING_ENABLED = getattr(settings, 'TRANSCRIPTION_BATCHING', False)
+# Only episodes up to this long join a batch
+BATCH_CLIP_MAX_SECONDS = getattr(settings, 'TRANSCRIPTION_BATCH_CLIP_MAX_SECONDS', 5 * 60)
+# A batch starts once it holds this much audio...
+BATCH_MAX_SECONDS = getattr(settings, 'TRANSCRIPTION_BATCH_MAX_SECONDS', 30 * 60)
+# ...or once its first episode has waited this long
+BATCH_MAX_WAIT_SECONDS = getattr(settings, 'TRANSCRIPTION_BATCH_MAX_WAIT_SECONDS', 10)
+
+GAP_SECONDS = 1.0  # Silence between clips, so no segment spans two episodes
+COPY_FRAMES = 1 << 16
+CANCEL_CHECK_SECONDS = 0.5
+
+
+def wav_duration(path):
+    """
+    :return: float, length of a WAV file in seconds
+    """
+    with wave.open(path, 'rb') as f:
+        return f.getnframes() / f.getframerate()
+
+
+def is_short(duration):
+    """
+    Whether an episode of the given length is transcribed in a batch.
+
+    :param duration: float, seconds, or None if unknown
+    """
+    return BATCHING_ENABLED and duration is not None and 0 < duration <= BATCH_CLIP_MAX_SECONDS
+
+
+def concatenate(clips, output_file):
+    """
+    Write WAV clips one after another into one file, separated by GAP_SECONDS of silence.
+
+    :param clips: list of paths to WAV files in the same format
+    :param output_file: str, path of the combined file
+    :raises: ValueError if the clips differ in format
+    :return: list of (start, end) seconds of each clip in the combined file
+    """
+    ranges = []
+    position = 0
+    with wave.open(output_file, 'wb') as out:
+        params = None
+        for clip in clips:
+            with wave.open(clip, 'rb') as f:
+                clip_params = (f.getnchannels(), f.getsampwidth(), f.getframerate())
+                if params is None:
+                    params = clip_params
+                    out.setnchannels(params[0])
+                    out.setsampwidth(params[1])
+                    out.setframerate(params[2])
+                    gap = b'\0' * int(GAP_SECONDS * params[2]) * params[0] * params[1]
+                elif clip_params != params:
+                    raise ValueError(f"{clip} is not in the format of the other clips")
+                if ranges:
+                    out.writeframes(gap)
+                    position += len(gap) // (params[0] * params[1])
+                start = position
+                while True:
+                    frames = f.readframes(COPY_FRAMES)
+                    if not frames:
+                        break
+                    out.writeframes(frames)
+                    position += len(frames) // (params[0] * params[1])
+                ranges.append((start / params[2], position / params[2]))
+    return ranges
+
+
+def split_segments(segments, ranges):
+    """
+    Assign segments of a combined file to the clips it was made of.
+
+    Each segment goes to the clip that contains its midpoint, or the clip before the
+    gap it falls in, with its times made relative to the start of that clip.
+
+    :param segments: list of segment dicts of the combined file
+    :param ranges: list of (start, end) seconds from concatenate
+    :return: list of lists of segment dicts, one per clip
+    """
+    starts = [start for start, _ in ranges]
+    results = [[] for _ in ranges]
+    for segment in segments:
+        if segment['start'] is None:
+            continue
+        middle = (segment['start'] + segment['end']) / 2
+        index = max(bisect.bisect_right(starts, middle) - 1, 0)
+        start, end = ranges[index]
+        results[index].append({
+            'start': min(max(segment['start'] - start, 0.0), end - start),
+            'end': min(max(segment['end'] - start, 0.0), end - start),
+            'text': segment['text'],
+        })
+    return results
+
+
+class Batch:
+    def __init__(self, engine):
+        self.engine = engine
+        self.clips = []  # (path, duration, future)
+        self.seconds = 0.0
+        self.timer = None
+
+
+class Batcher:
+    """
+    Collect short clips for a backend and transcribe them in one backend run.
+
+    The first clip opens a batch. The batch runs when it holds BATCH_MAX_SECONDS of
+    audio or BATCH_MAX_WAIT_SECONDS after it was opened, whichever comes first, in
+    its own job so that no single episode's cancellation stops it.
+    """
+
+    def __init__(self):
+        self.open = {}  # (backend name, model) -> Batch
+        self.lock = threading.Lock()
+        self.sequence = itertools.count(1)
+
+    def submit(self, engine, input_file, duration):
+        """
+        Add a clip to the open batch of its backend.
+
+        :return: Future with the list of segment dicts of the clip
+        """
+        future = concurrent.futures.Future()
+        key = (engine.name, engine.model)
+        with self.lock:
+            batch = self.open.get(key)
+            if batch is None or batch.seconds + duration > BATCH_MAX_SECONDS:
+                if batch is not None:
+                    self.close(key, batch)
+                batch = self.open[key] = Batch(engine)
+                batch.timer = threading.Timer(BATCH_MAX_WAIT_SECONDS, self.expire, args=(key, batch))
+                batch.timer.daemon = True
+                batch.timer.start()
+            batch.clips.append((input_file, duration, future))
+            batch.seconds += duration
+            if batch.seconds >= BATCH_MAX_SECONDS:
+                self.close(key, batch)
+        return future
+
+    def expire(self, key, batch):
+        with self.lock:
+            if self.open.get(key) is batch:
+                self.close(key, batch)
+
+    def close(self, key, batch):
+        del self.open[key]
+        batch.timer.cancel()
+        number = next(self.sequence)
+        threading.Thread(target=self.run, args=(batch, number), name=f"transcription-batch-{number}", daemon=True).start()
+
+    def run(self, batch, number):
+        # Episodes cancelled while the batch was open have left it
+        members = [(path, future) for path, _, future in batch.clips if future.set_running_or_notify_cancel()]
+        if not members:
+            return
+        try:
+            with job_control.run_job(f"batch-{number}") as job:
+                clips, futures = self.take_clips(members, job.scratch_dir)
+                if not clips:
+                    return
+                if len(clips) == 1:
+                    results = [list(batch.engine.transcribe(clips[0]))]
+                else:
+                    combined = job_control.scratch_file(".wav")
+                    ranges = concatenate(clips, combined)
+                    logger.info(f"Transcribing batch {number}: {len(clips)} clips, {ranges[-1][1]:.0f}s of audio")
+                    segments = list(batch.engine.transcribe(combined))
+                    results = split_segments(segments, ranges)
+        except Exception as e:
+            logger.error(f"Transcription batch {number} failed: {str(e)}")
+            error = e if isinstance(e, backends.TranscriptionError) else backends.TranscriptionError(f"Batch transcription failed: {str(e)}")
+            for _, future in members:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+    def take_clips(self, members, scratch_dir):
+        """
+        Link the clips of a batch into its own scratch directory.
+
+        A member cancelled while the batch runs removes its own scratch directory;
+        the batch keeps reading its link. A clip that is already gone is left out.
+
+        :return: tuple of (list of paths of the linked clips, list of their futures)
+        """
+        clips, futures = [], []
+        for index, (path, future) in enumerate(members):
+            target = os.path.join(scratch_dir, f"clip-{index}.wav")
+            try:
+                try:
+                    os.link(path, target)
+                except OSError:
+                    shutil.copyfile(path, target)
+            except OSError as e:
+                logger.info(f"Leaving {path} out of its batch: {str(e)}")
+                future.set_exception(backends.TranscriptionError(f"Audio file is gone: {str(e)}"))
+                continue
+            clips.append(target)
+            futures.append(future)
+        return clips, futures
+
+
+batcher = Batcher()
+
+
+class BatchedBackend(backends.TranscriptionBackend):
+    """
+    Send a whole short file to the shared batcher instead of transcribing it alone.
+
+    Parts of files are passed on to the wrapped backend. Segments arrive together
+    when the batch is done.
+    """
+
+    def __init__(self, backend, duration):
+        super().__init__(backend.model)
+        self.backend = backend
+        self.name = backend.name
+        self.duration = duration
+
+    def transcribe(self, input_file, offset=0.0, duration=None):
+        if offset or duration is not None:
+            yield from self.backend.transcribe(input_file, offset, duration)
+            return
+        future = batcher.submit(self.backend, input_file, self.duration)
+        while True:
+            try:
+                segments = future.result(timeout=CANCEL_CHECK_SECONDS)
+                break
+            except concurrent.futures.TimeoutError:
+                # A cancelled episode leaves its batch; the rest of the batch carries on
+                try:
+                    job_control.check_cancelled()
+                except job_control.JobCancelled:
+                    future.cancel()
+                    raise
+        yield from segments
+
+
+def batched(engine, input_file):
+    """
+    Wrap a backend so that a short input file is transcribed in a batch.
+
+    :param engine: TranscriptionBackend instance
+    :param input_file: str, path to the WAV file to be transcribed
+    :return: TranscriptionBackend instance, engine itself if the file is not batched
+    """
+    if not BATCHING_ENABLED:
+        return engine
+    try:
+        duration = wav_duration(input_file)
+    except (OSError, EOFError, wave.Error):
+        return engine
+    return BatchedBackend(engine, duration) if is_short(duration) else engine
@@ -0,0 +1,125 @@
+import fcntl
+import logging
+import os
+import subprocess
+import threading
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Whisper.cpp configuration
+WHISPER_CPP_REPO = "https://github.com/ggerganov/whisper.cpp.git"
+MODEL_URL = "https://huggingface.co/ggerganov/whisper.cpp/resolve/main/ggml-base.en.bin"
+MODEL_PATH = os.path.join(settings.BASE_DIR, "models", "ggml-base.en.bin")
+PREVIEW_MODEL_URL = "https://huggingface.co/ggerganov/whisper.cpp/resolve/main/ggml-tiny.en.bin"
+PREVIEW_MODEL_PATH = os.path.join(settings.BASE_DIR, "models", "ggml-tiny.en.bin")
+WHISPER_CPP_DIR = os.path.join(settings.BASE_DIR, "whisper.cpp")
+WHISPER_MAIN = os.path.join(WHISPER_CPP_DIR, "main")
+LOCK_PATH = os.path.join(settings.BASE_DIR, ".bootstrap.lock")
+
+# Set once whisper.cpp and the model are known to be in place, so jobs skip all checks
+_ready = False
+_thread_lock = threading.Lock()
+
+
+@contextmanager
+def bootstrap_lock():
+    """
+    Hold the bootstrap lock, shared by all threads and processes on this host.
+
+    The thread lock serialises callers within the process and the file lock
+    serialises processes, so only one of them builds or downloads at a time.
+    """
+    with _thread_lock:
+        with open(LOCK_PATH, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def build_whisper_cpp():
+    """
+    Clone and build whisper.cpp if the main binary is missing.
+
+    A checkout left behind by an interrupted build is reused rather than cloned again.
+
+    :raises: subprocess.CalledProcessError if cloning or building fails
+    :return: None
+    """
+    if os.path.exists(WHISPER_MAIN):
+        return
+    if not os.path.exists(WHISPER_CPP_DIR):
+        logger.info("Cloning whisper.cpp...")
+        subprocess.run(["git", "clone", WHISPER_CPP_REPO, WHISPER_CPP_DIR], check=True)
+    logger.info("Building whisper.cpp...")
+    subprocess.run(["make"], cwd=WHISPER_CPP_DIR, check=True)
+
+
+def download_model(url=MODEL_URL, path=MODEL_PATH):
+    """
+    Download a Whisper model if it doesn't exist.
+
+    The model is streamed to a temporary file and moved into place when complete,
+    so an interrupted download never leaves a truncated model behind.
+
+    :param url: str, URL of the model
+    :param path: str, where to store the model
+    :raises: RequestException if there's an error downloading the model
+    :return: None
+    """
+    if os.path.exists(path):
+        return
+    logger.info(f"Downloading Whisper model {os.path.basename(path)}...")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial_path = f"{path}.part"
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(partial_path, "wb") as f:
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                f.write(chunk)
+    os.replace(partial_path, path)
+    logger.info("Model downloaded successfully.")
+
+
+def readiness():
+    """
+    Report whether transcription jobs can run on this host.
+
+    :return: dict with ready flag and the state of each dependency
+    """
+    whisper_built = os.path.exists(WHISPER_MAIN)
+    model_downloaded = os.path.exists(MODEL_PATH)
+    return {
+        'ready': whisper_built and model_downloaded,
+        'whisper_cpp': whisper_built,
+        'model': model_downloaded,
+        'preview_model': os.path.exists(PREVIEW_MODEL_PATH),
+    }
+
+
+def ensure_ready():
+    """
+    Make sure whisper.cpp is built and the models are downloaded.
+
+    Concurrent callers share a single build and download. After the first
+    success the check is a flag lookup, with no filesystem access.
+
+    :raises: subprocess.CalledProcessError or RequestException if bootstrapping fails
+    :return: None
+    """
+    global _ready
+    if _ready:
+        return
+    with bootstrap_lock():
+        if _ready:
+            return
+        build_whisper_cpp()
+        download_model()
+        download_model(PREVIEW_MODEL_URL, PREVIEW_MODEL_PATH)
+        _ready = True
+    logger.info("Whisper.cpp and model are ready")
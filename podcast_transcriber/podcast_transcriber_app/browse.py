@@ -0,0 +1,233 @@
+import base64
+
+from django.db.models import F, Q
+from django.db.models.functions import Length, Substr
+from django.utils.dateparse import parse_datetime
+
+from .models import Transcript, TranscriptSegment
+
+# Columns read when listing transcripts; the text is never loaded
+LIST_FIELDS = ('id', 'podcast_name', 'episode_title', 'publication_date', 'created_at', 'updated_at')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+DEFAULT_TEXT_CHARS = 20000
+MAX_TEXT_CHARS = 200000
+DEFAULT_TEXT_SEGMENTS = 100
+MAX_TEXT_SEGMENTS = 1000
+STREAM_CHUNK_CHARS = 64 * 1024  # Characters read per query when streaming a transcript
+
+
+class BrowseError(ValueError):
+    """
+    Raised for invalid listing or text parameters.
+    """
+
+
+class TranscriptChanged(Exception):
+    """
+    Raised when a cursor was issued for an earlier version of a transcript.
+    """
+
+
+def encode_cursor(*parts):
+    """
+    Encode a position as an opaque cursor string.
+    """
+    raw = '|'.join('' if part is None else str(part) for part in parts).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, count):
+    """
+    Decode a cursor from encode_cursor.
+
+    :param count: int, number of parts the cursor must have
+    :raises: BrowseError if the cursor is malformed
+    :return: list of str, empty strings for None
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    except ValueError:
+        raise BrowseError(f"Invalid cursor: {cursor}")
+    parts = raw.split('|')
+    if len(parts) != count:
+        raise BrowseError(f"Invalid cursor: {cursor}")
+    return parts
+
+
+def parse_limit(value, default, maximum):
+    try:
+        return min(max(int(value), 1), maximum) if value else default
+    except ValueError:
+        raise BrowseError(f"Invalid limit: {value}")
+
+
+def parse_timestamp(value, cursor):
+    """
+    Parse a timestamp stored in a cursor.
+
+    :raises: BrowseError if the timestamp is malformed
+    :return: datetime, or None if the cursor holds none
+    """
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise BrowseError(f"Invalid cursor: {cursor}")
+    return parsed
+
+
+def list_transcripts(params):
+    """
+    List finished transcripts, newest publication first, without their text.
+
+    Pages are found by keyset on (publication_date, id): the cursor holds the last
+    row of the previous page, so every page costs the same however deep it is, and
+    transcripts added meanwhile neither repeat nor shift rows. Transcripts without
+    a publication date come last.
+
+    :param params: QueryDict with optional podcast (repeatable), limit and cursor
+    :raises: BrowseError if a parameter is invalid
+    :return: tuple of (list of dicts with LIST_FIELDS, next cursor or None)
+    """
+    limit = parse_limit(params.get('limit'), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    transcripts = Transcript.objects.filter(is_preview=False)
+    podcasts = params.getlist('podcast')
+    if podcasts:
+        transcripts = transcripts.filter(podcast_name__in=podcasts)
+    if params.get('cursor'):
+        published, transcript_id = decode_cursor(params['cursor'], 2)
+        published = parse_timestamp(published, params['cursor'])
+        try:
+            transcript_id = int(transcript_id)
+        except ValueError:
+            raise BrowseError(f"Invalid cursor: {params['cursor']}")
+        if published is None:
+            transcripts = transcripts.filter(publication_date__isnull=True, id__lt=transcript_id)
+        else:
+            transcripts = transcripts.filter(
+                Q(publication_date__lt=published)
+                | Q(publication_date=published, id__lt=transcript_id)
+                | Q(publication_date__isnull=True)
+            )
+    transcripts = transcripts.only(*LIST_FIELDS).order_by(F('publication_date').desc(nulls_last=True), '-id')
+
+    rows = []
+    for transcript in transcripts[:limit + 1]:
+        rows.append({field: getattr(transcript, field) for field in LIST_FIELDS})
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['publication_date'].isoformat() if last['publication_date'] else None, last['id'])
+    return rows, next_cursor
+
+
+def get_version(transcript_id):
+    """
+    :return: tuple of (updated_at, length of the text), or None if the transcript is unknown
+    """
+    return (
+        Transcript.objects.filter(pk=transcript_id, is_preview=False)
+        .annotate(text_length=Length('transcript_text'))
+        .values_list('updated_at', 'text_length')
+        .first()
+    )
+
+
+def check_version(cursor_version, updated_at, cursor):
+    if parse_timestamp(cursor_version, cursor) != updated_at:
+        raise TranscriptChanged("The transcript changed since the cursor was issued")
+
+
+def read_characters(transcript_id, updated_at, start, limit):
+    """
+    Read a range of characters of a transcript, without loading the rest of its text.
+
+    :return: str, empty if the transcript changed or is gone
+    """
+    chunk = (
+        Transcript.objects.filter(pk=transcript_id, updated_at=updated_at)
+        .annotate(chunk=Substr('transcript_text', start + 1, limit))
+        .values_list('chunk', flat=True)
+        .first()
+    )
+    return chunk or ''
+
+
+def text_page(transcript_id, params):
+    """
+    Read one page of a transcript's text, by characters or by segments.
+
+    Cursors carry the version of the transcript they were issued for. Once the
+    transcript is re-transcribed, its old cursors raise TranscriptChanged rather
+    than mixing text of two versions.
+
+    :param transcript_id: int, id of the transcript
+    :param params: QueryDict with optional unit ('chars' or 'segments'), start
+                   (first character, chars only), limit and cursor
+    :raises: BrowseError if a parameter is invalid
+    :raises: TranscriptChanged if the cursor is for an earlier version
+    :return: dict with the page, or None if the transcript is unknown
+    """
+    unit = params.get('unit', 'chars')
+    if unit not in ('chars', 'segments'):
+        raise BrowseError(f"Unknown unit: {unit}")
+    version = get_version(transcript_id)
+    if version is None:
+        return None
+    updated_at, text_length = version
+    page = {'transcript_id': transcript_id, 'unit': unit, 'length': text_length, 'next_cursor': None}
+
+    if unit == 'chars':
+        limit = parse_limit(params.get('limit'), DEFAULT_TEXT_CHARS, MAX_TEXT_CHARS)
+        if params.get('cursor'):
+            cursor_version, start = decode_cursor(params['cursor'], 2)
+            check_version(cursor_version, updated_at, params['cursor'])
+        else:
+            start = params.get('start', 0)
+        try:
+            start = max(int(start), 0)
+        except ValueError:
+            raise BrowseError(f"Invalid start: {start}")
+        end = min(start + limit, text_length)
+        page.update(start=start, end=end, text=read_characters(transcript_id, updated_at, start, limit) if start < end else '')
+        if end < text_length:
+            page['next_cursor'] = encode_cursor(updated_at.isoformat(), end)
+        return page
+
+    limit = parse_limit(params.get('limit'), DEFAULT_TEXT_SEGMENTS, MAX_TEXT_SEGMENTS)
+    segments = TranscriptSegment.objects.filter(transcript_id=transcript_id)
+    if params.get('cursor'):
+        cursor_version, start, segment_id = decode_cursor(params['cursor'], 3)
+        check_version(cursor_version, updated_at, params['cursor'])
+        try:
+            start, segment_id = float(start), int(segment_id)
+        except ValueError:
+            raise BrowseError(f"Invalid cursor: {params['cursor']}")
+        segments = segments.filter(Q(start__gt=start) | Q(start=start, id__gt=segment_id))
+    rows = list(segments.order_by('start', 'id').values('id', 'start', 'end', 'text')[:limit + 1])
+    if len(rows) > limit:
+        rows = rows[:limit]
+        page['next_cursor'] = encode_cursor(updated_at.isoformat(), rows[-1]['start'], rows[-1]['id'])
+    page['segments'] = [{'start': row['start'], 'end': row['end'], 'text': row['text']} for row in rows]
+    return page
+
+
+def stream_text(transcript_id, updated_at, text_length, start=0):
+    """
+    Yield the text of a transcript in STREAM_CHUNK_CHARS pieces, one query each.
+
+    The stream stops early if the transcript changes while it is read.
+    """
+    position = start
+    while position < text_length:
+        chunk = read_characters(transcript_id, updated_at, position, STREAM_CHUNK_CHARS)
+        if not chunk:
+            return
+        yield chunk
+        position += len(chunk)
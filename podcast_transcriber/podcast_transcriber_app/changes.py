@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Transcript, TranscriptChange
+
+
+# Changes are written in the transaction of the change itself, so the change log
+# never misses a committed change nor records one that was rolled back.
+
+@receiver(post_save, sender=Transcript)
+def on_transcript_saved(sender, instance, **kwargs):
+    TranscriptChange.objects.create(transcript_id=instance.pk, operation='upsert')
+
+
+@receiver(post_delete, sender=Transcript)
+def on_transcript_deleted(sender, instance, **kwargs):
+    TranscriptChange.objects.create(transcript_id=instance.pk, operation='delete')
+
@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import re
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import LSHBucket, MinHashSignature, Transcript
+
+logger = logging.getLogger(__name__)
+
+DEDUP_ENABLED = getattr(settings, 'DUPLICATE_DETECTION_ENABLED', True)
+
+# MinHash configuration
+SHINGLE_SIZE = 3  # Words per shingle; short shingles tolerate the word errors of different models
+NUM_PERMUTATIONS = 128
+PRIME = 4294967311  # Smallest prime above 2**32
+_rng = np.random.default_rng(20240101)  # Fixed seed: signatures must be comparable across processes
+PERM_A = _rng.integers(1, 2 ** 31, NUM_PERMUTATIONS, dtype=np.uint64)
+PERM_B = _rng.integers(0, 2 ** 31, NUM_PERMUTATIONS, dtype=np.uint64)
+SHINGLE_CHUNK = 4096  # Shingles hashed per block to keep memory flat on long transcripts
+
+# LSH bands and rows per signature kind. Full transcripts are compared by Jaccard
+# similarity (candidate threshold about 0.7); openings by containment of a short
+# prefix in a longer one, which needs a lower threshold (about 0.4).
+BANDS = {'full': (16, 8), 'opening': (32, 4)}
+
+# A transcript at least this similar to an earlier one is flagged as its duplicate
+DUPLICATE_THRESHOLD = getattr(settings, 'DUPLICATE_THRESHOLD', 0.8)
+
+# Early abort: once this many words of a new episode are transcribed, they are looked up
+# in the openings (first OPENING_WORDS * 2 words) of stored transcripts.
+OPENING_WORDS = 600
+ABORT_CONTAINMENT = getattr(settings, 'DUPLICATE_ABORT_CONTAINMENT', 0.8)
+
+
+def normalize_words(text):
+    """
+    Lower-case the text and split it into words, ignoring punctuation.
+    """
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def shingle_hashes(words):
+    """
+    Hash every run of SHINGLE_SIZE consecutive words.
+
+    :param words: list of normalized words
+    :return: numpy uint64 array of distinct 32-bit shingle hashes
+    """
+    count = len(words) - SHINGLE_SIZE + 1
+    if count <= 0:
+        return np.array([], dtype=np.uint64)
+    hashes = [zlib.crc32(' '.join(words[i:i + SHINGLE_SIZE]).encode()) for i in range(count)]
+    return np.unique(np.array(hashes, dtype=np.uint64))
+
+
+def minhash(shingles):
+    """
+    Compute the MinHash signature of a set of shingle hashes.
+
+    Each permutation is a universal hash (a * x + b) mod PRIME; all values stay below
+    2**64, so the arithmetic is exact in uint64.
+
+    :param shingles: numpy uint64 array from shingle_hashes
+    :return: numpy uint32 array of NUM_PERMUTATIONS minimum hashes
+    """
+    signature = np.full(NUM_PERMUTATIONS, PRIME, dtype=np.uint64)
+    for start in range(0, len(shingles), SHINGLE_CHUNK):
+        chunk = shingles[start:start + SHINGLE_CHUNK]
+        permuted = (PERM_A[:, None] * chunk[None, :] + PERM_B[:, None]) % np.uint64(PRIME)
+        signature = np.minimum(signature, permuted.min(axis=1))
+    return signature.astype(np.uint32)
+
+
+def band_buckets(signature, kind):
+    """
+    Hash each band of the signature into an LSH bucket.
+
+    :return: list of (band, bucket) pairs
+    """
+    bands, rows = BANDS[kind]
+    buckets = []
+    for band in range(bands):
+        digest = hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest()
+        buckets.append((band, int.from_bytes(digest, 'big', signed=True)))
+    return buckets
+
+
+def similarity(signature, other):
+    """
+    Estimate the Jaccard similarity of two sets from their signatures.
+    """
+    return float(np.mean(signature == other))
+
+
+def containment(jaccard, size, other_size):
+    """
+    Estimate the fraction of a set contained in another from their Jaccard similarity and sizes.
+    """
+    if not size:
+        return 0.0
+    return min(1.0, jaccard * (size + other_size) / ((1 + jaccard) * size))
+
+
+def candidates(kind, signature):
+    """
+    Find stored signatures sharing at least one LSH bucket with a signature.
+
+    :return: list of MinHashSignature objects
+    """
+    query = Q()
+    for band, bucket in band_buckets(signature, kind):
+        query |= Q(band=band, bucket=bucket)
+    signature_ids = LSHBucket.objects.filter(query, kind=kind).values_list('signature_id', flat=True).distinct()
+    return list(MinHashSignature.objects.filter(id__in=signature_ids).select_related('transcript'))
+
+
+def store_signature(transcript, kind, words):
+    """
+    Store the signature of some words of a transcript, with its LSH buckets.
+
+    :return: tuple of (MinHashSignature, numpy signature), or (None, None) for too few words
+    """
+    shingles = shingle_hashes(words)
+    if not len(shingles):
+        return None, None
+    signature = minhash(shingles)
+    stored = MinHashSignature.objects.create(
+        transcript=transcript, kind=kind, signature=signature.tobytes(), shingle_count=len(shingles)
+    )
+    LSHBucket.objects.bulk_create([
+        LSHBucket(signature=stored, kind=kind, band=band, bucket=bucket)
+        for band, bucket in band_buckets(signature, kind)
+    ])
+    return stored, signature
+
+
+def index_transcript(transcript_id):
+    """
+    Add a transcript to the duplicate index, or refresh its entry, and flag it if it
+    nearly duplicates an earlier transcript.
+
+    Preview and empty transcripts are removed from the index.
+
+    :param transcript_id: int, primary key of the transcript
+    :return: MinHashSignature of the full transcript, or None if it is not indexed
+    """
+    transcript = Transcript.objects.filter(pk=transcript_id).first()
+    if transcript is None:
+        return None
+    with transaction.atomic():
+        MinHashSignature.objects.filter(transcript=transcript).delete()
+        if transcript.is_preview or not transcript.transcript_text:
+            return None
+        words = normalize_words(transcript.transcript_text)
+        full, signature = store_signature(transcript, 'full', words)
+        store_signature(transcript, 'opening', words[:OPENING_WORDS * 2])
+        if full is None:
+            return None
+
+        best, best_similarity = None, 0.0
+        for candidate in candidates('full', signature):
+            if candidate.transcript_id >= transcript.pk:
+                continue  # Only earlier transcripts can be the original
+            score = similarity(signature, np.frombuffer(candidate.signature, dtype=np.uint32))
+            if score > best_similarity:
+                best, best_similarity = candidate.transcript, score
+        if best is not None and best_similarity >= DUPLICATE_THRESHOLD:
+            full.duplicate_of = best
+            full.similarity = best_similarity
+            full.save(update_fields=['duplicate_of', 'similarity'])
+            logger.warning(f"{transcript} looks like a duplicate of {best} (similarity {best_similarity:.2f})")
+    return full
+
+
+def find_duplicate_opening(text, podcast_name, episode_title):
+    """
+    Look up the first minutes of a new episode in the openings of stored transcripts.
+
+    :param text: str, text transcribed so far
+    :param podcast_name: str, podcast of the new episode
+    :param episode_title: str, title of the new episode, excluded from the search
+    :return: tuple of (Transcript, containment), or None if no opening contains the text
+    """
+    shingles = shingle_hashes(normalize_words(text))
+    if not len(shingles):
+        return None
+    signature = minhash(shingles)
+    best, best_containment = None, 0.0
+    for candidate in candidates('opening', signature):
+        transcript = candidate.transcript
+        if transcript.podcast_name == podcast_name and transcript.episode_title == episode_title:
+            continue
+        jaccard = similarity(signature, np.frombuffer(candidate.signature, dtype=np.uint32))
+        score = containment(jaccard, len(shingles), candidate.shingle_count)
+        if score > best_containment:
+            best, best_containment = transcript, score
+    if best is None or best_containment < ABORT_CONTAINMENT:
+        return None
+    return best, best_containment
+
+
+@receiver(post_save, sender=Transcript)
+def on_transcript_saved(sender, instance, **kwargs):
+    """
+    Keep the duplicate index up to date. Indexing errors never fail the save.
+    """
+    if not DEDUP_ENABLED:
+        return
+
+    def update_index():
+        try:
+            index_transcript(instance.pk)
+        except Exception as e:
+            logger.error(f"Error indexing transcript for duplicate detection: {str(e)}", exc_info=True)
+
+    transaction.on_commit(update_index)
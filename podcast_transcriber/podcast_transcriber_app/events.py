@@ -0,0 +1,221 @@
+import collections
+import itertools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+# Consecutive transcription_text events are sent as one event once this much time
+# has passed since the first of them, or once this many have been collected
+COALESCE_SECONDS = getattr(settings, 'SSE_COALESCE_SECONDS', 1.0)
+COALESCE_MAX_EVENTS = getattr(settings, 'SSE_COALESCE_MAX_EVENTS', 50)
+
+# Events kept per episode for clients resuming with Last-Event-ID
+EVENT_LOG_SIZE = getattr(settings, 'SSE_EVENT_LOG_SIZE', 500)
+# How long the log of an episode is kept after its last event
+EVENT_LOG_RETENTION_SECONDS = getattr(settings, 'SSE_EVENT_LOG_RETENTION_SECONDS', 600)
+
+KEEPALIVE_SECONDS = 20
+RETRY_MILLISECONDS = 3000  # How long browsers wait before reconnecting
+
+COALESCED_TYPE = 'transcription_text'
+
+
+def format_event(data, event_id=None):
+    """
+    Format an SSE message.
+
+    :param data: dict, message
+    :param event_id: int, id the browser sends back as Last-Event-ID when it reconnects
+    :return: str
+    """
+    message = f"data: {json.dumps(data)}\n\n"
+    if event_id is not None:
+        message = f"id: {event_id}\n{message}"
+    return message
+
+
+def parse_last_event_id(request):
+    """
+    Return the id of the last event a client received, from the Last-Event-ID header
+    sent by reconnecting browsers or a last_event_id parameter, or 0.
+    """
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class TargetState:
+    def __init__(self):
+        self.lock = threading.Lock()  # Held while delivering, to keep the target's events in order
+        self.pending = None  # (flags, texts, timer)
+        self.users = 0
+
+
+class Coalescer:
+    """
+    Merge consecutive transcription_text events to one target into a single event.
+
+    Whisper prints a line every few seconds of audio, so a long episode produces
+    thousands of events. Merged events carry the joined text and the number of
+    lines in `lines`. Any other event first sends the merged text, so events
+    arrive in order. Each target is delivered to under its own lock, so a slow
+    target only holds up its own events.
+    """
+
+    def __init__(self, deliver, interval=COALESCE_SECONDS, max_events=COALESCE_MAX_EVENTS):
+        self.deliver = deliver
+        self.interval = interval
+        self.max_events = max_events
+        self.targets = {}  # target -> TargetState, while in use or holding events
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def holding(self, target):
+        with self.lock:
+            state = self.targets.setdefault(target, TargetState())
+            state.users += 1
+        try:
+            with state.lock:
+                yield state
+        finally:
+            with self.lock:
+                state.users -= 1
+                if not state.users and state.pending is None:
+                    del self.targets[target]
+
+    def send(self, target, data):
+        """
+        Send an event, holding it back if it can be merged with the next ones.
+        """
+        if not self.interval or self.max_events <= 1:
+            self.deliver(target, data)
+            return
+        with self.holding(target) as state:
+            if data.get('type') != COALESCED_TYPE:
+                self.flush_locked(target, state)
+                self.deliver(target, data)
+                return
+            flags = {key: value for key, value in data.items() if key != 'text'}
+            if state.pending and state.pending[0] != flags:
+                self.flush_locked(target, state)
+            if state.pending is None:
+                timer = threading.Timer(self.interval, self.flush, args=(target,))
+                timer.daemon = True
+                state.pending = (flags, [], timer)
+                timer.start()
+            state.pending[1].append(data.get('text', ''))
+            if len(state.pending[1]) >= self.max_events:
+                self.flush_locked(target, state)
+
+    def flush(self, target):
+        with self.holding(target) as state:
+            self.flush_locked(target, state)
+
+    def flush_locked(self, target, state):
+        if state.pending is None:
+            return
+        flags, texts, timer = state.pending
+        state.pending = None
+        timer.cancel()
+        self.deliver(target, {**flags, 'text': ' '.join(text.strip() for text in texts), 'lines': len(texts)})
+
+
+def first_event_id(previous=None):
+    """
+    Choose the first id of a new log. Ids start from the current time in
+    microseconds, so they keep increasing even after the previous log of the
+    episode expired, and clients resuming with an old id still get new events.
+    """
+    return max(previous.last_id + 1 if previous else 1, time.time_ns() // 1000)
+
+
+class EventLog:
+    """
+    The most recent events sent for one episode, with increasing ids.
+    """
+
+    def __init__(self, first_id):
+        self.first_id = first_id
+        self.events = collections.deque(maxlen=EVENT_LOG_SIZE)
+        self.ids = itertools.count(first_id)
+        self.last_id = first_id - 1
+        self.updated = time.monotonic()
+
+
+class EventLogs:
+    """
+    Per-episode event logs of the transcriptions run by this process.
+
+    Clients read from a log instead of taking messages off a shared queue, so
+    several tabs can follow the same episode and a reconnecting client gets the
+    events it missed, as far back as the last EVENT_LOG_SIZE events.
+    """
+
+    def __init__(self):
+        self.logs = {}
+        self.condition = threading.Condition()
+
+    def reset(self, key):
+        """
+        Start a new log for a new transcription of an episode.
+
+        Ids continue from the previous log, so clients of the old transcription
+        that reconnect are not replayed events they already have.
+        """
+        with self.condition:
+            previous = self.logs.get(key)
+            self.logs[key] = EventLog(first_event_id(previous))
+            self.condition.notify_all()
+
+    def publish(self, key, data):
+        """
+        Add an event to the log of an episode and wake up its clients.
+
+        :return: int, id of the event
+        """
+        with self.condition:
+            self.expire()
+            log = self.logs.get(key)
+            if log is None:
+                log = self.logs[key] = EventLog(first_event_id())
+            event_id = next(log.ids)
+            log.events.append((event_id, data))
+            log.last_id = event_id
+            log.updated = time.monotonic()
+            self.condition.notify_all()
+            return event_id
+
+    def expire(self):
+        cutoff = time.monotonic() - EVENT_LOG_RETENTION_SECONDS
+        for key in [key for key, log in self.logs.items() if log.updated < cutoff]:
+            del self.logs[key]
+
+    def wait(self, key, last_event_id, timeout):
+        """
+        Return the events of an episode after last_event_id, waiting up to timeout
+        seconds for one if there are none yet.
+
+        :return: tuple of (list of (id, data) tuples, number of events no longer in the log)
+        """
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while True:
+                log = self.logs.get(key)
+                events = [(event_id, data) for event_id, data in log.events if event_id > last_event_id] if log else []
+                if events:
+                    # Ids of an expired or replaced log end before this log starts, so only
+                    # the ids of this log that fell out of it were missed
+                    missed = events[0][0] - max(last_event_id + 1, log.first_id)
+                    return events, missed
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], 0
+                self.condition.wait(remaining)
+
+
+logs = EventLogs()
@@ -0,0 +1,147 @@
+import base64
+import csv
+import datetime
+import hashlib
+import json
+import zlib
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Transcript
+
+EXPORT_FIELDS = ('id', 'podcast_name', 'episode_title', 'publication_date', 'created_at', 'updated_at', 'transcript_text')
+EXPORT_FORMATS = ('jsonl', 'csv')
+EXPORT_CHUNK_SIZE = 500  # Rows fetched per round trip by the database cursor
+
+
+class ExportError(ValueError):
+    """
+    Raised for invalid export parameters.
+    """
+
+
+def encode_cursor(updated_at, transcript_id):
+    """
+    Encode the position after a transcript as an opaque cursor string.
+    """
+    raw = f"{updated_at.isoformat()}|{transcript_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor from encode_cursor.
+
+    :raises: ExportError if the cursor is malformed
+    :return: tuple of (updated_at, transcript id)
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, transcript_id = raw.split('|')
+        updated_at = parse_datetime(timestamp)
+        if updated_at is None:
+            raise ValueError(timestamp)
+        return updated_at, int(transcript_id)
+    except ValueError:
+        raise ExportError(f"Invalid cursor: {cursor}")
+
+
+def parse_time(value, name):
+    """
+    Parse an ISO 8601 date or datetime query parameter.
+    """
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ExportError(f"Invalid {name}: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, datetime.timezone.utc)
+    return parsed
+
+
+def export_queryset(params):
+    """
+    Build the queryset of finished transcripts selected by the export parameters.
+
+    Transcripts are ordered by (updated_at, id), so a re-transcribed episode shows up
+    again in later incremental pulls.
+
+    :param params: QueryDict with optional since, until, podcast (repeatable) and cursor
+    :raises: ExportError if a parameter is invalid
+    :return: QuerySet of Transcript
+    """
+    transcripts = Transcript.objects.filter(is_preview=False)
+    if params.get('since'):
+        transcripts = transcripts.filter(updated_at__gte=parse_time(params['since'], 'since'))
+    if params.get('until'):
+        transcripts = transcripts.filter(updated_at__lt=parse_time(params['until'], 'until'))
+    podcasts = params.getlist('podcast')
+    if podcasts:
+        transcripts = transcripts.filter(podcast_name__in=podcasts)
+    if params.get('cursor'):
+        updated_at, transcript_id = decode_cursor(params['cursor'])
+        transcripts = transcripts.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=transcript_id))
+    return transcripts.order_by('updated_at', 'id')
+
+
+def export_etag(transcripts, export_format, encoding='identity'):
+    """
+    Compute an ETag for an export from the number and latest change of its rows.
+
+    Any new, updated or deleted transcript in the selection changes the ETag, without
+    reading the transcripts themselves. The gzip-compressed body differs from the
+    plain one, so each encoding has its own ETag.
+    """
+    summary = transcripts.aggregate(count=Count('id'), last_update=Max('updated_at'), last_id=Max('id'))
+    key = f"{export_format}|{encoding}|{transcripts.query}|{summary['count']}|{summary['last_update']}|{summary['last_id']}"
+    return f'"{hashlib.sha1(key.encode()).hexdigest()}"'
+
+
+def export_rows(transcripts):
+    """
+    Yield each transcript as a dict, with the cursor to resume after it.
+    """
+    for row in transcripts.values(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        row['cursor'] = encode_cursor(row['updated_at'], row['id'])
+        for field in ('publication_date', 'created_at', 'updated_at'):
+            if row[field] is not None:
+                row[field] = row[field].isoformat()
+        yield row
+
+
+class Echo:
+    """
+    File-like object whose write returns the value, for streaming csv.writer output.
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def stream_csv(rows):
+    writer = csv.writer(Echo())
+    columns = (*EXPORT_FIELDS, 'cursor')
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([row[column] for column in columns])
+
+
+def gzip_stream(chunks):
+    """
+    Compress a stream of text chunks into gzip bytes as it is produced.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,101 @@
+import logging
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+
+import requests
+
+from . import itunes
+
+logger = logging.getLogger(__name__)
+
+ITUNES_NAMESPACE = '{http://www.itunes.com/dtds/podcast-1.0.dtd}'
+FEED_TIMEOUT = 60  # seconds
+
+
+def parse_duration(value):
+    """
+    Parse an itunes:duration value into seconds.
+
+    Feeds use either plain seconds or "[hh:]mm:ss".
+
+    :param value: str, duration as found in the feed
+    :return: int, duration in seconds, or 0 if it cannot be parsed
+    """
+    if not value:
+        return 0
+    try:
+        seconds = 0
+        for part in value.strip().split(':'):
+            seconds = seconds * 60 + int(float(part))
+        return seconds
+    except ValueError:
+        return 0
+
+
+def lookup_feed_url(collection_id):
+    """
+    Look up the RSS feed URL of a podcast on iTunes.
+
+    :param collection_id: str, iTunes collection ID of the podcast
+    :raises: RequestException if the lookup fails
+    :return: str, feed URL or None if iTunes does not know it
+    """
+    results = itunes.get('lookup', {'id': collection_id}, itunes.BACKGROUND).get('results', [])
+    return results[0].get('feedUrl') if results else None
+
+
+def fetch_feed_episodes(feed_url):
+    """
+    Fetch all episodes listed in a podcast RSS feed.
+
+    Unlike the iTunes lookup API, which returns only the most recent episodes,
+    the feed lists the whole back catalogue.
+
+    :param feed_url: str, URL of the RSS feed
+    :raises: RequestException if the feed cannot be fetched, ET.ParseError if it is not valid XML
+    :return: list of dicts with guid, podcast_name, episode_title, audio_url,
+             publication_date (ISO 8601 string or None) and duration (seconds)
+    """
+    logger.info(f"Fetching feed {feed_url}")
+    response = requests.get(feed_url, timeout=FEED_TIMEOUT)
+    response.raise_for_status()
+    channel = ET.fromstring(response.content).find('channel')
+    if channel is None:
+        return []
+
+    podcast_name = (channel.findtext('title') or '').strip()
+    episodes = []
+    for item in channel.iter('item'):
+        enclosure = item.find('enclosure')
+        if enclosure is None or not enclosure.get('url'):
+            continue
+
+        publication_date = None
+        if item.findtext('pubDate'):
+            try:
+                publication_date = parsedate_to_datetime(item.findtext('pubDate').strip()).isoformat()
+            except (TypeError, ValueError):
+                pass
+
+        episodes.append({
+            'guid': (item.findtext('guid') or enclosure.get('url')).strip(),
+            'podcast_name': podcast_name,
+            'episode_title': (item.findtext('title') or '').strip(),
+            'audio_url': enclosure.get('url'),
+            'publication_date': publication_date,
+            'duration': parse_duration(item.findtext(f'{ITUNES_NAMESPACE}duration')),
+        })
+
+    logger.info(f"Found {len(episodes)} episodes in feed {feed_url}")
+    return episodes
+
+
+def parse_opml(path):
+    """
+    Read the feed URLs from an OPML subscription list.
+
+    :param path: str, path to the OPML file
+    :return: list of feed URLs
+    """
+    tree = ET.parse(path)
+    return [outline.get('xmlUrl') for outline in tree.iter('outline') if outline.get('xmlUrl')]
@@ -0,0 +1,277 @@
+import logging
+import wave
+
+import numpy as np
+
+from .models import AudioFingerprint, TranscriptSegment
+
+logger = logging.getLogger(__name__)
+
+# Spectrogram configuration. Input audio is the 16kHz mono PCM produced by convert_audio.
+SAMPLE_RATE = 16000
+FRAME_SIZE = 1024
+HOP_SIZE = 512
+MAX_FREQUENCY_BIN = 256  # Only look at 0-4kHz, where speech and jingles carry most energy
+FREQUENCY_BANDS = [(1, 10), (10, 20), (20, 40), (40, 80), (80, 160), (160, 256)]
+CHUNK_FRAMES = 2048  # Frames processed per block to keep memory flat on long episodes
+
+# Hashing configuration
+PEAK_THRESHOLD = 1.5  # Peaks must exceed the band's mean log magnitude by this much
+FAN_OUT = 5
+TARGET_ZONE_FRAMES = 64
+
+# Matching configuration
+REFERENCE_EPISODES = 20  # Number of previous episodes of the same podcast to match against
+MIN_MATCHING_HASHES = 40
+MAX_GAP_SECONDS = 3.0
+MIN_SEGMENT_SECONDS = 10.0
+BOUNDARY_TOLERANCE_SECONDS = 0.5
+
+
+def frames_to_seconds(frames):
+    """
+    Convert a spectrogram frame index (or array of indices) to seconds.
+
+    :param frames: int or numpy array of frame indices
+    :return: float or numpy array of offsets in seconds
+    """
+    return frames * HOP_SIZE / SAMPLE_RATE
+
+
+def read_blocks(wav_file):
+    """
+    Read a 16-bit mono WAV file in blocks of CHUNK_FRAMES spectrogram frames.
+
+    Consecutive blocks overlap by FRAME_SIZE - HOP_SIZE samples, so every frame lies
+    wholly inside one block and only one block is held in memory at a time.
+
+    :param wav_file: str, path to the WAV file produced by convert_audio
+    :return: iterator of (index of the block's first frame, numpy array of samples in the range [-1, 1])
+    """
+    block_samples = (CHUNK_FRAMES - 1) * HOP_SIZE + FRAME_SIZE
+    step = CHUNK_FRAMES * HOP_SIZE
+    samples = np.empty(0, dtype=np.float32)
+    first_frame = 0
+    with wave.open(wav_file, 'rb') as wav:
+        while True:
+            data = wav.readframes(block_samples - len(samples))
+            samples = np.concatenate([samples, np.frombuffer(data, dtype=np.int16).astype(np.float32) / 32768.0])
+            if len(samples) < FRAME_SIZE:
+                return
+            yield first_frame, samples
+            if len(samples) < block_samples:
+                return
+            samples = samples[step:]
+            first_frame += CHUNK_FRAMES
+
+
+def find_peaks(blocks):
+    """
+    Find spectral peaks in the audio.
+
+    The log-magnitude spectrogram is computed block by block. For every frame we keep
+    the strongest bin in each frequency band, as long as it stands out from the band's
+    average energy in the current block.
+
+    :param blocks: iterable of (first frame index, samples) from read_blocks
+    :return: tuple of numpy arrays (frame_indices, frequency_bins), sorted by frame
+    """
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+
+    peak_frames = [np.empty(0, dtype=np.int64)]
+    peak_bins = [np.empty(0, dtype=np.int64)]
+    for chunk_start, samples in blocks:
+        frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+        spectrum = np.log1p(np.abs(np.fft.rfft(frames * window, axis=1))[:, :MAX_FREQUENCY_BIN])
+
+        for low, high in FREQUENCY_BANDS:
+            band = spectrum[:, low:high]
+            strongest = band.argmax(axis=1)
+            magnitude = band[np.arange(len(band)), strongest]
+            keep = magnitude > band.mean() + PEAK_THRESHOLD
+            peak_frames.append(np.nonzero(keep)[0] + chunk_start)
+            peak_bins.append(strongest[keep] + low)
+
+    peak_frames = np.concatenate(peak_frames)
+    peak_bins = np.concatenate(peak_bins)
+    order = np.argsort(peak_frames, kind='stable')
+    return peak_frames[order], peak_bins[order]
+
+
+def compute_fingerprint(wav_file):
+    """
+    Compute the spectral-peak hashes of an audio file.
+
+    Each peak is paired with the next few peaks in its target zone. The pair's
+    frequencies and time delta form a hash that is stable regardless of where the
+    audio appears in the episode, while the anchor frame records where it appeared.
+
+    :param wav_file: str, path to the WAV file
+    :return: tuple of numpy arrays (hashes, offsets), offsets are anchor frame indices
+    """
+    peak_frames, peak_bins = find_peaks(read_blocks(wav_file))
+
+    hashes = []
+    offsets = []
+    for distance in range(1, FAN_OUT + 1):
+        anchor_frames = peak_frames[:-distance]
+        target_frames = peak_frames[distance:]
+        delta = target_frames - anchor_frames
+        valid = (delta > 0) & (delta <= TARGET_ZONE_FRAMES)
+        hashes.append(
+            (peak_bins[:-distance][valid] << 20) | (peak_bins[distance:][valid] << 10) | delta[valid]
+        )
+        offsets.append(anchor_frames[valid])
+
+    if not hashes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    return np.concatenate(hashes).astype(np.int64), np.concatenate(offsets).astype(np.int32)
+
+
+def save_fingerprint(podcast_name, episode_title, hashes, offsets):
+    """
+    Store an episode's fingerprint in the per-podcast index.
+
+    :param podcast_name: str, name of the podcast
+    :param episode_title: str, title of the episode
+    :param hashes: numpy array of hashes
+    :param offsets: numpy array of anchor frame indices
+    :return: None
+    """
+    AudioFingerprint.objects.update_or_create(
+        podcast_name=podcast_name,
+        episode_title=episode_title,
+        defaults={
+            'hashes': hashes.astype(np.int64).tobytes(),
+            'offsets': offsets.astype(np.int32).tobytes(),
+        }
+    )
+    logger.info(f"Saved {len(hashes)} fingerprint hashes for {podcast_name} - {episode_title}")
+
+
+def _contiguous_runs(values, max_gap):
+    """
+    Split a sorted array into runs whose consecutive values are at most max_gap apart.
+
+    :param values: sorted numpy array
+    :param max_gap: maximum distance between neighbours in the same run
+    :return: list of numpy arrays
+    """
+    if len(values) == 0:
+        return []
+    breaks = np.nonzero(np.diff(values) > max_gap)[0] + 1
+    return np.split(values, breaks)
+
+
+def _match_reference(hashes, offsets, reference_hashes, reference_offsets):
+    """
+    Find time ranges of the query audio that also appear in a reference episode.
+
+    Matching hashes vote for the time offset between the two episodes; a real recurring
+    segment produces many matches sharing the same offset over a contiguous stretch.
+
+    :return: list of (query_start_frame, query_end_frame, frame_delta) tuples
+    """
+    unique_hashes, first_index = np.unique(reference_hashes, return_index=True)
+    matched = np.isin(hashes, unique_hashes)
+    if matched.sum() < MIN_MATCHING_HASHES:
+        return []
+
+    query_offsets = offsets[matched]
+    reference_positions = first_index[np.searchsorted(unique_hashes, hashes[matched])]
+    deltas = reference_offsets[reference_positions].astype(np.int64) - query_offsets
+
+    candidate_deltas, counts = np.unique(deltas, return_counts=True)
+    max_gap = MAX_GAP_SECONDS * SAMPLE_RATE / HOP_SIZE
+    min_length = MIN_SEGMENT_SECONDS * SAMPLE_RATE / HOP_SIZE
+
+    ranges = []
+    for delta in candidate_deltas[counts >= MIN_MATCHING_HASHES]:
+        aligned = np.sort(query_offsets[np.abs(deltas - delta) <= 1])
+        for run in _contiguous_runs(aligned, max_gap):
+            if len(run) >= MIN_MATCHING_HASHES and run[-1] - run[0] >= min_length:
+                ranges.append((int(run[0]), int(run[-1]), int(delta)))
+    return ranges
+
+
+def find_recurring_segments(podcast_name, episode_title, hashes, offsets):
+    """
+    Detect stretches of this episode that were already heard in earlier episodes.
+
+    Only the most recent episodes of the same podcast are compared, since recurring
+    intros, sponsor reads and outros are shared within a show and change over time.
+
+    :param podcast_name: str, name of the podcast
+    :param episode_title: str, title of the episode being transcribed
+    :param hashes: numpy array of hashes of the episode
+    :param offsets: numpy array of anchor frame indices of the episode
+    :return: list of dicts with start, end (seconds in this episode), source_episode
+             and source_start, source_end (seconds in the source episode)
+    """
+    if len(hashes) == 0:
+        return []
+
+    references = (AudioFingerprint.objects
+                  .filter(podcast_name=podcast_name)
+                  .exclude(episode_title=episode_title)
+                  .order_by('-created_at')[:REFERENCE_EPISODES])
+
+    segments = []
+    for reference in references:
+        reference_hashes = np.frombuffer(reference.hashes, dtype=np.int64)
+        reference_offsets = np.frombuffer(reference.offsets, dtype=np.int32)
+        for start, end, delta in _match_reference(hashes, offsets, reference_hashes, reference_offsets):
+            segments.append({
+                'start': float(frames_to_seconds(start)),
+                'end': float(frames_to_seconds(end)),
+                'source_episode': reference.episode_title,
+                'source_start': float(frames_to_seconds(start + delta)),
+                'source_end': float(frames_to_seconds(end + delta)),
+            })
+
+    # Keep the longest match where segments found in different references overlap
+    segments.sort(key=lambda s: s['end'] - s['start'], reverse=True)
+    selected = []
+    for segment in segments:
+        if all(segment['end'] <= s['start'] or segment['start'] >= s['end'] for s in selected):
+            selected.append(segment)
+    selected.sort(key=lambda s: s['start'])
+
+    logger.info(f"Found {len(selected)} recurring segments in {podcast_name} - {episode_title}")
+    return selected
+
+
+def reusable_segments(podcast_name, recurring_segments):
+    """
+    Look up the cached text of recurring segments.
+
+    Only whisper segments of the source episode that lie entirely inside the recurring
+    stretch are reused, so the reused range always starts and ends on a segment boundary.
+
+    :param podcast_name: str, name of the podcast
+    :param recurring_segments: list of dicts returned by find_recurring_segments
+    :return: list of dicts with start, end (seconds in this episode) and the list of
+             reused segments, each with start, end and text
+    """
+    reused = []
+    for recurring in recurring_segments:
+        shift = recurring['source_start'] - recurring['start']
+        source_segments = list(TranscriptSegment.objects.filter(
+            transcript__podcast_name=podcast_name,
+            transcript__episode_title=recurring['source_episode'],
+            start__gte=recurring['source_start'] - BOUNDARY_TOLERANCE_SECONDS,
+            end__lte=recurring['source_end'] + BOUNDARY_TOLERANCE_SECONDS,
+        ).order_by('start'))
+        if not source_segments:
+            continue
+
+        segments = [
+            {'start': max(s.start - shift, 0.0), 'end': max(s.end - shift, 0.0), 'text': s.text}
+            for s in source_segments
+        ]
+        reused.append({'start': segments[0]['start'], 'end': segments[-1]['end'], 'segments': segments})
+        logger.info(
+            f"Reusing {len(segments)} segments from {recurring['source_episode']} "
+            f"for {segments[0]['start']:.1f}s-{segments[-1]['end']:.1f}s"
+        )
+    return reused
@@ -0,0 +1,147 @@
+import hashlib
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.middleware.gzip import GZipMiddleware
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.decorators import decorator_from_middleware
+from django.utils.regex_helper import _lazy_re_compile
+
+from .models import LibraryItem, QueueItem, ResourceVersion
+
+# How long browsers may reuse iTunes-backed responses without asking again
+SEARCH_MAX_AGE = getattr(settings, 'HTTP_CACHE_SEARCH_SECONDS', 300)
+EPISODES_MAX_AGE = getattr(settings, 'HTTP_CACHE_EPISODES_SECONDS', 900)
+
+LIBRARY = 'library'
+FEEDS = 'feeds'  # Bumped when podcast feeds are refreshed
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+def accepts_encoding(request, coding):
+    """
+    Whether the client accepts a content coding, honouring q-values: "gzip;q=0"
+    refuses gzip, and "*" covers codings that are not listed.
+
+    :param coding: str, content coding such as 'gzip'
+    """
+    wildcard = False
+    for item in request.headers.get('Accept-Encoding', '').split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        name = name.strip().lower()
+        if name == coding:
+            return quality > 0
+        if name == '*':
+            wildcard = quality > 0
+    return wildcard
+
+
+def queue_key(owner):
+    return f"queue:{owner}"
+
+
+def bump(key):
+    """
+    Record a change of a resource, invalidating the validators handed out for it.
+
+    :param key: str, resource key, LIBRARY or queue_key(owner)
+    """
+    changes = {'version': F('version') + 1, 'updated_at': timezone.now()}
+    if not ResourceVersion.objects.filter(key=key).update(**changes):
+        _, created = ResourceVersion.objects.get_or_create(key=key)
+        if not created:
+            ResourceVersion.objects.filter(key=key).update(**changes)
+
+
+def current_version(key):
+    """
+    :return: tuple of (version, time of the last change), or (0, None) if it never changed
+    """
+    row = ResourceVersion.objects.filter(key=key).values_list('version', 'updated_at').first()
+    return row or (0, None)
+
+
+def version_etag(key):
+    """
+    Build an ETag from the version of a resource, without reading the resource itself.
+
+    The key is hashed in, so the versions of two queues never collide and session
+    keys are not exposed.
+    """
+    version, _ = current_version(key)
+    return hashlib.sha1(f"{key}:{version}".encode()).hexdigest()[:20]
+
+
+def library_etag(request):
+    return version_etag(LIBRARY)
+
+
+def library_last_modified(request):
+    return current_version(LIBRARY)[1]
+
+
+@receiver(post_save, sender=LibraryItem)
+@receiver(post_delete, sender=LibraryItem)
+def on_library_changed(sender, instance, **kwargs):
+    bump(LIBRARY)
+
+
+@receiver(post_save, sender=QueueItem)
+@receiver(post_delete, sender=QueueItem)
+def on_queue_changed(sender, instance, **kwargs):
+    bump(queue_key(instance.owner))
+
+
+def bump_queues(owners):
+    """
+    Record a change of the queues of some users, after bulk updates that bypass
+    the model signals.
+
+    :param owners: iterable of session keys
+    """
+    for owner in set(owners):
+        bump(queue_key(owner))
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress responses with brotli when the client accepts it and the brotli
+    package is installed, otherwise with gzip.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or len(response.content) < 200 or response.has_header('Content-Encoding'):
+            return super().process_response(request, response)
+        if not re_accepts_brotli.search(request.META.get('HTTP_ACCEPT_ENCODING', '')):
+            return super().process_response(request, response)
+        try:
+            import brotli
+        except ImportError:
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed_content = brotli.compress(response.content, quality=5)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag  # The representation changed; see GZipMiddleware
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+compress_page = decorator_from_middleware(CompressionMiddleware)
@@ -0,0 +1,248 @@
+import copy
+import heapq
+import itertools
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ITUNES_API_URL = "https://itunes.apple.com"
+REQUEST_TIMEOUT = (5, 20)  # Connect and read timeouts in seconds
+
+# Apple allows roughly 20 requests per minute per client
+REQUESTS_PER_MINUTE = getattr(settings, 'ITUNES_REQUESTS_PER_MINUTE', 20)
+BURST = getattr(settings, 'ITUNES_BURST', 5)
+MIN_REQUESTS_PER_MINUTE = 2  # The rate never drops below this after throttling
+
+# Priority classes; lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+# How long a request may wait for its turn before giving up
+MAX_WAIT_SECONDS = {INTERACTIVE: 10, BACKGROUND: 120}
+
+# Pause after a 403/429 without Retry-After, doubled on each repeat
+INITIAL_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 600
+
+
+class ItunesUnavailable(requests.RequestException):
+    """
+    Raised when the iTunes API cannot answer now: throttled, failing or too busy.
+
+    :ivar retry_after: seconds after which a retry may succeed, or None
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Governor:
+    """
+    Token bucket shared by all outbound iTunes requests of the process.
+
+    Waiting requests are served in priority order, then first come first served.
+    When iTunes throttles us, all requests pause until its Retry-After has passed
+    and the rate is halved; each success raises it again towards the configured rate.
+    """
+
+    def __init__(self, requests_per_minute, burst):
+        self.max_rate = requests_per_minute / 60.0
+        self.min_rate = MIN_REQUESTS_PER_MINUTE / 60.0
+        self.rate = self.max_rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.backoff = 0
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.condition = threading.Condition()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ticket(self, priority):
+        """
+        Create the place of a request in the queue, for acquire.
+
+        :param priority: int, INTERACTIVE or BACKGROUND
+        :return: list of [priority, sequence number]
+        """
+        return [priority, next(self.sequence)]
+
+    def acquire(self, entry, max_wait):
+        """
+        Wait for a token.
+
+        :param entry: ticket of the request
+        :param max_wait: float, seconds to wait at most
+        :raises: ItunesUnavailable if no token is available in time
+        """
+        deadline = time.monotonic() + max_wait
+        with self.condition:
+            heapq.heappush(self.waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self.refill(now)
+                    if self.waiting[0] is entry and now >= self.blocked_until and self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    if self.blocked_until > deadline:
+                        retry_after = self.blocked_until - now
+                        raise ItunesUnavailable(f"iTunes is rate limiting requests, retry in {retry_after:.0f} seconds", retry_after)
+                    if now >= deadline:
+                        raise ItunesUnavailable("Too many iTunes requests queued, try again shortly", 1 / self.rate)
+                    delay = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.05)
+                    self.condition.wait(min(delay, deadline - now))
+            finally:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+    def promote(self, entry, priority):
+        """
+        Serve a waiting request at a higher priority, for a more urgent caller sharing it.
+
+        :param entry: ticket of the request
+        :param priority: int, INTERACTIVE or BACKGROUND
+        """
+        with self.condition:
+            if priority < entry[0]:
+                entry[0] = priority
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+    def throttled(self, retry_after=None):
+        """
+        Pause all requests after a 403/429 response and lower the rate.
+
+        :param retry_after: float, seconds from the Retry-After header, or None to back off exponentially
+        :return: float, seconds until requests resume
+        """
+        with self.condition:
+            if retry_after is None:
+                self.backoff = min(self.backoff * 2 or INITIAL_BACKOFF_SECONDS, MAX_BACKOFF_SECONDS)
+                retry_after = self.backoff
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self.rate = max(self.rate / 2, self.min_rate)
+            self.tokens = 0.0
+            logger.warning(f"iTunes throttled us; pausing for {retry_after:.0f}s at {self.rate * 60:.1f} requests/minute")
+            return retry_after
+
+    def succeeded(self):
+        with self.condition:
+            self.backoff = 0
+            self.rate = min(self.rate + self.max_rate / 10, self.max_rate)
+
+
+governor = Governor(REQUESTS_PER_MINUTE, BURST)
+
+
+class _Call:
+    def __init__(self, priority):
+        self.ticket = governor.ticket(priority)
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def parse_retry_after(value):
+    """
+    Parse a Retry-After header given in seconds or as an HTTP date.
+
+    :return: float, seconds, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - timezone.now()).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def fetch(endpoint, params, priority, ticket=None):
+    """
+    Send one request to the iTunes API through the governor.
+
+    :param ticket: place in the governor's queue, from Governor.ticket, or None for a new one
+    """
+    governor.acquire(ticket or governor.ticket(priority), MAX_WAIT_SECONDS[priority])
+    url = f"{ITUNES_API_URL}/{endpoint}"
+    logger.info(f"Sending request to iTunes API: {url} {params}")
+    try:
+        response = requests.get(url, params=params, timeout=REQUEST_TIMEOUT)
+    except requests.Timeout:
+        raise ItunesUnavailable("Timed out waiting for the iTunes API")
+    except requests.RequestException as e:
+        raise ItunesUnavailable(f"Error contacting the iTunes API: {str(e)}")
+
+    if response.status_code in (403, 429):
+        retry_after = governor.throttled(parse_retry_after(response.headers.get('Retry-After')))
+        raise ItunesUnavailable(f"iTunes is rate limiting requests, retry in {retry_after:.0f} seconds", retry_after)
+    try:
+        response.raise_for_status()
+        data = response.json()
+    except requests.RequestException as e:
+        raise ItunesUnavailable(f"Error from the iTunes API: {str(e)}")
+    except ValueError as e:
+        raise ItunesUnavailable(f"Error parsing JSON response from iTunes API: {str(e)}")
+    governor.succeeded()
+    return data
+
+
+def get(endpoint, params, priority=INTERACTIVE):
+    """
+    Call the iTunes API, sharing the response of an identical request already in flight.
+
+    A caller joining a request queued at a lower priority moves it up to its own
+    priority, and waits no longer than it would for a request of its own.
+
+    :param endpoint: str, 'search' or 'lookup'
+    :param params: dict, query parameters
+    :param priority: int, INTERACTIVE for requests a user is waiting on, BACKGROUND otherwise
+    :raises: ItunesUnavailable if iTunes is throttling us, failing, or too busy
+    :return: dict, decoded JSON response
+    """
+    key = (endpoint, tuple(sorted(params.items())))
+    with _in_flight_lock:
+        call = _in_flight.get(key)
+        leader = call is None
+        if leader:
+            call = _in_flight[key] = _Call(priority)
+
+    if not leader:
+        governor.promote(call.ticket, priority)
+        if not call.done.wait(MAX_WAIT_SECONDS[priority] + sum(REQUEST_TIMEOUT)):
+            raise ItunesUnavailable("Too many iTunes requests queued, try again shortly")
+        if call.error is not None:
+            raise call.error
+        return copy.deepcopy(call.result)
+
+    try:
+        call.result = fetch(endpoint, params, priority, call.ticket)
+        return copy.deepcopy(call.result)  # Callers modify their results; keep the shared one intact
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+        call.done.set()
@@ -0,0 +1,203 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Every running job gets its own directory here, named after the owning process
+SCRATCH_ROOT = getattr(settings, 'SCRATCH_ROOT', os.path.join(tempfile.gettempdir(), 'podcast_transcriber'))
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_local = threading.local()
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job when it has been cancelled.
+    """
+
+
+class JobHandle:
+    """
+    A running job: its scratch directory, its child processes and its cancellation flag.
+    """
+
+    def __init__(self, key, scratch_dir):
+        self.key = key
+        self.scratch_dir = scratch_dir
+        self.cancelled = threading.Event()
+        self.processes = set()
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        """
+        Flag the job as cancelled and terminate its child processes.
+        """
+        self.cancelled.set()
+        with self.lock:
+            processes = list(self.processes)
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+    def check(self):
+        """
+        :raises: JobCancelled if the job has been cancelled
+        """
+        if self.cancelled.is_set():
+            raise JobCancelled(f"Job {self.key} was cancelled")
+
+
+def current_job():
+    """
+    Return the handle of the job running in this thread, or None.
+    """
+    return getattr(_local, 'job', None)
+
+
+def check_cancelled():
+    """
+    Stop the job running in this thread if it has been cancelled.
+
+    :raises: JobCancelled if the job has been cancelled
+    """
+    job = current_job()
+    if job is not None:
+        job.check()
+
+
+@contextmanager
+def run_job(key):
+    """
+    Run a job in this thread with a scratch directory that is removed afterwards.
+
+    :param key: str, identifies the job for cancel_job
+    """
+    os.makedirs(SCRATCH_ROOT, exist_ok=True)
+    job = JobHandle(key, tempfile.mkdtemp(prefix=f"{os.getpid()}-", dir=SCRATCH_ROOT))
+    with _jobs_lock:
+        _jobs[key] = job
+    _local.job = job
+    try:
+        yield job
+    finally:
+        _local.job = None
+        with _jobs_lock:
+            if _jobs.get(key) is job:
+                del _jobs[key]
+        shutil.rmtree(job.scratch_dir, ignore_errors=True)
+
+
+def scratch_file(suffix):
+    """
+    Create an empty temporary file in the current job's scratch directory.
+
+    Outside of a job the file is created in SCRATCH_ROOT and the caller removes it.
+
+    :param suffix: str, file name suffix such as ".wav"
+    :return: str, path to the file
+    """
+    job = current_job()
+    directory = job.scratch_dir if job else SCRATCH_ROOT
+    os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    os.close(fd)
+    return path
+
+
+@contextmanager
+def track_process(process):
+    """
+    Attach a child process to the current job so cancelling the job kills it.
+
+    :param process: subprocess.Popen object
+    :raises: JobCancelled on exit if the job was cancelled while the process ran
+    """
+    job = current_job()
+    if job is None:
+        yield process
+        return
+    with job.lock:
+        job.processes.add(process)
+    try:
+        if job.cancelled.is_set():
+            process.kill()
+        yield process
+    finally:
+        with job.lock:
+            job.processes.discard(process)
+    job.check()
+
+
+def scratch_dirs():
+    """
+    Return the scratch directories of the jobs running in this process.
+    """
+    with _jobs_lock:
+        return [job.scratch_dir for job in _jobs.values()]
+
+
+def tracked_pids():
+    """
+    Return the process ids of the child processes of all running jobs.
+    """
+    with _jobs_lock:
+        jobs = list(_jobs.values())
+    pids = []
+    for job in jobs:
+        with job.lock:
+            pids.extend(process.pid for process in job.processes)
+    return pids
+
+
+def cancel_job(key):
+    """
+    Cancel a job running in this process.
+
+    :param key: str, key the job was started with
+    :return: bool, whether a running job was found
+    """
+    with _jobs_lock:
+        job = _jobs.get(key)
+    if job is None:
+        return False
+    logger.info(f"Cancelling job {key}")
+    job.cancel()
+    return True
+
+
+def pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def clean_orphans():
+    """
+    Remove scratch directories left behind by processes that no longer run.
+
+    :return: int, number of directories removed
+    """
+    if not os.path.isdir(SCRATCH_ROOT):
+        return 0
+    removed = 0
+    for name in os.listdir(SCRATCH_ROOT):
+        path = os.path.join(SCRATCH_ROOT, name)
+        pid = name.split('-', 1)[0]
+        if not os.path.isdir(path) or not pid.isdigit() or pid_running(int(pid)):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        removed += 1
+    if removed:
+        logger.info(f"Removed {removed} orphaned scratch directories from {SCRATCH_ROOT}")
+    return removed
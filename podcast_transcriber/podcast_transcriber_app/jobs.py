@@ -0,0 +1,232 @@
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import persistence
+from .models import TranscriptionJob, JobEvent
+
+logger = logging.getLogger(__name__)
+
+# 'local' runs jobs in a thread of the web process, 'distributed' stores them for worker nodes
+TRANSCRIPTION_MODE = getattr(settings, 'TRANSCRIPTION_MODE', 'local')
+
+# A job whose lease is not renewed for this long is handed to another worker
+LEASE_SECONDS = getattr(settings, 'JOB_LEASE_SECONDS', 120)
+HEARTBEAT_SECONDS = LEASE_SECONDS / 4
+# Workers look for cancellation requests of their running jobs this often
+CANCEL_POLL_SECONDS = 5
+MAX_ATTEMPTS = getattr(settings, 'JOB_MAX_ATTEMPTS', 3)
+
+# Events of finished jobs are kept this long for clients that reconnect late
+EVENT_RETENTION = timedelta(hours=1)
+
+# Progress of a leased job is sent to this pseudo SSE URL and stored as JobEvents
+EVENT_TARGET_PREFIX = 'job:'
+
+
+def default_worker_id():
+    """
+    Identify this worker process across the cluster.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def event_target(job_id):
+    """
+    Return the SSE target under which progress of the job is recorded in the database.
+    """
+    return f"{EVENT_TARGET_PREFIX}{job_id}"
+
+
+def enqueue(episode_id, audio_url, podcast_name, episode_title, publication_date, backend=None):
+    """
+    Store a transcription job for the worker nodes.
+
+    :return: TranscriptionJob
+    """
+    job = TranscriptionJob.objects.create(
+        episode_id=episode_id,
+        audio_url=audio_url,
+        podcast_name=podcast_name,
+        episode_title=episode_title,
+        publication_date=publication_date or '',
+        backend=backend or '',
+    )
+    logger.info(f"Queued transcription job {job.pk} for {podcast_name} - {episode_title}")
+    return job
+
+
+def claimable(now):
+    """
+    Jobs a worker may lease: queued ones, and running ones whose lease has expired.
+    """
+    return TranscriptionJob.objects.filter(
+        Q(status='queued') | Q(status='running', lease_expires_at__lt=now),
+        attempts__lt=MAX_ATTEMPTS,
+        cancel_requested=False,
+    )
+
+
+def claim_job(worker_id):
+    """
+    Lease the oldest claimable job to a worker.
+
+    On databases with SELECT ... FOR UPDATE SKIP LOCKED (PostgreSQL, MySQL 8) the
+    row is locked, so concurrent workers skip it instead of waiting. SQLite has no
+    row locks; there the lease is a conditional UPDATE that only succeeds if the
+    job is still claimable, and a worker that loses the race tries the next job.
+
+    :param worker_id: str, identity of the worker taking the job
+    :return: TranscriptionJob, or None if no job is available
+    """
+    fail_exhausted_jobs()
+    now = timezone.now()
+    lease = {
+        'status': 'running',
+        'lease_owner': worker_id,
+        'lease_expires_at': now + timedelta(seconds=LEASE_SECONDS),
+        'updated_at': now,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = claimable(now).select_for_update(skip_locked=True).order_by('id').first()
+            if job is None:
+                return None
+            job.attempts += 1
+            for field, value in lease.items():
+                setattr(job, field, value)
+            job.save(update_fields=[*lease, 'attempts'])
+            return job
+
+    for job_id in claimable(now).order_by('id').values_list('id', flat=True)[:10]:
+        claimed = claimable(now).filter(pk=job_id).update(attempts=F('attempts') + 1, **lease)
+        if claimed:
+            return TranscriptionJob.objects.get(pk=job_id)
+    return None
+
+
+def held_lease(job_id, worker_id, attempt):
+    """
+    The job as long as it is still leased by this worker for this attempt. Once the
+    lease expires and the job is leased again, even by the same worker, the attempt
+    no longer matches.
+    """
+    return TranscriptionJob.objects.filter(pk=job_id, status='running', lease_owner=worker_id, attempts=attempt)
+
+
+def renew_lease(job_id, worker_id, attempt):
+    """
+    Extend the lease of a running job.
+
+    :param attempt: int, attempts of the job when this worker leased it
+    :return: bool, False if the lease was lost to another worker
+    """
+    now = timezone.now()
+    return bool(held_lease(job_id, worker_id, attempt).update(
+        lease_expires_at=now + timedelta(seconds=LEASE_SECONDS), updated_at=now,
+    ))
+
+
+def finish_job(job_id, worker_id, attempt, error='', cancelled=False):
+    """
+    Mark a leased job done, cancelled, or failed with the given error.
+
+    A job whose lease expired and was taken by another worker, or leased again by
+    this one, is left alone.
+
+    :param attempt: int, attempts of the job when this worker leased it
+    :return: bool, whether the job was still held by this worker
+    """
+    if cancelled:
+        status = 'cancelled'
+    else:
+        status = 'failed' if error else 'done'
+    return bool(held_lease(job_id, worker_id, attempt).update(
+        status=status,
+        error=error,
+        lease_expires_at=None,
+        updated_at=timezone.now(),
+    ))
+
+
+def request_cancel(episode_id):
+    """
+    Cancel the latest unfinished job of an episode.
+
+    A queued job is cancelled at once. A running job is flagged, and the worker
+    holding it stops it the next time it checks.
+
+    :return: bool, whether an unfinished job was found
+    """
+    job = TranscriptionJob.objects.filter(episode_id=episode_id, status__in=('queued', 'running')).order_by('-id').first()
+    if job is None:
+        return False
+    now = timezone.now()
+    if not TranscriptionJob.objects.filter(pk=job.pk, status='queued').update(status='cancelled', updated_at=now):
+        TranscriptionJob.objects.filter(pk=job.pk).update(cancel_requested=True, updated_at=now)
+    logger.info(f"Cancellation requested for transcription job {job.pk}")
+    return True
+
+
+def is_cancel_requested(job_id):
+    """
+    Return whether cancellation of a job has been requested.
+    """
+    return TranscriptionJob.objects.filter(pk=job_id, cancel_requested=True).exists()
+
+
+def fail_exhausted_jobs():
+    """
+    Give up on jobs whose lease expired after the last allowed attempt, and
+    settle cancelled jobs whose worker died before it could stop them.
+    """
+    now = timezone.now()
+    TranscriptionJob.objects.filter(status='running', lease_expires_at__lt=now, cancel_requested=True).update(
+        status='cancelled', lease_expires_at=None, updated_at=now,
+    )
+    failed = TranscriptionJob.objects.filter(
+        status='running', lease_expires_at__lt=now, attempts__gte=MAX_ATTEMPTS,
+    ).update(status='failed', error='Lease expired too many times', lease_expires_at=None, updated_at=now)
+    if failed:
+        logger.warning(f"Marked {failed} transcription jobs as failed after {MAX_ATTEMPTS} attempts")
+
+
+def record_event(target, data):
+    """
+    Store a progress event sent to a job target, for web nodes to stream.
+
+    :param target: str, target from event_target
+    :param data: dict, SSE message
+    :return: None
+    """
+    job_id = int(target[len(EVENT_TARGET_PREFIX):])
+    persistence.submit(JobEvent.objects.create, job_id=job_id, data=data)
+
+
+def latest_job(episode_id):
+    """
+    Return the most recent job of an episode, or None.
+    """
+    return TranscriptionJob.objects.filter(episode_id=episode_id).order_by('-id').first()
+
+
+def events_after(job_id, last_event_id):
+    """
+    Return the events of a job newer than the given event id.
+    """
+    return list(JobEvent.objects.filter(job_id=job_id, id__gt=last_event_id).values('id', 'data'))
+
+
+def purge_old_events():
+    """
+    Delete the events of jobs that finished more than EVENT_RETENTION ago.
+    """
+    cutoff = timezone.now() - EVENT_RETENTION
+    JobEvent.objects.filter(job__status__in=('done', 'failed', 'cancelled'), job__updated_at__lt=cutoff).delete()
@@ -0,0 +1,112 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+LOG_FILE_PATH = os.path.join(settings.BASE_DIR, 'app.log')
+LOG_FILE_MAX_BYTES = getattr(settings, 'LOG_FILE_MAX_BYTES', 10 * 1024 * 1024)
+LOG_FILE_BACKUP_COUNT = getattr(settings, 'LOG_FILE_BACKUP_COUNT', 5)
+
+# Per-stage verbosity, by logger name
+LOG_LEVELS = getattr(settings, 'LOG_LEVELS', {
+    'podcast_transcriber_app.transcription_lines': 'INFO',
+    'podcast_transcriber_app.sse': 'WARNING',
+})
+
+# Maximum records per minute for chatty loggers; the rest are counted and dropped
+LOG_RATE_LIMITS = getattr(settings, 'LOG_RATE_LIMITS', {
+    'podcast_transcriber_app.transcription_lines': 6,
+    'podcast_transcriber_app.sse': 60,
+})
+
+_listener = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as one JSON object per line.
+    """
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        if getattr(record, 'suppressed', None):
+            data['suppressed'] = record.suppressed
+        return json.dumps(data)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let at most `per_minute` records through and count the ones dropped in between.
+
+    The next record that passes carries the number of records suppressed before it.
+    """
+
+    def __init__(self, per_minute):
+        super().__init__()
+        self.interval = 60.0 / per_minute
+        self.next_allowed = 0.0
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        with self.lock:
+            if now < self.next_allowed:
+                self.suppressed += 1
+                return False
+            self.next_allowed = now + self.interval
+            record.suppressed, self.suppressed = self.suppressed, 0
+        if record.suppressed:
+            record.msg = f"{record.msg} ({record.suppressed} similar messages suppressed)"
+        return True
+
+
+def configure_logging():
+    """
+    Route all logging through a queue to a background listener thread.
+
+    Callers only put records on an in-memory queue; the listener writes them to a
+    rotating JSON log file and to the console. Safe to call more than once.
+
+    :return: None
+    """
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            LOG_FILE_PATH, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUP_COUNT
+        )
+        file_handler.setFormatter(JsonFormatter())
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s'))
+
+        log_queue = queue.Queue(-1)
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+        for name, level in LOG_LEVELS.items():
+            logging.getLogger(name).setLevel(level)
+        for name, per_minute in LOG_RATE_LIMITS.items():
+            logging.getLogger(name).addFilter(RateLimitFilter(per_minute))
+
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
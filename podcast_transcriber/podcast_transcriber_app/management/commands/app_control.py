@@ -2,6 +2,7 @@ import os
 import signal
 import subprocess
 import time
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
 
 class Command(BaseCommand):
@@ -28,6 +29,9 @@ class Command(BaseCommand):
             self.stdout.write(self.style.WARNING('Application is already running'))
             return
 
+        # Build whisper.cpp and download the model once, before any job can ask for them
+        call_command('bootstrap')
+
         command = "python manage.py runserver"
         process = subprocess.Popen(command, shell=True)
         
@@ -0,0 +1,167 @@
+import json
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from podcast_transcriber_app.models import Transcript, TranscriptSegment
+
+ARCHIVE_DIR = getattr(settings, 'PARQUET_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive'))
+STATE_FILE = '_archive_state.json'
+
+
+class Command(BaseCommand):
+    help = 'Append new and updated transcripts to a Parquet dataset partitioned by podcast and month (requires pyarrow)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archive-dir', default=ARCHIVE_DIR, help='Root directory of the Parquet dataset')
+        parser.add_argument('--segments', action='store_true', help='Also archive timed segments')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Transcripts written per batch')
+        parser.add_argument('--row-group-size', type=int, default=10000, help='Maximum rows per Parquet row group')
+        parser.add_argument('--compression', default='zstd', choices=['zstd', 'snappy', 'gzip', 'none'], help='Parquet compression codec')
+        parser.add_argument('--full', action='store_true', help='Ignore the saved position and archive every transcript')
+
+    def handle(self, *args, **options):
+        try:
+            import pyarrow as pa
+            import pyarrow.dataset as ds
+        except ImportError:
+            raise CommandError('The Parquet archive requires the pyarrow package: pip install pyarrow')
+        self.pa, self.ds = pa, ds
+        self.options = options
+
+        archive_dir = options['archive_dir']
+        os.makedirs(archive_dir, exist_ok=True)
+        state_path = os.path.join(archive_dir, STATE_FILE)
+        state = {} if options['full'] else self.load_state(state_path)
+
+        transcripts = Transcript.objects.filter(is_preview=False).order_by('updated_at', 'id')
+        if state:
+            updated_at = parse_datetime(state['updated_at'])
+            transcripts = transcripts.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=state['id']))
+
+        run_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        batch = []
+        batch_number = written = 0
+        for transcript in transcripts.iterator(chunk_size=options['batch_size']):
+            batch.append(transcript)
+            if len(batch) >= options['batch_size']:
+                self.write_batch(batch, archive_dir, f"{run_id}-{batch_number}", state_path)
+                written += len(batch)
+                batch_number += 1
+                batch = []
+        if batch:
+            self.write_batch(batch, archive_dir, f"{run_id}-{batch_number}", state_path)
+            written += len(batch)
+
+        if written:
+            self.stdout.write(self.style.SUCCESS(f"Archived {written} transcripts to {archive_dir}"))
+        else:
+            self.stdout.write('No new transcripts to archive')
+
+    def load_state(self, state_path):
+        if not os.path.exists(state_path):
+            return {}
+        with open(state_path, 'r') as f:
+            return json.load(f)
+
+    def write_batch(self, batch, archive_dir, batch_id, state_path):
+        """
+        Write a batch of transcripts (and their segments) and record the position after it.
+
+        The position is saved only once the files are written, so an interrupted run
+        repeats at most one batch.
+        """
+        pa = self.pa
+        rows = {
+            'transcript_id': [], 'podcast': [], 'month': [], 'episode_title': [], 'publication_date': [],
+            'created_at': [], 'updated_at': [], 'word_count': [], 'transcript_text': [],
+        }
+        months = {}
+        for transcript in batch:
+            month = (transcript.publication_date or transcript.created_at).strftime('%Y-%m')
+            months[transcript.id] = month
+            rows['transcript_id'].append(transcript.id)
+            rows['podcast'].append(transcript.podcast_name)
+            rows['month'].append(month)
+            rows['episode_title'].append(transcript.episode_title)
+            rows['publication_date'].append(transcript.publication_date)
+            rows['created_at'].append(transcript.created_at)
+            rows['updated_at'].append(transcript.updated_at)
+            rows['word_count'].append(len(transcript.transcript_text.split()))
+            rows['transcript_text'].append(transcript.transcript_text)
+
+        timestamp = pa.timestamp('us', tz='UTC')
+        schema = pa.schema([
+            ('transcript_id', pa.int64()),
+            ('podcast', pa.dictionary(pa.int32(), pa.string())),
+            ('month', pa.string()),
+            ('episode_title', pa.string()),
+            ('publication_date', timestamp),
+            ('created_at', timestamp),
+            ('updated_at', timestamp),
+            ('word_count', pa.int32()),
+            ('transcript_text', pa.large_string()),
+        ])
+        self.write_table(pa.Table.from_pydict(rows, schema=schema), os.path.join(archive_dir, 'transcripts'), batch_id)
+
+        if self.options['segments']:
+            segment_rows = {'transcript_id': [], 'podcast': [], 'month': [], 'updated_at': [], 'start': [], 'end': [], 'text': []}
+            podcasts = {transcript.id: transcript.podcast_name for transcript in batch}
+            # The version of the transcript the segments belong to, to tell re-transcriptions apart
+            versions = {transcript.id: transcript.updated_at for transcript in batch}
+            segments = TranscriptSegment.objects.filter(transcript_id__in=podcasts).values_list('transcript_id', 'start', 'end', 'text')
+            for transcript_id, start, end, text in segments.iterator(chunk_size=10000):
+                segment_rows['transcript_id'].append(transcript_id)
+                segment_rows['podcast'].append(podcasts[transcript_id])
+                segment_rows['month'].append(months[transcript_id])
+                segment_rows['updated_at'].append(versions[transcript_id])
+                segment_rows['start'].append(start)
+                segment_rows['end'].append(end)
+                segment_rows['text'].append(text)
+            segment_schema = pa.schema([
+                ('transcript_id', pa.int64()),
+                ('podcast', pa.dictionary(pa.int32(), pa.string())),
+                ('month', pa.string()),
+                ('updated_at', timestamp),
+                ('start', pa.float64()),
+                ('end', pa.float64()),
+                ('text', pa.string()),
+            ])
+            table = pa.Table.from_pydict(segment_rows, schema=segment_schema)
+            self.write_table(table, os.path.join(archive_dir, 'segments'), batch_id)
+
+        last = batch[-1]
+        temp_path = f"{state_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'updated_at': last.updated_at.isoformat(), 'id': last.id}, f)
+        os.replace(temp_path, state_path)
+        self.stdout.write(f"Wrote {len(batch)} transcripts (batch {batch_id})")
+
+    def write_table(self, table, base_dir, batch_id):
+        """
+        Append a table to a hive-partitioned dataset (podcast=.../month=...), one new file per partition.
+
+        The podcast and month columns are stored once per directory rather than per row;
+        read them back as dictionary columns with HivePartitioning.discover(infer_dictionary=True).
+        """
+        compression = None if self.options['compression'] == 'none' else self.options['compression']
+        self.ds.write_dataset(
+            table,
+            base_dir,
+            format='parquet',
+            partitioning=['podcast', 'month'],
+            partitioning_flavor='hive',
+            basename_template=f"part-{batch_id}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+            max_rows_per_group=self.options['row_group_size'],
+            min_rows_per_group=min(self.options['row_group_size'], 1024),
+            file_options=self.ds.ParquetFileFormat().make_write_options(
+                compression=compression,
+                write_statistics=True,
+            ),
+        )
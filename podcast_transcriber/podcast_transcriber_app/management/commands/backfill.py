@@ -0,0 +1,233 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from requests.exceptions import RequestException
+
+from podcast_transcriber_app import admission, backends, batching, bootstrap, feeds, http_cache, job_control, profiling, tuning
+from podcast_transcriber_app.models import LibraryItem, Transcript
+from podcast_transcriber_app.views import convert_and_transcribe, download_audio
+
+
+class RateLimiter:
+    """
+    Space out calls so that at most `rate` happen per minute across all threads.
+    """
+
+    def __init__(self, rate):
+        self.interval = 60.0 / rate if rate else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+class Checkpoint:
+    """
+    Record which episodes have been processed so that an interrupted backfill can resume.
+
+    The file is rewritten atomically after every episode.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.data = {'completed': [], 'failed': {}}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.data = json.load(f)
+        self.completed = set(self.data['completed'])
+
+    def is_completed(self, guid):
+        return guid in self.completed
+
+    def mark(self, guid, error=None):
+        with self.lock:
+            if error is None:
+                self.completed.add(guid)
+                self.data['completed'] = sorted(self.completed)
+                self.data['failed'].pop(guid, None)
+            else:
+                self.data['failed'][guid] = error
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(self.data, f)
+            os.replace(temp_path, self.path)
+
+
+class Command(BaseCommand):
+    help = 'Transcribe the back catalogue of podcasts from the library, feed URLs or an OPML file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--podcast', action='append', default=[], help='Collection ID or name of a library podcast (repeatable)')
+        parser.add_argument('--feed-url', action='append', default=[], help='RSS feed URL (repeatable)')
+        parser.add_argument('--opml', help='OPML file listing the feeds to backfill')
+        parser.add_argument('--library', action='store_true', help='Backfill every podcast in the library')
+        parser.add_argument('--workers', type=int, help='Number of episodes transcribed in parallel (defaults to the tuned concurrency)')
+        parser.add_argument('--backend', choices=list(backends.BACKENDS), default=backends.DEFAULT_BACKEND, help='Transcription backend')
+        parser.add_argument('--profile', choices=tuning.PROFILES, default='throughput', help='Whisper tuning profile')
+        parser.add_argument('--download-workers', type=int, default=2, help='Number of concurrent downloads')
+        parser.add_argument('--downloads-per-minute', type=float, default=10, help='Maximum download starts per minute (0 for no limit)')
+        parser.add_argument('--prefetch', type=int, default=2, help='Number of episodes downloaded ahead of transcription')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, 'backfill_checkpoint.json'), help='Checkpoint file used to resume an interrupted backfill')
+        parser.add_argument('--limit', type=int, help='Maximum number of episodes to transcribe')
+
+    def handle(self, *args, **options):
+        feed_urls = self.collect_feed_urls(options)
+        if not feed_urls:
+            raise CommandError('Nothing to backfill. Pass --podcast, --feed-url, --opml or --library.')
+
+        checkpoint = Checkpoint(options['checkpoint'])
+        episodes = self.collect_episodes(feed_urls, checkpoint)
+        if options['limit']:
+            episodes = episodes[:options['limit']]
+        if not episodes:
+            self.stdout.write(self.style.SUCCESS('All episodes are already transcribed'))
+            return
+
+        if options['backend'] == backends.WhisperCppBackend.name:
+            bootstrap.ensure_ready()
+        self.backend = options['backend']
+        config = tuning.use_profile(options['profile'])
+        if options['workers'] is None:
+            options['workers'] = config['concurrency']
+
+        self.rate_limiter = RateLimiter(options['downloads_per_minute'])
+        self.download_slots = threading.BoundedSemaphore(options['download_workers'])
+        self.transcribe_slots = threading.BoundedSemaphore(options['workers'])
+
+        total = len(episodes)
+        total_audio = sum(episode['duration'] for episode in episodes)
+        self.stdout.write(f"Backfilling {total} episodes ({total_audio / 3600:.1f} hours of audio)")
+
+        # Each thread downloads an episode and then waits for a transcription slot, so
+        # `prefetch` episodes are downloaded while `workers` episodes are transcribed.
+        executor = ThreadPoolExecutor(max_workers=options['workers'] + options['prefetch'])
+        futures = {executor.submit(self.process_episode, episode): episode for episode in episodes}
+        start_time = time.monotonic()
+        done = failed = audio_done = 0
+        try:
+            for future in as_completed(futures):
+                episode = futures[future]
+                error = future.result()
+                checkpoint.mark(episode['guid'], error)
+                done += 1
+                if error:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"[{done}/{total}] Failed: {episode['episode_title']}: {error}"))
+                else:
+                    audio_done += episode['duration']
+                    self.stdout.write(f"[{done}/{total}] Transcribed: {episode['episode_title']}")
+
+                elapsed_hours = (time.monotonic() - start_time) / 3600
+                self.stdout.write(
+                    f"    {done - failed} transcribed, {failed} failed, "
+                    f"{(done - failed) / elapsed_hours:.1f} episodes/hour, "
+                    f"{audio_done / 3600 / elapsed_hours:.2f} audio hours/hour"
+                )
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Interrupted, waiting for running episodes. Run again to resume.'))
+            executor.shutdown(wait=True, cancel_futures=True)
+            return
+        executor.shutdown()
+
+        self.stdout.write(self.style.SUCCESS(f"Backfill finished: {done - failed} transcribed, {failed} failed"))
+
+    def collect_feed_urls(self, options):
+        feed_urls = list(options['feed_url'])
+        if options['opml']:
+            feed_urls.extend(feeds.parse_opml(options['opml']))
+
+        library_items = []
+        if options['library']:
+            library_items = list(LibraryItem.objects.all())
+        for podcast in options['podcast']:
+            item = (LibraryItem.objects.filter(collection_id=podcast).first()
+                    or LibraryItem.objects.filter(name__iexact=podcast).first())
+            if not item:
+                raise CommandError(f"Podcast not found in library: {podcast}")
+            library_items.append(item)
+
+        for item in library_items:
+            if not item.feed_url:
+                try:
+                    item.feed_url = feeds.lookup_feed_url(item.collection_id)
+                except RequestException as e:
+                    # Includes ItunesUnavailable when iTunes throttles us; the other podcasts go ahead
+                    self.stdout.write(self.style.WARNING(f"Could not look up the feed of {item.name}, skipping: {str(e)}"))
+                    continue
+                if not item.feed_url:
+                    self.stdout.write(self.style.WARNING(f"No feed URL known for {item.name}, skipping"))
+                    continue
+                item.save(update_fields=['feed_url'])
+            feed_urls.append(item.feed_url)
+
+        return list(dict.fromkeys(feed_urls))
+
+    def collect_episodes(self, feed_urls, checkpoint):
+        episodes = {}
+        for feed_url in feed_urls:
+            try:
+                for episode in feeds.fetch_feed_episodes(feed_url):
+                    episodes.setdefault(episode['guid'], episode)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"Error reading feed {feed_url}: {str(e)}"))
+        if episodes:
+            http_cache.bump(http_cache.FEEDS)  # The feeds may list new episodes; rebuild the latest episodes panel
+
+        podcast_names = {episode['podcast_name'] for episode in episodes.values()}
+        transcribed = set(
+            Transcript.objects.filter(podcast_name__in=podcast_names)
+            .exclude(transcript_text='')
+            .exclude(is_preview=True)
+            .values_list('podcast_name', 'episode_title')
+        )
+
+        pending = [
+            episode for episode in episodes.values()
+            if not checkpoint.is_completed(episode['guid'])
+            and (episode['podcast_name'], episode['episode_title']) not in transcribed
+        ]
+        self.stdout.write(f"{len(episodes)} episodes found, {len(episodes) - len(pending)} already transcribed")
+        # Oldest first, so a partial backfill leaves a contiguous history
+        pending.sort(key=lambda episode: episode['publication_date'] or '')
+        return pending
+
+    def process_episode(self, episode):
+        """
+        Download and transcribe one episode.
+
+        :return: None on success, otherwise the error message
+        """
+        try:
+            footprint = admission.estimate_footprint(episode['duration'])
+            with profiling.job_profile(episode['guid'], podcast=episode['podcast_name'], episode=episode['episode_title']), \
+                    job_control.run_job(episode['guid']), admission.admit(footprint):
+                with self.download_slots, profiling.stage('download'):
+                    self.rate_limiter.wait()
+                    input_file = download_audio(episode['audio_url'])
+                # Short episodes wait for their batch rather than a slot, so batches can fill up
+                slot = contextlib.nullcontext() if batching.is_short(episode['duration']) else self.transcribe_slots
+                with slot:
+                    transcript = convert_and_transcribe(
+                        input_file, None, episode['podcast_name'], episode['episode_title'], episode['publication_date'], self.backend
+                    )
+            return None if transcript else 'Transcription failed'
+        except RequestException as e:
+            return f"Download failed: {str(e)}"
+        except Exception as e:
+            return str(e)
+        finally:
+            connections.close_all()
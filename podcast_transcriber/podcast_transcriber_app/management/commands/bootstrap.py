@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from podcast_transcriber_app import bootstrap, job_control
+
+
+class Command(BaseCommand):
+    help = 'Build whisper.cpp and download the model so transcription jobs can start immediately'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report readiness, do not build or download anything')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            try:
+                bootstrap.ensure_ready()
+            except Exception as e:
+                raise CommandError(f"Bootstrap failed: {str(e)}")
+            removed = job_control.clean_orphans()
+            if removed:
+                self.stdout.write(f"Removed {removed} orphaned scratch directories")
+
+        status = bootstrap.readiness()
+        self.stdout.write(f"whisper.cpp: {'built' if status['whisper_cpp'] else 'missing'}")
+        self.stdout.write(f"model: {'downloaded' if status['model'] else 'missing'}")
+        if status['ready']:
+            self.stdout.write(self.style.SUCCESS('Ready'))
+        else:
+            raise CommandError('Not ready')
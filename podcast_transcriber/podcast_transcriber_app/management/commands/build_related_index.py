@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from podcast_transcriber_app import related
+
+
+class Command(BaseCommand):
+    help = 'Compact the related episodes index, or rebuild it from every finished transcript'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='Index every transcript from the database')
+
+    def handle(self, *args, **options):
+        documents = related.compact(rebuild=options['rebuild'])
+        self.stdout.write(self.style.SUCCESS(f"Related episodes index holds {documents} episodes"))
@@ -0,0 +1,122 @@
+import json
+import os
+import subprocess
+import tempfile
+import time
+import wave
+
+from django.core.management.base import BaseCommand, CommandError
+
+from podcast_transcriber_app import bootstrap, tuning
+from podcast_transcriber_app.views import convert_audio
+
+
+class Command(BaseCommand):
+    help = 'Benchmark whisper.cpp thread and process counts on this host and store the best configuration'
+
+    def add_arguments(self, parser):
+        parser.add_argument('clip', help='Reference audio clip to transcribe')
+        parser.add_argument('--duration', type=int, default=60, help='Seconds of the clip to transcribe in each run')
+        parser.add_argument('--max-threads', type=int, default=os.cpu_count() or 1, help='Largest total number of threads to try')
+
+    def handle(self, *args, **options):
+        if options['max_threads'] < 1:
+            raise CommandError('--max-threads must be at least 1')
+        bootstrap.ensure_ready()
+        cpu_count = os.cpu_count()
+
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
+            wav_file = temp_wav.name
+        try:
+            convert_audio(options['clip'], wav_file)
+            with wave.open(wav_file, 'rb') as wav:
+                clip_seconds = min(wav.getnframes() / wav.getframerate(), options['duration'])
+            if clip_seconds <= 0:
+                raise CommandError('The reference clip is empty')
+
+            results = []
+            for threads, concurrency in self.candidates(options['max_threads']):
+                try:
+                    wall_time = self.benchmark(wav_file, threads, concurrency, options['duration'])
+                except CommandError as e:
+                    self.stdout.write(self.style.WARNING(f"{threads:>3} threads x {concurrency:>3} processes: {str(e)}"))
+                    continue
+                result = {
+                    'threads': threads,
+                    'concurrency': concurrency,
+                    'latency': wall_time,
+                    'throughput': concurrency * clip_seconds / wall_time,
+                }
+                results.append(result)
+                self.stdout.write(
+                    f"{threads:>3} threads x {concurrency:>3} processes: "
+                    f"{wall_time:7.2f}s per job, {result['throughput']:7.2f} audio seconds/second"
+                )
+        finally:
+            os.unlink(wav_file)
+
+        if not results:
+            raise CommandError('Every benchmark run failed; no configuration was saved')
+        fastest = min(results, key=lambda r: r['latency'])
+        busiest = max(results, key=lambda r: r['throughput'])
+        tuning_data = {
+            'cpu_count': cpu_count,
+            'clip_seconds': clip_seconds,
+            'profiles': {
+                'latency': {'threads': fastest['threads'], 'concurrency': fastest['concurrency']},
+                'throughput': {'threads': busiest['threads'], 'concurrency': busiest['concurrency']},
+            },
+            'results': results,
+        }
+        temp_path = f"{tuning.TUNING_PATH}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(tuning_data, f, indent=2)
+        os.replace(temp_path, tuning.TUNING_PATH)
+
+        for profile, config in tuning_data['profiles'].items():
+            self.stdout.write(self.style.SUCCESS(
+                f"{profile}: {config['threads']} threads x {config['concurrency']} processes"
+            ))
+        self.stdout.write(f"Saved to {tuning.TUNING_PATH}")
+
+    def candidates(self, max_threads):
+        """
+        Combinations of threads per process and concurrent processes that fit in max_threads.
+        """
+        counts = []
+        count = 1
+        while count <= max_threads:
+            counts.append(count)
+            count *= 2
+        if max_threads not in counts:
+            counts.append(max_threads)
+
+        return [
+            (threads, concurrency)
+            for threads in counts
+            for concurrency in counts
+            if threads * concurrency <= max_threads
+        ]
+
+    def benchmark(self, wav_file, threads, concurrency, duration):
+        """
+        Run `concurrency` whisper processes at once and return the wall time of the batch.
+        """
+        command = [
+            bootstrap.WHISPER_MAIN, "-m", bootstrap.MODEL_PATH,
+            "-f", wav_file,
+            "-t", str(threads),
+            "--duration", str(duration * 1000),
+            "--no-prints",
+        ]
+        start_time = time.monotonic()
+        processes = [
+            subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for _ in range(concurrency)
+        ]
+        # Wait for every process, so a failed one leaves no others running into the next trial
+        return_codes = [process.wait() for process in processes]
+        failed = [code for code in return_codes if code != 0]
+        if failed:
+            raise CommandError(f"whisper.cpp failed with return code {failed[0]}")
+        return time.monotonic() - start_time
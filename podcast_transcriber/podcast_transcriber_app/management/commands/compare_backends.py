@@ -0,0 +1,133 @@
+import os
+import re
+import subprocess
+import tempfile
+import time
+import wave
+
+from django.core.management.base import BaseCommand, CommandError
+
+from podcast_transcriber_app import backends
+from podcast_transcriber_app.views import convert_audio
+
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.wav', '.ogg', '.flac')
+
+
+def normalize_words(text):
+    """
+    Lower-case the text and split it into words, ignoring punctuation.
+    """
+    return re.findall(r"[a-z0-9']+", text.lower())
+
+
+def word_error_rate(reference, hypothesis):
+    """
+    Compute the word error rate of a hypothesis against a reference transcript.
+
+    :param reference: str, reference transcript
+    :param hypothesis: str, transcript produced by a backend
+    :return: float, word-level edit distance divided by the number of reference words
+    """
+    reference_words = normalize_words(reference)
+    hypothesis_words = normalize_words(hypothesis)
+    if not reference_words:
+        return 0.0 if not hypothesis_words else 1.0
+
+    previous = list(range(len(hypothesis_words) + 1))
+    for i, reference_word in enumerate(reference_words, 1):
+        current = [i]
+        for j, hypothesis_word in enumerate(hypothesis_words, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (reference_word != hypothesis_word),
+            ))
+        previous = current
+    return previous[-1] / len(reference_words)
+
+
+class Command(BaseCommand):
+    help = 'Compare transcription backends by real-time factor and word error rate on a reference set'
+
+    def add_arguments(self, parser):
+        parser.add_argument('reference_dir', help='Directory of audio clips, each with a reference transcript in a .txt file of the same name')
+        parser.add_argument('--backend', action='append', choices=list(backends.BACKENDS), help='Backend to compare (repeatable, defaults to all)')
+
+    def handle(self, *args, **options):
+        clips = self.find_clips(options['reference_dir'])
+        if not clips:
+            raise CommandError(f"No audio clips with reference transcripts found in {options['reference_dir']}")
+
+        names = options['backend'] or list(backends.BACKENDS)
+        totals = {name: {'audio': 0.0, 'elapsed': 0.0, 'errors': 0.0, 'words': 0} for name in names}
+
+        wav_files = []
+        try:
+            # Convert and check every clip before running any backend, so a bad clip
+            # stops the comparison before it starts rather than halfway through
+            prepared = []
+            for audio_file, reference in clips:
+                with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
+                    wav_files.append(temp_wav.name)
+                prepared.append((audio_file, reference, temp_wav.name, self.prepare_clip(audio_file, temp_wav.name)))
+
+            for audio_file, reference, wav_file, audio_seconds in prepared:
+                for name in names:
+                    backend = backends.get_backend(name)
+                    start_time = time.monotonic()
+                    try:
+                        hypothesis = ' '.join(segment['text'] for segment in backend.transcribe(wav_file))
+                    except backends.TranscriptionError as e:
+                        self.stdout.write(self.style.ERROR(f"{name} failed on {os.path.basename(audio_file)}: {str(e)}"))
+                        continue
+                    elapsed = time.monotonic() - start_time
+                    wer = word_error_rate(reference, hypothesis)
+                    words = len(normalize_words(reference))
+
+                    totals[name]['audio'] += audio_seconds
+                    totals[name]['elapsed'] += elapsed
+                    totals[name]['errors'] += wer * words
+                    totals[name]['words'] += words
+                    self.stdout.write(
+                        f"{os.path.basename(audio_file)} {name}: RTF {elapsed / audio_seconds:.3f}, WER {wer:.3f}"
+                    )
+        finally:
+            for wav_file in wav_files:
+                os.unlink(wav_file)
+
+        self.stdout.write('')
+        self.stdout.write(f"{'backend':<16}{'RTF':>8}{'WER':>8}")
+        for name, total in totals.items():
+            if not total['audio']:
+                self.stdout.write(f"{name:<16}{'failed':>8}")
+                continue
+            rtf = total['elapsed'] / total['audio']
+            wer = total['errors'] / total['words'] if total['words'] else 0.0
+            self.stdout.write(f"{name:<16}{rtf:>8.3f}{wer:>8.3f}")
+
+    def prepare_clip(self, audio_file, wav_file):
+        """
+        Convert a clip to the WAV format the backends read.
+
+        :raises: CommandError if the clip cannot be converted or read, or holds no audio
+        :return: float, length of the clip in seconds
+        """
+        try:
+            convert_audio(audio_file, wav_file)
+            with wave.open(wav_file, 'rb') as wav:
+                audio_seconds = wav.getnframes() / wav.getframerate()
+        except (subprocess.CalledProcessError, OSError, EOFError, wave.Error) as e:
+            raise CommandError(f"Could not read {audio_file}: {str(e)}")
+        if audio_seconds <= 0:
+            raise CommandError(f"{audio_file} holds no audio")
+        return audio_seconds
+
+    def find_clips(self, reference_dir):
+        clips = []
+        for file_name in sorted(os.listdir(reference_dir)):
+            stem, extension = os.path.splitext(file_name)
+            reference_path = os.path.join(reference_dir, f"{stem}.txt")
+            if extension.lower() in AUDIO_EXTENSIONS and os.path.exists(reference_path):
+                with open(reference_path, 'r', encoding='utf-8') as f:
+                    clips.append((os.path.join(reference_dir, file_name), f.read()))
+        return clips
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from podcast_transcriber_app import dedup
+from podcast_transcriber_app.models import MinHashSignature, Transcript
+
+
+class Command(BaseCommand):
+    help = 'List near-duplicate transcripts, indexing transcripts saved before duplicate detection existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reindex', action='store_true', help='Rebuild the index of every transcript')
+
+    def handle(self, *args, **options):
+        transcripts = Transcript.objects.filter(is_preview=False).order_by('id')
+        if not options['reindex']:
+            transcripts = transcripts.exclude(minhashes__kind='full')
+        indexed = 0
+        for transcript_id in transcripts.values_list('id', flat=True).iterator():
+            dedup.index_transcript(transcript_id)
+            indexed += 1
+        if indexed:
+            self.stdout.write(f"Indexed {indexed} transcripts")
+
+        duplicates = MinHashSignature.objects.filter(kind='full', duplicate_of__isnull=False).select_related('transcript', 'duplicate_of')
+        for signature in duplicates.order_by('-similarity'):
+            self.stdout.write(f"{signature.similarity:.2f}  {signature.transcript}  ->  {signature.duplicate_of}")
+        self.stdout.write(self.style.SUCCESS(f"{duplicates.count()} near-duplicate transcripts"))
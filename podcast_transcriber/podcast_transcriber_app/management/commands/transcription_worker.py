@@ -0,0 +1,104 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from podcast_transcriber_app import bootstrap, job_control, jobs, persistence, tuning
+from podcast_transcriber_app.views import download_and_transcribe
+
+
+class Command(BaseCommand):
+    help = 'Lease transcription jobs from the database and run them (TRANSCRIPTION_MODE = "distributed")'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--worker-id', default=jobs.default_worker_id(), help='Name of this worker in job leases')
+        parser.add_argument('--concurrency', type=int, help='Number of jobs run at once (defaults to the tuned concurrency)')
+        parser.add_argument('--profile', choices=tuning.PROFILES, default=tuning.DEFAULT_PROFILE, help='Whisper tuning profile')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds to wait when no job is available')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is available instead of waiting')
+
+    def handle(self, *args, **options):
+        bootstrap.ensure_ready()
+        job_control.clean_orphans()
+        config = tuning.use_profile(options['profile'])
+        concurrency = options['concurrency'] or config['concurrency']
+        self.worker_id = options['worker_id']
+        slots = threading.BoundedSemaphore(concurrency)
+        threads = []
+
+        self.stdout.write(f"Worker {self.worker_id} running up to {concurrency} jobs")
+        try:
+            while True:
+                slots.acquire()
+                job = jobs.claim_job(self.worker_id)
+                if job is None:
+                    slots.release()
+                    threads = [thread for thread in threads if thread.is_alive()]
+                    if options['once'] and not threads:
+                        break
+                    jobs.purge_old_events()
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                self.stdout.write(f"Leased job {job.pk} (attempt {job.attempts}): {job.podcast_name} - {job.episode_title}")
+                thread = threading.Thread(target=self.run_job, args=(job, slots), name=f"job-{job.pk}")
+                thread.start()
+                threads.append(thread)
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING('Interrupted, waiting for running jobs. Unfinished jobs are re-leased when their lease expires.'))
+        for thread in threads:
+            thread.join()
+
+    def run_job(self, job, slots):
+        """
+        Run a leased job while a heartbeat thread keeps the lease alive.
+        """
+        stop_heartbeat = threading.Event()
+        lease_lost = threading.Event()
+        heartbeat = threading.Thread(target=self.heartbeat, args=(job.pk, job.attempts, stop_heartbeat, lease_lost), daemon=True)
+        heartbeat.start()
+        try:
+            target = jobs.event_target(job.pk)
+            transcript = download_and_transcribe(
+                job.audio_url, target, job.podcast_name, job.episode_title,
+                job.publication_date, job.backend or None, target,
+            )
+            error = '' if transcript else 'Transcription failed'
+            stop_heartbeat.set()
+            heartbeat.join()
+            cancelled = not transcript and jobs.is_cancel_requested(job.pk)
+            # Through the writer, so the job's queued progress events are stored first
+            if lease_lost.is_set() or not persistence.write(jobs.finish_job, job.pk, self.worker_id, job.attempts, error, cancelled):
+                self.stdout.write(self.style.WARNING(f"Lease on job {job.pk} was lost before it finished"))
+            elif cancelled:
+                self.stdout.write(self.style.WARNING(f"Job {job.pk} cancelled"))
+            elif error:
+                self.stdout.write(self.style.ERROR(f"Job {job.pk} failed: {error}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"Job {job.pk} done"))
+        finally:
+            stop_heartbeat.set()
+            connections.close_all()
+            slots.release()
+
+    def heartbeat(self, job_id, attempt, stop, lease_lost):
+        """
+        Renew the lease of a job until it finishes, and stop the job when it is cancelled
+        or its lease is lost, so that it never runs next to a worker that took it over.
+        """
+        last_renewal = time.monotonic()
+        try:
+            while not stop.wait(jobs.CANCEL_POLL_SECONDS):
+                if jobs.is_cancel_requested(job_id):
+                    job_control.cancel_job(jobs.event_target(job_id))
+                if time.monotonic() - last_renewal < jobs.HEARTBEAT_SECONDS:
+                    continue
+                last_renewal = time.monotonic()
+                if not jobs.renew_lease(job_id, self.worker_id, attempt):
+                    self.stdout.write(self.style.WARNING(f"Lost the lease on job {job_id}, stopping it"))
+                    lease_lost.set()
+                    job_control.cancel_job(jobs.event_target(job_id))
+                    return
+        finally:
+            connections.close_all()
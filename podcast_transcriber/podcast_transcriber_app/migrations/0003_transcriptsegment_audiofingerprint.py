@@ -0,0 +1,41 @@
+# Generated by Django 5.1.1 on 2026-10-19 07:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0002_libraryitem_feed_url'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioFingerprint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('podcast_name', models.CharField(db_index=True, max_length=255)),
+                ('episode_title', models.CharField(max_length=255)),
+                ('hashes', models.BinaryField()),
+                ('offsets', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('podcast_name', 'episode_title')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TranscriptSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.FloatField()),
+                ('end', models.FloatField()),
+                ('text', models.TextField()),
+                ('transcript', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to='podcast_transcriber_app.transcript')),
+            ],
+            options={
+                'ordering': ['start'],
+            },
+        ),
+    ]
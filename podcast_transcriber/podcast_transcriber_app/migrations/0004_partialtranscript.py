@@ -0,0 +1,27 @@
+# Generated by Django 5.1.1 on 2026-10-19 07:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0003_transcriptsegment_audiofingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PartialTranscript',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('podcast_name', models.CharField(max_length=255)),
+                ('episode_title', models.CharField(max_length=255)),
+                ('audio_offset', models.FloatField(default=0.0)),
+                ('segments', models.JSONField(default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('podcast_name', 'episode_title')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.1 on 2026-10-19 07:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0004_partialtranscript'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcript',
+            name='is_preview',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.1 on 2026-10-19 07:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0005_transcript_is_preview'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueueItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('owner', models.CharField(max_length=40)),
+                ('episode_id', models.CharField(max_length=100)),
+                ('episode_title', models.CharField(max_length=255)),
+                ('audio_url', models.TextField()),
+                ('podcast_name', models.CharField(max_length=255)),
+                ('publication_date', models.CharField(blank=True, max_length=64)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('in-progress', 'In progress'), ('success', 'Success'), ('error', 'Error')], db_index=True, default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['owner', 'status'], name='podcast_tra_owner_31b7f0_idx')],
+                'unique_together': {('owner', 'episode_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def move_session_queues(apps, schema_editor):
+    """
+    Copy the transcription queues stored in sessions into QueueItem rows.
+
+    This is the last time sessions are scanned for queues.
+    """
+    from django.contrib.sessions.backends.db import SessionStore
+
+    Session = apps.get_model('sessions', 'Session')
+    QueueItem = apps.get_model('podcast_transcriber_app', 'QueueItem')
+    store = SessionStore()
+
+    items = []
+    for session in Session.objects.all().iterator():
+        queue = store.decode(session.session_data).get('transcription_queue', [])
+        for item in queue:
+            if item.get('status') == 'success':
+                continue
+            items.append(QueueItem(
+                owner=session.session_key,
+                episode_id=item['episode_id'],
+                episode_title=item.get('episode_title') or '',
+                audio_url=item.get('audio_url') or '',
+                podcast_name=item.get('podcast_name') or '',
+                publication_date=item.get('publication_date') or '',
+                status='pending' if item.get('status') == 'in-progress' else item.get('status', 'pending'),
+            ))
+    QueueItem.objects.bulk_create(items, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0006_queueitem'),
+        ('sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(move_session_queues, migrations.RunPython.noop),
+    ]
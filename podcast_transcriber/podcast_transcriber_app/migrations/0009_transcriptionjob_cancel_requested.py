@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-19 07:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0008_transcriptionjob_jobevent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name='transcriptionjob',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='queued', max_length=20),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.1 on 2026-10-19 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0010_transcript_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MinHashSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('full', 'Full transcript'), ('opening', 'Opening minutes')], max_length=10)),
+                ('signature', models.BinaryField()),
+                ('shingle_count', models.PositiveIntegerField()),
+                ('similarity', models.FloatField(blank=True, null=True)),
+                ('duplicate_of', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='podcast_transcriber_app.transcript')),
+                ('transcript', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='minhashes', to='podcast_transcriber_app.transcript')),
+            ],
+            options={
+                'unique_together': {('transcript', 'kind')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('signature', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='podcast_transcriber_app.minhashsignature')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'band', 'bucket'], name='podcast_tra_kind_6d72d2_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-19 08:15
+
+from django.db import migrations, models
+
+
+def record_existing_transcripts(apps, schema_editor):
+    # Existing transcripts are synced once, as if they had just been saved
+    Transcript = apps.get_model('podcast_transcriber_app', 'Transcript')
+    TranscriptChange = apps.get_model('podcast_transcriber_app', 'TranscriptChange')
+    TranscriptChange.objects.bulk_create(
+        (TranscriptChange(transcript_id=pk, operation='upsert') for pk in Transcript.objects.order_by('id').values_list('id', flat=True).iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0012_resourceversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranscriptChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transcript_id', models.BigIntegerField()),
+                ('operation', models.CharField(choices=[('upsert', 'Inserted or updated'), ('delete', 'Deleted')], max_length=10)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(record_existing_transcripts, migrations.RunPython.noop),
+    ]
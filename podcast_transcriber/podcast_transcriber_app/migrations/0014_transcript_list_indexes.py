@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('podcast_transcriber_app', '0013_transcriptchange'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(fields=['publication_date', 'id'], name='podcast_tra_publica_13365b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transcript',
+            index=models.Index(fields=['podcast_name', 'publication_date', 'id'], name='podcast_tra_podcast_0ac0ce_idx'),
+        ),
+    ]
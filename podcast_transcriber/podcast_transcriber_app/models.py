@@ -18,9 +18,174 @@ class Transcript(models.Model):
     transcript_text = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     publication_date = models.DateTimeField(null=True, blank=True)  # New field
+    is_preview = models.BooleanField(default=False)  # Quick low-quality transcript, replaced by the full pass
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('podcast_name', 'episode_title')
+        indexes = [
+            models.Index(fields=['publication_date', 'id']),  # Keyset pagination of the transcript list
+            models.Index(fields=['podcast_name', 'publication_date', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.podcast_name} - {self.episode_title}"
+
+class TranscriptSegment(models.Model):
+    transcript = models.ForeignKey(Transcript, on_delete=models.CASCADE, related_name='segments')
+    start = models.FloatField()  # Seconds from the start of the episode
+    end = models.FloatField()
+    text = models.TextField()
+
+    class Meta:
+        ordering = ['start']
+
+    def __str__(self):
+        return f"{self.transcript} [{self.start:.2f}-{self.end:.2f}]"
+
+class AudioFingerprint(models.Model):
+    podcast_name = models.CharField(max_length=255, db_index=True)
+    episode_title = models.CharField(max_length=255)
+    hashes = models.BinaryField()  # int64 spectral-peak hashes
+    offsets = models.BinaryField()  # int32 anchor frame of each hash
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('podcast_name', 'episode_title')
+
+    def __str__(self):
+        return f"{self.podcast_name} - {self.episode_title}"
+
+class PartialTranscript(models.Model):
+    podcast_name = models.CharField(max_length=255)
+    episode_title = models.CharField(max_length=255)
+    audio_offset = models.FloatField(default=0.0)  # Seconds of audio covered by the segments
+    segments = models.JSONField(default=list)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('podcast_name', 'episode_title')
+
+    def __str__(self):
+        return f"{self.podcast_name} - {self.episode_title} ({self.audio_offset:.0f}s)"
+
+class QueueItem(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('in-progress', 'In progress'),
+        ('success', 'Success'),
+        ('error', 'Error'),
+    ]
+
+    owner = models.CharField(max_length=40)  # Session key of the user who queued the episode
+    episode_id = models.CharField(max_length=100)
+    episode_title = models.CharField(max_length=255)
+    audio_url = models.TextField()
+    podcast_name = models.CharField(max_length=255)
+    publication_date = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('owner', 'episode_id')
+        indexes = [models.Index(fields=['owner', 'status'])]
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.podcast_name} - {self.episode_title} ({self.status})"
+
+class TranscriptionJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    episode_id = models.CharField(max_length=100, db_index=True)
+    audio_url = models.TextField()
+    podcast_name = models.CharField(max_length=255)
+    episode_title = models.CharField(max_length=255)
+    publication_date = models.CharField(max_length=64, blank=True)
+    backend = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    lease_owner = models.CharField(max_length=255, blank=True)  # Worker currently holding the job
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'lease_expires_at'])]
+
+    def __str__(self):
+        return f"{self.podcast_name} - {self.episode_title} ({self.status})"
+
+class JobEvent(models.Model):
+    job = models.ForeignKey(TranscriptionJob, on_delete=models.CASCADE, related_name='events')
+    data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.job_id}: {self.data.get('type')}"
+
+class MinHashSignature(models.Model):
+    KIND_CHOICES = [
+        ('full', 'Full transcript'),
+        ('opening', 'Opening minutes'),
+    ]
+
+    transcript = models.ForeignKey(Transcript, on_delete=models.CASCADE, related_name='minhashes')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    signature = models.BinaryField()  # uint32 minimum hash per permutation
+    shingle_count = models.PositiveIntegerField()
+    duplicate_of = models.ForeignKey(Transcript, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    similarity = models.FloatField(null=True, blank=True)  # Estimated Jaccard similarity with duplicate_of
+
+    class Meta:
+        unique_together = ('transcript', 'kind')
+
+    def __str__(self):
+        return f"{self.transcript} ({self.kind})"
+
+class LSHBucket(models.Model):
+    signature = models.ForeignKey(MinHashSignature, on_delete=models.CASCADE, related_name='buckets')
+    kind = models.CharField(max_length=10)
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()  # Hash of the signature rows in this band
+
+    class Meta:
+        indexes = [models.Index(fields=['kind', 'band', 'bucket'])]
+
+    def __str__(self):
+        return f"{self.kind} band {self.band}: {self.bucket}"
+
+class ResourceVersion(models.Model):
+    key = models.CharField(max_length=100, unique=True)  # 'library', 'feeds', or 'queue:<session key>'
+    version = models.PositiveBigIntegerField(default=1)  # Incremented on every change
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+class TranscriptChange(models.Model):
+    OPERATION_CHOICES = [
+        ('upsert', 'Inserted or updated'),
+        ('delete', 'Deleted'),
+    ]
+
+    transcript_id = models.BigIntegerField()  # Not a foreign key, so deletions stay recorded
+    operation = models.CharField(max_length=10, choices=OPERATION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.transcript_id} {self.operation} at {self.changed_at}"
@@ -0,0 +1,171 @@
+import atexit
+import functools
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Route transcript and progress writes through one writer thread. SQLite allows a
+# single writer at a time, so by default this is only done there.
+SINGLE_WRITER = getattr(settings, 'DATABASE_SINGLE_WRITER', connection.vendor == 'sqlite')
+
+WRITE_BATCH_SIZE = 50  # Writes committed together in one transaction
+WRITE_BATCH_LINGER_SECONDS = 0.05  # How long the writer waits for more writes to join a batch
+FLUSH_TIMEOUT_SECONDS = 30  # How long process exit waits for queued writes
+
+
+class Writer:
+    """
+    Dedicated thread that applies queued writes in batched transactions.
+
+    Each write runs in its own savepoint, so one failing write does not undo the
+    others in its batch. Writes are applied in the order they were submitted.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name='db-writer', daemon=True)
+                self.thread.start()
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Queue a write.
+
+        :param func: callable doing the database write
+        :return: Future with the return value of func
+        """
+        future = Future()
+        if threading.current_thread() is self.thread:
+            # A write issued by another write (e.g. from a signal) runs in the same batch
+            future.set_result(func(*args, **kwargs))
+            return future
+        self.start()
+        self.queue.put((func, args, kwargs, future))
+        return future
+
+    def next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + WRITE_BATCH_LINGER_SECONDS
+        while len(batch) < WRITE_BATCH_SIZE:
+            try:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def run(self):
+        while True:
+            batch = self.next_batch()
+            results = []
+            try:
+                with transaction.atomic():
+                    for func, args, kwargs, future in batch:
+                        try:
+                            with transaction.atomic():
+                                results.append((future, func(*args, **kwargs), None))
+                        except Exception as e:
+                            results.append((future, None, e))
+            except Exception as e:
+                # The commit itself failed; nothing in the batch was written
+                logger.error(f"Error committing {len(batch)} database writes: {str(e)}", exc_info=True)
+                connection.close()  # The writer keeps its connection between batches; start afresh after an error
+                results = [(future, None, e) for _, _, _, future in batch]
+            for future, result, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+                self.queue.task_done()
+
+    def flush(self, timeout=None):
+        """
+        Wait until every queued write has been applied.
+
+        :param timeout: float, seconds to wait at most, or None to wait indefinitely
+        :return: bool, True if the queue was drained
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if self.thread is None or not self.thread.is_alive():
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+
+writer = Writer()
+
+
+def submit(func, *args, **kwargs):
+    """
+    Queue a write without waiting for it, e.g. progress checkpoints and events.
+
+    :param func: callable doing the database write
+    :return: Future with the return value of func
+    """
+    if SINGLE_WRITER:
+        future = writer.submit(func, *args, **kwargs)
+    else:
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+    future.add_done_callback(log_failure)
+    return future
+
+
+def log_failure(future):
+    # Nobody waits on queued writes, so their errors would otherwise go unnoticed
+    error = future.exception()
+    if error is not None:
+        logger.error(f"Queued database write failed: {str(error)}", exc_info=error)
+
+
+def write(func, *args, **kwargs):
+    """
+    Apply a write and wait until it is committed.
+
+    :param func: callable doing the database write
+    :raises: whatever func raises
+    :return: return value of func
+    """
+    if not SINGLE_WRITER:
+        with transaction.atomic():
+            return func(*args, **kwargs)
+    return writer.submit(func, *args, **kwargs).result()
+
+
+def closes_connections(func):
+    """
+    Close the thread's database connections when func returns.
+
+    Django only closes connections at the end of a request, so threads started
+    outside the request cycle must close their own.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            connections.close_all()
+    return wrapper
+
+
+@atexit.register
+def flush_on_exit():
+    if writer.queue.unfinished_tasks and not writer.flush(FLUSH_TIMEOUT_SECONDS):
+        logger.warning(f"Exiting with {writer.queue.unfinished_tasks} database writes not applied")
@@ -0,0 +1,200 @@
+import collections
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# Fraction of requests to profile, 0 to turn request profiling off
+REQUEST_SAMPLE_RATE = getattr(settings, 'PROFILE_REQUEST_SAMPLE_RATE', 0.0)
+PROFILE_JOBS = getattr(settings, 'PROFILE_JOBS', False)
+SAMPLE_INTERVAL_SECONDS = getattr(settings, 'PROFILE_SAMPLE_INTERVAL_SECONDS', 0.01)
+PROFILE_DIR = getattr(settings, 'PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+INDEX_FILE = 'index.jsonl'
+
+# Queries slower than this are logged with their SQL; None turns slow query logging off
+SLOW_QUERY_MS = getattr(settings, 'SLOW_QUERY_MS', None)
+
+_local = threading.local()
+
+
+class Sampler:
+    """
+    Statistical profiler for one thread.
+
+    A background thread records the thread's call stack every SAMPLE_INTERVAL_SECONDS,
+    so the profiled code runs unmodified; the cost is one stack walk per sample.
+    Stacks are counted in the folded format read by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.stage = None
+        self.stage_seconds = collections.defaultdict(float)
+        self.started = self.duration = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f"profiler-{thread_id}", daemon=True)
+
+    def start(self):
+        self.started = time.monotonic()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.duration = time.monotonic() - self.started
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.counts[self.fold(frame)] += 1
+
+    def fold(self, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':'))
+            frame = frame.f_back
+        if self.stage:
+            names.append(f"[{self.stage}]")
+        return ';'.join(reversed(names))
+
+
+def safe_name(value):
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', str(value))[:80]
+
+
+def write_profile(kind, profile_id, sampler, details):
+    """
+    Write a folded-stack profile and add it to the index of profiles.
+
+    :param kind: str, 'request' or 'job'
+    :param profile_id: str, request or job id
+    :param sampler: stopped Sampler
+    :param details: dict, stored in the index with the profile
+    :return: str, path of the profile
+    """
+    directory = os.path.join(PROFILE_DIR, f"{kind}s")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{safe_name(profile_id)}.folded")
+    with open(path, 'w') as f:
+        for stack, count in sampler.counts.most_common():
+            f.write(f"{stack} {count}\n")
+    entry = {
+        'kind': kind,
+        'id': profile_id,
+        'path': os.path.relpath(path, PROFILE_DIR),
+        'duration': round(sampler.duration, 3),
+        'samples': sum(sampler.counts.values()),
+        'stages': {stage: round(seconds, 3) for stage, seconds in sampler.stage_seconds.items()},
+        **details,
+    }
+    with open(os.path.join(PROFILE_DIR, INDEX_FILE), 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+    return path
+
+
+@contextmanager
+def profile(kind, profile_id, **details):
+    """
+    Profile the current thread for the duration of the block.
+
+    Stages marked with stage() inside the block appear as the root frames of the
+    flame graph, with their wall time recorded in the index.
+    """
+    sampler = Sampler(threading.get_ident())
+    _local.sampler = sampler
+    sampler.start()
+    try:
+        yield sampler
+    finally:
+        _local.sampler = None
+        sampler.stop()
+        try:
+            path = write_profile(kind, profile_id, sampler, details)
+            logger.info(f"Profile of {kind} {profile_id} written to {path}")
+        except OSError as e:
+            logger.warning(f"Could not write profile of {kind} {profile_id}: {str(e)}")
+
+
+@contextmanager
+def job_profile(job_id, **details):
+    """
+    Profile a transcription job if job profiling is on; otherwise do nothing.
+    """
+    if not PROFILE_JOBS:
+        yield None
+        return
+    with profile('job', job_id, **details) as sampler:
+        yield sampler
+
+
+@contextmanager
+def stage(name):
+    """
+    Mark a stage of the profiled job or request running in this thread.
+    """
+    sampler = getattr(_local, 'sampler', None)
+    if sampler is None:
+        yield
+        return
+    previous, sampler.stage = sampler.stage, name
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        sampler.stage_seconds[name] += time.monotonic() - started
+        sampler.stage = previous
+
+
+class ProfilingMiddleware:
+    """
+    Profile a random sample of requests, PROFILE_REQUEST_SAMPLE_RATE of them.
+
+    Profiled responses carry the profile id in an X-Profile-Id header.
+    """
+
+    def __init__(self, get_response):
+        if not REQUEST_SAMPLE_RATE:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= REQUEST_SAMPLE_RATE:
+            return self.get_response(request)
+        request_id = uuid.uuid4().hex[:12]
+        with profile('request', request_id, method=request.method, url=request.get_full_path()):
+            response = self.get_response(request)
+        response['X-Profile-Id'] = request_id
+        return response
+
+
+def log_slow_query(execute, sql, params, many, context):
+    started = time.monotonic()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed_ms = (time.monotonic() - started) * 1000
+        if elapsed_ms >= SLOW_QUERY_MS:
+            logger.warning(f"Slow query ({elapsed_ms:.0f} ms) in {threading.current_thread().name}: {sql[:1000]}")
+
+
+@receiver(connection_created)
+def on_connection_created(sender, connection, **kwargs):
+    if SLOW_QUERY_MS is not None:
+        connection.execute_wrappers.append(log_slow_query)
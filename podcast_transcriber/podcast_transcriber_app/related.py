@@ -0,0 +1,378 @@
+import collections
+import fcntl
+import json
+import logging
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .dedup import normalize_words
+from .models import Transcript
+
+logger = logging.getLogger(__name__)
+
+RELATED_ENABLED = getattr(settings, 'RELATED_EPISODES_ENABLED', True)
+INDEX_DIR = getattr(settings, 'RELATED_INDEX_DIR', os.path.join(settings.BASE_DIR, 'related_index'))
+
+N_FEATURES = 2 ** 18  # Hashed vocabulary size; collisions are rare below ~50k distinct words
+MIN_WORD_LENGTH = 3  # Shorter words are mostly function words
+QUERY_TERMS = 200  # Only the heaviest terms of the query episode are scored
+DELTA_LIMIT = 200  # Episodes changed since the last compaction before the index is compacted again
+
+MANIFEST = 'manifest.json'
+JOURNAL = 'journal.jsonl'
+LOCK = '.lock'
+
+# Arrays of a compacted index generation. Postings are grouped by term (CSC layout):
+# the postings of term t are docs[term_ptr[t]:term_ptr[t + 1]].
+ARRAYS = ('term_ptr', 'docs', 'tf', 'weights', 'doc_ids', 'idf')
+
+
+def vectorize(text):
+    """
+    Hash the words of a transcript into sparse sublinear term frequencies.
+
+    :param text: str, transcript text
+    :return: tuple of (int32 array of sorted term hashes, float32 array of 1 + log(count))
+    """
+    counts = collections.Counter(word for word in normalize_words(text) if len(word) >= MIN_WORD_LENGTH)
+    hashed = collections.defaultdict(int)
+    for word, count in counts.items():
+        hashed[zlib.crc32(word.encode()) % N_FEATURES] += count
+    terms = np.array(sorted(hashed), dtype=np.int32)
+    tf = 1 + np.log(np.array([hashed[t] for t in terms], dtype=np.float32))
+    return terms, tf.astype(np.float32)
+
+
+@contextmanager
+def index_lock():
+    """
+    Serialize index writers across threads and processes.
+    """
+    os.makedirs(INDEX_DIR, exist_ok=True)
+    with open(os.path.join(INDEX_DIR, LOCK), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_manifest():
+    path = os.path.join(INDEX_DIR, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_journal():
+    """
+    Read the episodes changed since the last compaction.
+
+    :return: dict of transcript id to (terms, tf), or None for removed transcripts
+    """
+    changes = {}
+    path = os.path.join(INDEX_DIR, JOURNAL)
+    if not os.path.exists(path):
+        return changes
+    with open(path) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # Torn write of a crashed process
+            if entry.get('removed'):
+                changes[entry['id']] = None
+            else:
+                changes[entry['id']] = (np.array(entry['terms'], dtype=np.int32), np.array(entry['tf'], dtype=np.float32))
+    return changes
+
+
+def record(transcript):
+    """
+    Add, replace or remove a transcript in the index.
+
+    The change is appended to the journal; the index is compacted in the background
+    once DELTA_LIMIT changes have accumulated.
+    """
+    if transcript.is_preview or not transcript.transcript_text:
+        entry = {'id': transcript.pk, 'removed': True}
+    else:
+        terms, tf = vectorize(transcript.transcript_text)
+        entry = {'id': transcript.pk, 'terms': terms.tolist(), 'tf': [round(float(v), 4) for v in tf]}
+    append(entry)
+
+
+def append(entry):
+    path = os.path.join(INDEX_DIR, JOURNAL)
+    with index_lock():
+        with open(path, 'a') as f:
+            f.write(json.dumps(entry) + '\n')
+        with open(path) as f:
+            pending = sum(1 for _ in f)
+    if pending >= DELTA_LIMIT:
+        compact_in_background()
+
+
+_compacting = threading.Lock()
+
+
+def compact_in_background():
+    if not _compacting.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            compact()
+        except Exception as e:
+            logger.error(f"Error compacting the related episodes index: {str(e)}", exc_info=True)
+        finally:
+            _compacting.release()
+
+    threading.Thread(target=run, name='related-compaction', daemon=True).start()
+
+
+def compact(rebuild=False):
+    """
+    Merge the journal into a new generation of the index and reweight every episode.
+
+    Document frequencies, and so the TF-IDF weights of all episodes, are only
+    recomputed here; between compactions new episodes are weighted with the last
+    generation's IDF.
+
+    :param rebuild: bool, index every finished transcript from the database instead
+    :return: int, number of episodes in the new generation
+    """
+    with index_lock():
+        manifest = read_manifest()
+        terms, docs, tf, doc_ids = [], [], [], []
+        if rebuild:
+            changes = {}
+            transcripts = Transcript.objects.filter(is_preview=False).exclude(transcript_text='').only('id', 'transcript_text')
+            for transcript in transcripts.iterator(chunk_size=100):
+                changes[transcript.pk] = vectorize(transcript.transcript_text)
+        else:
+            changes = read_journal()
+            if manifest:
+                # Keep the postings of episodes that did not change
+                old = load_arrays(manifest['generation'])
+                old_terms = np.repeat(np.arange(N_FEATURES, dtype=np.int32), np.diff(old['term_ptr']))
+                keep = ~np.isin(old['doc_ids'], np.fromiter(changes, dtype=np.int64, count=len(changes)))
+                kept_ids = old['doc_ids'][keep]
+                position = np.full(len(keep), -1, dtype=np.int64)
+                position[keep] = np.arange(len(kept_ids))
+                old_docs = np.asarray(old['docs'])
+                mask = keep[old_docs]
+                terms.append(old_terms[mask])
+                docs.append(position[old_docs[mask]])
+                tf.append(np.asarray(old['tf'])[mask])
+                doc_ids.extend(kept_ids.tolist())
+
+        for transcript_id, vector in changes.items():
+            if vector is None:
+                continue
+            terms.append(vector[0])
+            docs.append(np.full(len(vector[0]), len(doc_ids), dtype=np.int64))
+            tf.append(vector[1])
+            doc_ids.append(transcript_id)
+
+        terms = np.concatenate(terms) if terms else np.array([], dtype=np.int32)
+        docs = np.concatenate(docs) if docs else np.array([], dtype=np.int64)
+        tf = np.concatenate(tf) if tf else np.array([], dtype=np.float32)
+        n_docs = len(doc_ids)
+
+        order = np.argsort(terms, kind='stable')
+        terms, docs, tf = terms[order], docs[order], tf[order]
+        df = np.bincount(terms, minlength=N_FEATURES)
+        idf = (np.log((1 + n_docs) / (1 + df)) + 1).astype(np.float32)
+        weights = tf * idf[terms]
+        norms = np.sqrt(np.bincount(docs, weights=weights.astype(np.float64) ** 2, minlength=n_docs))
+        weights = (weights / np.where(norms[docs] > 0, norms[docs], 1)).astype(np.float32)
+
+        arrays = {
+            'term_ptr': np.concatenate([[0], np.cumsum(df)]).astype(np.int64),
+            'docs': docs.astype(np.int32),
+            'tf': tf,
+            'weights': weights,
+            'doc_ids': np.array(doc_ids, dtype=np.int64),
+            'idf': idf,
+        }
+        generation = (manifest['generation'] + 1) if manifest else 1
+        for name, array in arrays.items():
+            np.save(os.path.join(INDEX_DIR, f"{name}-{generation}.npy"), array)
+        temp_path = os.path.join(INDEX_DIR, f"{MANIFEST}.tmp")
+        with open(temp_path, 'w') as f:
+            json.dump({'generation': generation, 'documents': n_docs}, f)
+        os.replace(temp_path, os.path.join(INDEX_DIR, MANIFEST))
+        open(os.path.join(INDEX_DIR, JOURNAL), 'w').close()
+
+        if manifest:
+            for name in ARRAYS:
+                try:
+                    os.unlink(os.path.join(INDEX_DIR, f"{name}-{manifest['generation']}.npy"))
+                except FileNotFoundError:
+                    pass
+    logger.info(f"Compacted the related episodes index: {n_docs} episodes, generation {generation}")
+    return n_docs
+
+
+def load_arrays(generation):
+    """
+    Memory-map the arrays of an index generation; pages are read only when touched.
+    """
+    return {name: np.load(os.path.join(INDEX_DIR, f"{name}-{generation}.npy"), mmap_mode='r') for name in ARRAYS}
+
+
+class Index:
+    """
+    A loaded index generation with the journal of changes since.
+    """
+
+    def __init__(self, manifest, changes):
+        self.arrays = load_arrays(manifest['generation']) if manifest else None
+        self.idf = np.asarray(self.arrays['idf']) if manifest else np.ones(N_FEATURES, dtype=np.float32)
+        self.doc_ids = np.asarray(self.arrays['doc_ids']) if manifest else np.array([], dtype=np.int64)
+        # Episodes in the generation that were changed or removed since
+        self.superseded = np.isin(self.doc_ids, np.fromiter(changes, dtype=np.int64, count=len(changes)))
+        self.delta_ids = [transcript_id for transcript_id, vector in changes.items() if vector is not None]
+        self.delta = [self.weigh(*changes[transcript_id]) for transcript_id in self.delta_ids]
+
+    def weigh(self, terms, tf):
+        weights = tf * self.idf[terms]
+        norm = np.sqrt(np.dot(weights, weights))
+        return terms, weights / norm if norm else weights
+
+    def similar(self, text, k, exclude_ids=()):
+        """
+        Find the episodes most similar to a text by cosine similarity of TF-IDF vectors.
+
+        Only the postings of the QUERY_TERMS heaviest query terms are read.
+
+        :return: list of (transcript id, score), best first
+        """
+        terms, weights = self.weigh(*vectorize(text))
+        if len(terms) > QUERY_TERMS:
+            top = np.argpartition(weights, -QUERY_TERMS)[-QUERY_TERMS:]
+            terms, weights = terms[top], weights[top]
+
+        ids, scores = [], []
+        if self.arrays is not None and len(self.doc_ids):
+            term_ptr = self.arrays['term_ptr']
+            starts, ends = term_ptr[terms], term_ptr[terms + 1]
+            lengths = ends - starts
+            positions = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + np.arange(lengths.sum())
+            contributions = self.arrays['weights'][positions] * np.repeat(weights, lengths)
+            main_scores = np.bincount(self.arrays['docs'][positions], weights=contributions, minlength=len(self.doc_ids))
+            main_scores[self.superseded] = 0
+            ids.append(self.doc_ids)
+            scores.append(main_scores)
+        if self.delta:
+            query = np.zeros(N_FEATURES, dtype=np.float32)
+            query[terms] = weights
+            delta_scores = [float(np.dot(doc_weights, query[doc_terms])) for doc_terms, doc_weights in self.delta]
+            ids.append(np.array(self.delta_ids, dtype=np.int64))
+            scores.append(np.array(delta_scores))
+        if not ids:
+            return []
+
+        ids, scores = np.concatenate(ids), np.concatenate(scores)
+        scores[np.isin(ids, list(exclude_ids))] = 0
+        count = min(k, int((scores > 0).sum()))
+        if not count:
+            return []
+        best = np.argpartition(scores, -count)[-count:]
+        best = best[np.argsort(scores[best])[::-1]]
+        return [(int(ids[i]), float(scores[i])) for i in best]
+
+
+_cache = {'key': None, 'index': None}
+_cache_lock = threading.Lock()
+
+
+def get_index():
+    """
+    Return the current index, reloading it only when a compaction or journal entry changed it.
+    """
+    journal_path = os.path.join(INDEX_DIR, JOURNAL)
+    with _cache_lock:
+        for attempt in range(3):
+            manifest = read_manifest()
+            key = (manifest and manifest['generation'], os.path.getsize(journal_path) if os.path.exists(journal_path) else 0)
+            if _cache['key'] == key:
+                return _cache['index']
+            try:
+                _cache['index'] = Index(manifest, read_journal())
+            except FileNotFoundError:
+                continue  # A compaction replaced the generation while we were loading it
+            _cache['key'] = key
+            return _cache['index']
+        raise RuntimeError('The related episodes index changed while loading it')
+
+
+def related_episodes(transcript, k=10, other_podcasts=False):
+    """
+    Find the episodes whose transcripts are most similar to a transcript.
+
+    :param transcript: Transcript
+    :param k: int, number of episodes to return
+    :param other_podcasts: bool, only return episodes of other podcasts
+    :return: list of dicts with id, podcast_name, episode_title, publication_date and score
+    """
+    # Fetch extra matches, as the other episodes of the same podcast may be filtered out below
+    matches = get_index().similar(transcript.transcript_text, k * 3 if other_podcasts else k, exclude_ids=[transcript.pk])
+    episodes = Transcript.objects.filter(pk__in=[transcript_id for transcript_id, _ in matches]).only(
+        'id', 'podcast_name', 'episode_title', 'publication_date'
+    ).in_bulk()
+    results = []
+    for transcript_id, score in matches:
+        episode = episodes.get(transcript_id)
+        if episode is None or (other_podcasts and episode.podcast_name == transcript.podcast_name):
+            continue
+        results.append({
+            'id': episode.pk,
+            'podcast_name': episode.podcast_name,
+            'episode_title': episode.episode_title,
+            'publication_date': episode.publication_date.isoformat() if episode.publication_date else None,
+            'score': round(score, 4),
+        })
+    return results[:k]
+
+
+@receiver(post_save, sender=Transcript)
+def on_transcript_saved(sender, instance, **kwargs):
+    """
+    Keep the related episodes index up to date. Indexing errors never fail the save.
+    """
+    if not RELATED_ENABLED:
+        return
+
+    def update_index():
+        try:
+            record(instance)
+        except Exception as e:
+            logger.error(f"Error indexing transcript for related episodes: {str(e)}", exc_info=True)
+
+    transaction.on_commit(update_index)
+
+
+@receiver(post_delete, sender=Transcript)
+def on_transcript_deleted(sender, instance, **kwargs):
+    if not RELATED_ENABLED:
+        return
+    transcript_id = instance.pk
+
+    def update_index():
+        try:
+            append({'id': transcript_id, 'removed': True})
+        except Exception as e:
+            logger.error(f"Error removing transcript from the related episodes index: {str(e)}", exc_info=True)
+
+    transaction.on_commit(update_index)
@@ -1,3 +1,236 @@
-from django.test import TestCase
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import types
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+
+from .models import Transcript, TranscriptChange
+
+
+def import_export_script():
+    """
+    Import the BigQuery export script from the repository root. Where the BigQuery
+    client library is not installed, stand-ins for its modules are used; the tests
+    never reach BigQuery.
+    """
+    root = str(settings.BASE_DIR.parent)
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    try:
+        importlib.import_module('google.api_core.exceptions')
+        importlib.import_module('google.cloud.bigquery')
+        importlib.import_module('google.oauth2.service_account')
+        return importlib.import_module('export_transcripts_to_bq')
+    except ImportError:
+        pass
+    google = mock.MagicMock()
+    google.api_core.exceptions.NotFound = NotFound
+    modules = {
+        'google': google,
+        'google.api_core': google.api_core,
+        'google.api_core.exceptions': google.api_core.exceptions,
+        'google.cloud': google.cloud,
+        'google.cloud.bigquery': google.cloud.bigquery,
+        'google.oauth2': google.oauth2,
+        'google.oauth2.service_account': google.oauth2.service_account,
+    }
+    with mock.patch.dict(sys.modules, modules):
+        sys.modules.pop('export_transcripts_to_bq', None)
+        return importlib.import_module('export_transcripts_to_bq')
+
+
+class NotFound(Exception):
+    pass
+
+
+class FakeJob:
+    def __init__(self, affected=0):
+        self.num_dml_affected_rows = affected
+
+    def result(self):
+        return self
+
+
+class FakeBigQueryClient:
+    """
+    Records the staged loads and queries of a sync.
+    """
+
+    def __init__(self, columns, schema_columns):
+        self.columns = columns  # Columns of the target table, or None if there is none
+        self.schema_columns = schema_columns  # Columns of tables it creates
+        self.loads = []
+        self.queries = []
+        self.created = []
+
+    def get_table(self, table_id):
+        if self.columns is None:
+            raise NotFound(table_id)
+        return types.SimpleNamespace(schema=[types.SimpleNamespace(name=column) for column in self.columns])
+
+    def delete_table(self, table_id):
+        self.columns = None
+
+    def create_table(self, table):
+        self.created.append(table)
+        self.columns = list(self.schema_columns)
+
+    def load_table_from_json(self, rows, table_id, job_config=None):
+        self.loads.append((table_id, list(rows)))
+        return FakeJob()
+
+    def query(self, sql):
+        self.queries.append(sql)
+        return FakeJob(len(self.loads[-1][1]) if self.loads else 0)
+
+
+class TranscriptChangeTests(TestCase):
+    def test_changes_are_recorded(self):
+        transcript = Transcript.objects.create(podcast_name='Podcast', episode_title='Episode', transcript_text='one')
+        transcript.transcript_text = 'two'
+        transcript.save()
+        transcript_id = transcript.pk
+        transcript.delete()
+
+        changes = list(TranscriptChange.objects.values_list('transcript_id', 'operation'))
+        self.assertEqual(changes, [(transcript_id, 'upsert'), (transcript_id, 'upsert'), (transcript_id, 'delete')])
+
+    def test_rolled_back_change_is_not_recorded(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Transcript.objects.create(podcast_name='Podcast', episode_title='Episode', transcript_text='one')
+                raise RuntimeError
+        self.assertFalse(TranscriptChange.objects.exists())
+
+
+class BigQuerySyncTests(TransactionTestCase):
+    def setUp(self):
+        self.export = import_export_script()
+        self.directory = tempfile.mkdtemp()
+        self.sync_file = os.path.join(self.directory, 'last_synced_change.txt')
+        self.legacy_file = os.path.join(self.directory, 'last_sync_time.txt')
+        patcher = mock.patch.multiple(
+            self.export,
+            LAST_SYNC_FILE=self.sync_file,
+            LEGACY_SYNC_FILE=self.legacy_file,
+            BIGQUERY_TABLE_ID='project.dataset.transcripts',
+            BIGQUERY_STAGING_TABLE_ID='',
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.client = self.fake_client(self.export.COLUMNS)
+        connection.ensure_connection()
+        self.conn = connection.connection
+
+    def fake_client(self, columns):
+        return FakeBigQueryClient(columns, self.export.COLUMNS)
+
+    def create(self, title, **fields):
+        return Transcript.objects.create(podcast_name='Podcast', episode_title=title, transcript_text=title, **fields)
+
+    def sync(self, batch_size=1000):
+        with mock.patch('builtins.print'):
+            return self.export.sync(self.conn, self.client, batch_size)
+
+    def staged(self):
+        return [rows for _, rows in self.client.loads]
+
+    def test_changes_are_applied_in_order_and_in_batches(self):
+        transcripts = [self.create(f"Episode {n}") for n in range(5)]
+
+        self.assertEqual(self.sync(batch_size=2), 5)
+
+        self.assertEqual(len(self.client.loads), 3)
+        self.assertEqual(len(self.client.queries), 3)
+        staged_ids = [[row['id'] for row in rows] for rows in self.staged()]
+        self.assertEqual(staged_ids, [[t.pk for t in transcripts[0:2]], [t.pk for t in transcripts[2:4]], [transcripts[4].pk]])
+        self.assertEqual({table_id for table_id, _ in self.client.loads}, {'project.dataset.transcripts_staging'})
+
+    def test_position_is_saved(self):
+        self.create('Episode 1')
+        self.create('Episode 2')
+        last_change = TranscriptChange.objects.order_by('-id').first()
+
+        self.sync()
+        self.assertEqual(self.export.get_last_synced_change(), last_change.pk)
+
+        # Nothing new to apply
+        self.assertEqual(self.sync(), 0)
+        self.assertEqual(len(self.client.loads), 1)
+
+        transcript = self.create('Episode 3')
+        self.assertEqual(self.sync(), 1)
+        self.assertEqual([row['id'] for row in self.staged()[-1]], [transcript.pk])
+
+    def test_changes_collapse_to_one_row_per_transcript(self):
+        updated = self.create('Updated')
+        updated.transcript_text = 'new text'
+        updated.save()
+        deleted = self.create('Deleted')
+        deleted_id = deleted.pk
+        deleted.delete()
+
+        self.sync()
+
+        rows = {row['id']: row for row in self.staged()[0]}
+        self.assertEqual(len(self.staged()[0]), 2)
+        self.assertEqual(rows[updated.pk]['transcript_text'], 'new text')
+        self.assertFalse(rows[updated.pk]['_deleted'])
+        self.assertEqual(rows[deleted_id], {'id': deleted_id, '_deleted': True})
+
+    def test_previews_are_staged_as_deletions(self):
+        preview = self.create('Preview', is_preview=True)
+
+        self.sync()
+
+        self.assertEqual(self.staged()[0], [{'id': preview.pk, '_deleted': True}])
+
+    def test_merge_statement(self):
+        statement = self.export.merge_statement()
+
+        self.assertIn('MERGE `project.dataset.transcripts` T', statement)
+        self.assertIn('USING `project.dataset.transcripts_staging` S', statement)
+        self.assertIn('WHEN MATCHED AND S._deleted THEN DELETE', statement)
+        self.assertIn('WHEN MATCHED THEN UPDATE SET podcast_name = S.podcast_name', statement)
+        self.assertNotIn('id = S.id,', statement)
+        self.assertIn('WHEN NOT MATCHED AND NOT S._deleted THEN INSERT', statement)
+        self.assertIn(f"({', '.join(self.export.COLUMNS)})", statement)
+
+    def test_missing_table_is_created_and_loaded(self):
+        transcripts = [self.create(f"Episode {n}") for n in range(3)]
+        self.create('Preview', is_preview=True)
+        self.client = self.fake_client(None)
+
+        self.sync(batch_size=2)
+
+        self.assertEqual(len(self.client.created), 1)
+        staged_ids = [[row['id'] for row in rows] for rows in self.staged()]
+        self.assertEqual(staged_ids, [[t.pk for t in transcripts[0:2]], [transcripts[2].pk]])
+        self.assertEqual(self.export.get_last_synced_change(), TranscriptChange.objects.order_by('-id').first().pk)
+
+    def test_table_of_the_earlier_export_is_replaced(self):
+        transcript = self.create('Episode')
+        self.client = self.fake_client([column for column in self.export.COLUMNS if column not in ('id', 'is_preview', 'updated_at')])
+
+        self.sync()
+
+        self.assertEqual(len(self.client.created), 1)
+        self.assertEqual([row['id'] for row in self.staged()[0]], [transcript.pk])
+
+    def test_legacy_position_file_triggers_a_reload(self):
+        self.create('Episode')
+        with open(self.legacy_file, 'w') as f:
+            f.write('2024-01-01T00:00:00')
+
+        self.sync()
+
+        self.assertEqual(len(self.client.created), 1)
+        self.assertFalse(os.path.exists(self.legacy_file))
+        self.assertTrue(os.path.exists(self.sync_file))
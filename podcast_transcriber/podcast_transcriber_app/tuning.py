@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Written by the calibrate_whisper management command
+TUNING_PATH = os.path.join(settings.BASE_DIR, "whisper_tuning.json")
+PROFILES = ('latency', 'throughput')
+DEFAULT_PROFILE = getattr(settings, 'WHISPER_TUNING_PROFILE', 'latency')
+
+_lock = threading.Lock()
+_config = None
+_slots = None
+
+
+def default_config():
+    """
+    Configuration used until the host has been calibrated.
+
+    :return: dict with threads per whisper process and number of concurrent processes
+    """
+    cpu_count = os.cpu_count() or 1
+    threads = min(4, cpu_count)
+    return {'threads': threads, 'concurrency': max(1, cpu_count // threads)}
+
+
+def load_tuning():
+    """
+    Read the calibration results for this host.
+
+    Results calibrated on a machine with a different CPU count are ignored, so a
+    copied data directory does not carry over settings from another box.
+
+    :return: dict as written by calibrate_whisper, or None if the host is not calibrated
+    """
+    if not os.path.exists(TUNING_PATH):
+        return None
+    with open(TUNING_PATH, 'r') as f:
+        tuning = json.load(f)
+    if tuning.get('cpu_count') != os.cpu_count():
+        logger.warning(f"Ignoring {TUNING_PATH}: calibrated for {tuning.get('cpu_count')} CPUs, host has {os.cpu_count()}")
+        return None
+    return tuning
+
+
+def use_profile(profile):
+    """
+    Select the tuning profile used by whisper jobs in this process.
+
+    :param profile: str, 'latency' or 'throughput'
+    :raises: ValueError if the profile is unknown
+    :return: dict, the active configuration
+    """
+    global _config, _slots
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown tuning profile: {profile}")
+
+    tuning = load_tuning()
+    config = tuning['profiles'][profile] if tuning else default_config()
+    with _lock:
+        _config = config
+        _slots = threading.BoundedSemaphore(config['concurrency'])
+    logger.info(f"Using {profile} whisper profile: {config['threads']} threads x {config['concurrency']} processes")
+    return config
+
+
+def active_config():
+    """
+    Return the active configuration, loading the default profile on first use.
+
+    :return: dict with threads and concurrency
+    """
+    if _config is None:
+        use_profile(DEFAULT_PROFILE)
+    return _config
+
+
+def whisper_args():
+    """
+    Command-line arguments that apply the active configuration to whisper.cpp.
+
+    :return: list of str
+    """
+    return ["-t", str(active_config()['threads'])]
+
+
+@contextmanager
+def whisper_slot():
+    """
+    Hold one of the concurrent whisper process slots of the active configuration.
+    """
+    active_config()
+    slots = _slots
+    with slots:
+        yield
@@ -6,6 +6,7 @@ urlpatterns = [
     path('add_to_library/', views.add_to_library, name='add_to_library'),
     path('remove_from_library/<str:item_id>/', views.remove_from_library, name='remove_from_library'),
     path('start_transcription/', views.start_transcription, name='start_transcription'),
+    path('cancel_transcription/', views.cancel_transcription, name='cancel_transcription'),
     path('sse/<str:episode_id>/', views.sse_stream, name='sse_stream'),
     path('search-podcasts/', views.search_podcasts, name='search_podcasts'),
     path('get_library_items/', views.get_library_items, name='get_library_items'),
@@ -14,5 +15,12 @@ urlpatterns = [
     path('get_queue/', views.get_queue, name='get_queue'),
     path('update_queue_status/', views.update_queue_status, name='update_queue_status'),
     path('export_transcripts/', views.export_transcripts, name='export_transcripts'),
+    path('export_transcripts/stream/', views.stream_transcripts, name='stream_transcripts'),
+    path('transcripts/', views.list_transcripts_view, name='list_transcripts'),
+    path('transcripts/<int:transcript_id>/text/', views.transcript_text_view, name='transcript_text'),
+    path('transcripts/<int:transcript_id>/text/stream/', views.stream_transcript_text, name='stream_transcript_text'),
+    path('latest_episodes/', views.latest_episodes_view, name='latest_episodes'),
+    path('related_episodes/', views.related_episodes_view, name='related_episodes'),
     path('get_podcast_episodes/', views.get_podcast_episodes_view, name='get_podcast_episodes'),
+    path('health/ready/', views.readiness_view, name='readiness'),
 ]
\ No newline at end of file
@@ -1,67 +1,62 @@
 import json
 import logging
 import os
-import queue
 import subprocess
-import tempfile
 import threading
 import time
+from contextlib import closing
 from urllib.parse import unquote, urlparse
 
 import requests
 from django.apps import AppConfig
 from django.conf import settings
+from django.core.cache import cache
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.db.models.signals import post_migrate
 from django.dispatch import receiver
 from django.http import StreamingHttpResponse, JsonResponse, HttpResponse
 from django.shortcuts import render, redirect
 from django.template.defaulttags import register
+from django.utils.cache import patch_cache_control
 from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.cache import cache_control
 from django.views.decorators.csrf import csrf_exempt
-from requests.exceptions import RequestException, Timeout
-
-from .models import Transcript, LibraryItem
-
-# Configure logging
-log_file_path = os.path.join(settings.BASE_DIR, 'app.log')
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s [%(levelname)s] %(message)s',
-    handlers=[
-        logging.FileHandler(log_file_path),
-        logging.StreamHandler()
-    ]
-)
+from django.views.decorators.http import condition, conditional_page
+from requests.exceptions import RequestException
+
+from . import admission, backends, batching, bootstrap, browse, dedup, events, exports, fingerprint, http_cache, itunes, job_control, jobs, persistence, profiling, related
+from .models import Transcript, LibraryItem, TranscriptSegment, PartialTranscript, QueueItem
+
 logger = logging.getLogger(__name__)
+sse_logger = logging.getLogger('podcast_transcriber_app.sse')
 
-# Use a queue for SSE messages to handle concurrent requests
-StreamingHttpResponse.sse_queue = queue.Queue()
+# Recurring-segment detection configuration
+FINGERPRINT_ENABLED = True
+MIN_TRANSCRIBE_GAP_SECONDS = 1.0  # Gaps between reused segments shorter than this are not sent to whisper
 
-# Whisper.cpp configuration
-WHISPER_CPP_REPO = "https://github.com/ggerganov/whisper.cpp.git"
-MODEL_URL = "https://huggingface.co/ggerganov/whisper.cpp/resolve/main/ggml-base.en.bin"
-MODEL_PATH = os.path.join(settings.BASE_DIR, "models", "ggml-base.en.bin")
-WHISPER_CPP_DIR = os.path.join(settings.BASE_DIR, "whisper.cpp")
+# Fields of a queue item sent to the client
+QUEUE_FIELDS = ('episode_id', 'episode_title', 'audio_url', 'podcast_name', 'publication_date', 'status')
 
-def download_model():
-    """
-    Download the Whisper model if it doesn't exist.
+# Partial transcripts are persisted at most this often so a crash loses little work
+CHECKPOINT_INTERVAL_SECONDS = 30
 
-    This function ensures that we always have the required model file
-    before starting the transcription process.
+# Preview pass configuration. A small model transcribes the start of the episode first
+# so editors see useful text quickly; None previews the whole episode.
+PREVIEW_ENABLED = getattr(settings, 'TRANSCRIPTION_PREVIEW_ENABLED', True)
+PREVIEW_SECONDS = getattr(settings, 'TRANSCRIPTION_PREVIEW_SECONDS', 5 * 60)
 
-    :raises: RequestException if there's an error downloading the model
-    :return: None
-    """
-    if not os.path.exists(MODEL_PATH):
-        logger.info("Downloading Whisper model...")
-        os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
-        response = requests.get(MODEL_URL)
-        response.raise_for_status()
-        with open(MODEL_PATH, "wb") as f:
-            f.write(response.content)
-        logger.info("Model downloaded successfully.")
+# How often SSE streams check the database for events of jobs run by worker nodes
+JOB_EVENT_POLL_SECONDS = 1.0
+SSE_POST_TIMEOUT = (2, 5)  # Connect and read timeouts for posting events to the SSE endpoint
+
+# The merged latest-episodes list is cached per library and feed version; a list
+# missing podcasts iTunes did not answer for is kept only briefly
+LATEST_EPISODES_TTL = getattr(settings, 'LATEST_EPISODES_CACHE_SECONDS', 15 * 60)
+LATEST_EPISODES_PARTIAL_TTL = 60
+LATEST_EPISODES_PER_PODCAST = 5
+LATEST_EPISODE_FIELDS = ('trackId', 'trackName', 'previewUrl', 'collectionName', 'releaseDate', 'artworkUrl60', 'duration_minutes')
+_latest_episodes_lock = threading.Lock()
 
 def convert_audio(input_file, output_file):
     """
@@ -73,84 +68,301 @@ def convert_audio(input_file, output_file):
     :param input_file: str, path to the input audio file
     :param output_file: str, path to save the converted audio file
     :raises: subprocess.CalledProcessError if ffmpeg conversion fails
+    :raises: job_control.JobCancelled if the job is cancelled during the conversion
     :return: None
     """
     logger.info("Converting audio...")
-    subprocess.run([
+    command = [
         "ffmpeg", "-y", "-i", input_file,
         "-ar", "16000", "-ac", "1", "-c:a", "pcm_s16le",
         output_file
-    ], check=True)
+    ]
+    process = subprocess.Popen(command)
+    with job_control.track_process(process):
+        process.wait()
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command)
     logger.info("Audio converted successfully.")
 
-def transcribe_audio(input_file, sse_url, podcast_name, episode_title, publication_date):
+def plan_transcription(reused_ranges, start=0.0):
+    """
+    Split the episode into reused ranges and ranges that still need whisper.
+
+    :param reused_ranges: list of dicts from fingerprint.reusable_segments, sorted by start
+    :param start: float, seconds already transcribed by an earlier, interrupted run
+    :return: list of ('reuse', reused_range) and ('transcribe', offset, duration) steps,
+             where a duration of None means until the end of the file
+    """
+    steps = []
+    position = start
+    for reused in reused_ranges:
+        if reused['start'] < start:
+            continue
+        if reused['start'] - position >= MIN_TRANSCRIBE_GAP_SECONDS:
+            steps.append(('transcribe', position, reused['start'] - position))
+        steps.append(('reuse', reused))
+        position = max(position, reused['end'])
+    steps.append(('transcribe', position, None))
+    return steps
+
+def transcribe_preview(input_file, sse_url, podcast_name, episode_title, publication_date, backend=None):
+    """
+    Quickly transcribe the start of the episode with the backend's preview model.
+
+    The preview is streamed to the client and stored as a preview transcript, which
+    the full-quality pass replaces when it finishes. Failures are logged and ignored,
+    since the full pass follows anyway.
+
+    :param input_file: str, path to the input audio file
+    :param sse_url: str, URL for sending Server-Sent Events
+    :param podcast_name: str, name of the podcast
+    :param episode_title: str, title of the episode
+    :param publication_date: str, publication date of the episode
+    :param backend: str, name of the transcription backend, or None for the default
+    :return: list of preview segment dicts, empty if no preview was made
+    """
+    engine = backends.get_preview_backend(backend)
+    if not engine:
+        return []
+
+    logger.info(f"Starting preview transcription for {podcast_name} - {episode_title}")
+    preview_segments = []
+    try:
+        for segment in engine.transcribe(input_file, 0.0, PREVIEW_SECONDS):
+            preview_segments.append(segment)
+            send_sse_message(sse_url, {"type": "transcription_text", "text": segment['text'], "preview": True})
+    except backends.TranscriptionError as e:
+        logger.warning(f"Preview transcription failed: {str(e)}")
+        return []
+
+    preview_lines = [segment['text'] for segment in preview_segments]
+    if preview_lines:
+        persistence.write(
+            Transcript.objects.update_or_create,
+            podcast_name=podcast_name,
+            episode_title=episode_title,
+            defaults={
+                'transcript_text': ' '.join(preview_lines),
+                'publication_date': parse_datetime(publication_date) if publication_date else None,
+                'is_preview': True,
+            }
+        )
+        logger.info(f"Preview transcript saved for podcast: {podcast_name}, episode: {episode_title}")
+    return preview_segments
+
+def outside_ranges(segment, ranges):
+    """
+    Whether a segment does not overlap any of the given ranges.
+
+    :param segment: dict with start and end in seconds
+    :param ranges: list of dicts with start and end in seconds
+    """
+    if segment.get('start') is None or segment.get('end') is None:
+        return True
+    return all(segment['end'] <= r['start'] or segment['start'] >= r['end'] for r in ranges)
+
+def find_duplicate(text, podcast_name, episode_title):
+    """
+    Check whether the opening of an episode matches a transcript we already have.
+
+    :param text: str, text of the first minutes of the episode
+    :param podcast_name: str, name of the podcast
+    :param episode_title: str, title of the episode
+    :return: tuple of (Transcript, containment), or None
     """
-    Transcribe the audio file using Whisper.cpp.
+    if not dedup.DEDUP_ENABLED:
+        return None
+    try:
+        return dedup.find_duplicate_opening(text, podcast_name, episode_title)
+    except Exception as e:
+        logger.warning(f"Duplicate lookup failed: {str(e)}", exc_info=True)
+        return None
+
+def discard_unfinished(podcast_name, episode_title):
+    """
+    Delete the checkpoint and preview of an episode whose transcription was abandoned.
+    """
+    PartialTranscript.objects.filter(podcast_name=podcast_name, episode_title=episode_title).delete()
+    Transcript.objects.filter(podcast_name=podcast_name, episode_title=episode_title, is_preview=True).delete()
+
+def save_transcript(podcast_name, episode_title, transcription, publication_date, segments):
+    """
+    Store a finished transcript with its timed segments, replacing any preview, and
+    remove its checkpoint.
+
+    :param publication_date: datetime or None
+    :param segments: list of dicts with start, end and text
+    :return: tuple of (Transcript, bool created)
+    """
+    transcript, created = Transcript.objects.update_or_create(
+        podcast_name=podcast_name,
+        episode_title=episode_title,
+        defaults={
+            'transcript_text': transcription,
+            'publication_date': publication_date,
+            'is_preview': False,
+        }
+    )
+    transcript.segments.all().delete()
+    TranscriptSegment.objects.bulk_create([
+        TranscriptSegment(transcript=transcript, start=s['start'], end=s['end'], text=s['text'])
+        for s in segments if s['start'] is not None
+    ])
+    PartialTranscript.objects.filter(podcast_name=podcast_name, episode_title=episode_title).delete()
+    return transcript, created
+
+def finish_as_duplicate(sse_url, podcast_name, episode_title, match):
+    """
+    Stop transcribing an episode that repeats an existing transcript.
+
+    The interrupted run's checkpoint and preview are removed, and the client receives
+    the existing transcript.
+
+    :return: Transcript object of the original episode
+    """
+    original, score = match
+    logger.info(f"{podcast_name} - {episode_title} repeats {original} ({score:.0%} of its opening), stopping transcription")
+    persistence.write(discard_unfinished, podcast_name, episode_title)
+    send_sse_message(sse_url, {
+        "type": "existing_transcript",
+        "text": original.transcript_text,
+        "duplicate_of": {"podcast_name": original.podcast_name, "episode_title": original.episode_title},
+    })
+    return original
+
+def transcribe_audio(input_file, sse_url, podcast_name, episode_title, publication_date, backend=None):
+    """
+    Transcribe the audio file using the configured transcription backend.
 
     This function handles the core transcription process, including checking for
     existing transcripts, running the Whisper.cpp binary, and saving the results.
+    Stretches of audio that recur across episodes of the same podcast (intros,
+    sponsor reads, outros) are detected by audio fingerprint and their cached text is
+    reused instead of being sent to whisper again. Partial output is checkpointed
+    periodically, and a rerun after a crash continues from the last checkpoint.
+    Before the full pass, a preview of the first minutes is produced with a
+    smaller model so the client sees text early. Episodes whose opening repeats a
+    stored transcript (reruns, "best of" episodes, cross-posted shows) are stopped
+    as soon as that is clear, and the existing transcript is returned. With
+    TRANSCRIPTION_BATCHING on, short episodes share one backend run, see batching.
 
     :param input_file: str, path to the input audio file
     :param sse_url: str, URL for sending Server-Sent Events
     :param podcast_name: str, name of the podcast
     :param episode_title: str, title of the episode
     :param publication_date: str, publication date of the episode
+    :param backend: str, name of the transcription backend, or None for the default
     :return: Transcript object or None if transcription fails
     """
     logger.info(f"Starting transcription for {podcast_name} - {episode_title}")
-    main_script = os.path.join(WHISPER_CPP_DIR, "main")
-    logger.info(f"Using main script: {main_script}")
 
     # Check for existing transcript to avoid unnecessary processing
     existing_transcript = Transcript.objects.filter(podcast_name=podcast_name, episode_title=episode_title).first()
-    if existing_transcript and existing_transcript.transcript_text:
+    if existing_transcript and existing_transcript.transcript_text and not existing_transcript.is_preview:
         logger.info(f"Non-empty transcript already exists for podcast: {podcast_name}, episode: {episode_title}")
         send_sse_message(sse_url, {"type": "existing_transcript", "text": existing_transcript.transcript_text})
         return existing_transcript
 
-    # Run Whisper.cpp transcription process
-    logger.info("Starting whisper.cpp transcription process")
-    process = subprocess.Popen([
-        main_script, "-m", MODEL_PATH,
-        "-f", input_file,
-        "--no-timestamps",
-        "--no-prints",
-        "--print-progress",
-    ], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, text=True)
-
-    transcript_lines = []
-    for line in process.stdout:
-        line = line.strip()
-        if line:
-            logger.info(f"Transcription line: {line}")
-            transcript_lines.append(line)
-            send_sse_message(sse_url, {"type": "transcription_text", "text": line})
-
-    process.wait()
-    if process.returncode != 0:
-        error_message = f"Transcription failed. Return code: {process.returncode}"
-        logger.error(error_message)
-        send_sse_message(sse_url, {"type": "error", "message": error_message})
-        return None
+    # Look for audio we have already transcribed in earlier episodes
+    hashes = offsets = None
+    reused_ranges = []
+    if FINGERPRINT_ENABLED:
+        try:
+            with profiling.stage('fingerprint'):
+                hashes, offsets = fingerprint.compute_fingerprint(input_file)
+            recurring = fingerprint.find_recurring_segments(podcast_name, episode_title, hashes, offsets)
+            reused_ranges = fingerprint.reusable_segments(podcast_name, recurring)
+        except Exception as e:
+            logger.warning(f"Fingerprinting failed, transcribing the whole episode: {str(e)}", exc_info=True)
+            hashes = offsets = None
+            reused_ranges = []
+
+    # Resume after the last checkpoint if an earlier run was interrupted
+    checkpoint = PartialTranscript.objects.filter(podcast_name=podcast_name, episode_title=episode_title).first()
+    segments = list(checkpoint.segments) if checkpoint else []
+    resume_offset = checkpoint.audio_offset if checkpoint else 0.0
+    if segments:
+        logger.info(f"Resuming transcription at {resume_offset:.1f}s from {len(segments)} checkpointed segments")
+        send_sse_message(sse_url, {"type": "transcription_text", "text": ' '.join(s['text'] for s in segments), "resumed": True})
+    elif PREVIEW_ENABLED and sse_url:
+        # Only worth it when a client is watching; backfill jobs go straight to the full pass
+        with profiling.stage('preview'):
+            preview_segments = transcribe_preview(input_file, sse_url, podcast_name, episode_title, publication_date, backend)
+        # Like the full pass, leave recurring material such as the intro out of the comparison
+        preview_text = ' '.join(segment['text'] for segment in preview_segments if outside_ranges(segment, reused_ranges))
+        if len(preview_text.split()) >= dedup.OPENING_WORDS:
+            match = find_duplicate(preview_text, podcast_name, episode_title)
+            if match:
+                return finish_as_duplicate(sse_url, podcast_name, episode_title, match)
+
+    last_checkpoint = time.monotonic()
+
+    def save_checkpoint(segment):
+        nonlocal last_checkpoint
+        segments.append(segment)
+        if segment['end'] is None or time.monotonic() - last_checkpoint < CHECKPOINT_INTERVAL_SECONDS:
+            return
+        # Checkpoints are not waited for; the writer applies them in order
+        persistence.submit(
+            PartialTranscript.objects.update_or_create,
+            podcast_name=podcast_name,
+            episode_title=episode_title,
+            defaults={'audio_offset': segment['end'], 'segments': list(segments)}
+        )
+        last_checkpoint = time.monotonic()
+        logger.info(f"Checkpointed {len(segments)} segments at {segment['end']:.1f}s")
+
+    # Reused segments are recurring material shared with other episodes, so only newly
+    # transcribed text is compared against stored openings
+    fresh_text = []
+    fresh_words = 0
+    duplicate_checked = bool(segments)
+    match = None
+
+    # Short episodes are transcribed together with other short ones
+    engine = batching.batched(backends.get_backend(backend), input_file)
+    for step in plan_transcription(reused_ranges, resume_offset):
+        job_control.check_cancelled()
+        if step[0] == 'reuse':
+            for segment in step[1]['segments']:
+                save_checkpoint(segment)
+                send_sse_message(sse_url, {"type": "transcription_text", "text": segment['text'], "reused": True})
+            continue
+
+        _, offset, duration = step
+        try:
+            with closing(engine.transcribe(input_file, offset, duration)) as stream:
+                for segment in stream:
+                    send_sse_message(sse_url, {"type": "transcription_text", "text": segment['text']})
+                    save_checkpoint(segment)
+                    if duplicate_checked:
+                        continue
+                    fresh_text.append(segment['text'])
+                    fresh_words += len(segment['text'].split())
+                    if fresh_words >= dedup.OPENING_WORDS:
+                        duplicate_checked = True
+                        match = find_duplicate(' '.join(fresh_text), podcast_name, episode_title)
+                        if match:
+                            break  # Closing the stream stops the backend
+        except backends.TranscriptionError as e:
+            error_message = str(e)
+            logger.error(error_message)
+            send_sse_message(sse_url, {"type": "error", "message": error_message})
+            return None
+        if match:
+            return finish_as_duplicate(sse_url, podcast_name, episode_title, match)
 
     # Process and save the transcription result
     logger.info("Transcription process completed successfully")
-    if transcript_lines and transcript_lines[-1].startswith("output_txt"):
-        transcript_lines.pop()
-
-    transcription = ' '.join(transcript_lines)
+    transcription = ' '.join(segment['text'] for segment in segments)
     logger.info(f"Transcription result (first 100 characters): {transcription[:100]}...")
 
     try:
         parsed_date = parse_datetime(publication_date) if publication_date else None
-        transcript, created = Transcript.objects.update_or_create(
-            podcast_name=podcast_name,
-            episode_title=episode_title,
-            defaults={
-                'transcript_text': transcription,
-                'publication_date': parsed_date
-            }
-        )
+        with profiling.stage('save'):
+            transcript, created = persistence.write(save_transcript, podcast_name, episode_title, transcription, parsed_date, segments)
+        if hashes is not None:
+            persistence.submit(fingerprint.save_fingerprint, podcast_name, episode_title, hashes, offsets)
         logger.info(f"Transcript {'created' if created else 'updated'} for podcast: {podcast_name}, episode: {episode_title}")
         send_sse_message(sse_url, {"type": "transcription_complete", "text": transcription})
         return transcript
@@ -177,16 +389,30 @@ def start_transcription(request):
         episode_title = request.POST.get('episode_title')
         publication_date = request.POST.get('publication_date')
         episode_id = request.POST.get('episode_id')
+        backend = request.POST.get('backend') or None
+        try:
+            duration = float(request.POST['duration']) if request.POST.get('duration') else None
+        except ValueError:
+            return JsonResponse({"error": "Invalid duration"}, status=400)
         logger.info(f"Received transcription request for podcast: {podcast_name}, episode: {episode_title}, published: {publication_date}")
         logger.info(f"Audio URL: {audio_url}")
         logger.info(f"Episode ID: {episode_id}")
         
         sse_url = request.build_absolute_uri(f'/sse/{episode_id}/')
         logger.info(f"SSE URL: {sse_url}")
+
+        if backend and backend not in backends.BACKENDS:
+            return JsonResponse({"error": f"Unknown transcription backend: {backend}"}, status=400)
+
+        if jobs.TRANSCRIPTION_MODE == 'distributed':
+            # Worker nodes lease the job from the database and report progress through it
+            job = jobs.enqueue(episode_id, audio_url, podcast_name, episode_title, publication_date, backend)
+            return JsonResponse({"status": "Transcription started", "job_id": job.pk})
         
         try:
+            events.logs.reset(episode_id)  # Clients of this transcription must not see the events of an earlier one
             # Start transcription in a separate thread to avoid blocking
-            thread = threading.Thread(target=download_and_transcribe, args=(audio_url, sse_url, podcast_name, episode_title, publication_date))
+            thread = threading.Thread(target=persistence.closes_connections(download_and_transcribe), args=(audio_url, sse_url, podcast_name, episode_title, publication_date, backend, episode_id, duration))
             thread.start()
             
             logger.info("Transcription thread started")
@@ -198,142 +424,252 @@ def start_transcription(request):
     logger.error("Invalid request method for start_transcription")
     return JsonResponse({"error": "Invalid request method"}, status=400)
 
-def download_and_transcribe(audio_url, sse_url, podcast_name, episode_title, publication_date):
+def download_audio(audio_url):
+    """
+    Download an audio file to a temporary file.
+
+    Downloads are retried a few times for robustness against network issues or
+    server restrictions. Inside a job the file is created in the job's scratch
+    directory, and the download stops as soon as the job is cancelled.
+
+    :param audio_url: str, URL of the audio file to download
+    :raises: RequestException if the download fails after all retries
+    :raises: job_control.JobCancelled if the job is cancelled during the download
+    :return: str, path to the downloaded file
+    """
+    logger.info(f"Downloading audio file from {audio_url}...")
+    decoded_audio_url = unquote(audio_url)
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+        'Referer': urlparse(decoded_audio_url).scheme + '://' + urlparse(decoded_audio_url).netloc,
+    }
+
+    # Implement retry mechanism for robustness
+    max_retries = 3
+    retry_delay = 5  # seconds
+
+    for attempt in range(max_retries):
+        input_file = job_control.scratch_file(".mp3")
+        try:
+            with open(input_file, 'wb') as temp_mp3, \
+                    requests.get(decoded_audio_url, stream=True, timeout=30, headers=headers) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=8192):
+                    job_control.check_cancelled()
+                    temp_mp3.write(chunk)
+            logger.info(f"Audio file downloaded: {input_file}")
+            return input_file
+        except job_control.JobCancelled:
+            os.unlink(input_file)
+            raise
+        except RequestException as e:
+            os.unlink(input_file)
+            if attempt < max_retries - 1:
+                logger.warning(f"Download attempt {attempt + 1} failed: {str(e)}. Retrying in {retry_delay} seconds...")
+                time.sleep(retry_delay)
+            else:
+                logger.error(f"Error downloading audio file after {max_retries} attempts: {str(e)}")
+                raise
+
+def convert_and_transcribe(input_file, sse_url, podcast_name, episode_title, publication_date, backend=None):
+    """
+    Convert a downloaded audio file to WAV and transcribe it.
+
+    Both the downloaded file and the converted WAV are removed afterwards.
+
+    :param input_file: str, path to the downloaded audio file
+    :param sse_url: str, URL for sending Server-Sent Events, or None
+    :param podcast_name: str, name of the podcast
+    :param episode_title: str, title of the episode
+    :param publication_date: str, publication date of the episode
+    :param backend: str, name of the transcription backend, or None for the default
+    :return: Transcript object or None if transcription fails
+    """
+    logger.info("Converting audio to WAV...")
+    wav_file = job_control.scratch_file(".wav")
+
+    try:
+        with profiling.stage('convert'):
+            convert_audio(input_file, wav_file)
+        logger.info(f"Audio converted to WAV: {wav_file}")
+
+        logger.info("Starting transcription...")
+        with profiling.stage('transcribe'):
+            return transcribe_audio(wav_file, sse_url, podcast_name, episode_title, publication_date, backend)
+    finally:
+        logger.info("Cleaning up temporary files...")
+        for path in (input_file, wav_file):
+            if os.path.exists(path):
+                os.unlink(path)
+
+def download_and_transcribe(audio_url, sse_url, podcast_name, episode_title, publication_date, backend=None, job_key=None, duration=None):
     """
     Download the audio file and initiate the transcription process.
 
     This function handles the entire process from downloading the audio file
     to initiating the transcription. It includes error handling and retries
-    for robustness against network issues or server restrictions.
+    for robustness against network issues or server restrictions. The work runs
+    as a job that cancel_transcription can stop, and all temporary files live in
+    the job's scratch directory, which is removed when the job ends. A job that
+    would overcommit the disk, memory or CPU of the host waits until it fits, and
+    the client is told why. With PROFILE_JOBS on, each job's stages are profiled.
 
     :param audio_url: str, URL of the audio file to download
     :param sse_url: str, URL for sending Server-Sent Events
     :param podcast_name: str, name of the podcast
     :param episode_title: str, title of the episode
     :param publication_date: str, publication date of the episode
-    :return: None
+    :param backend: str, name of the transcription backend, or None for the default
+    :param job_key: str, key to cancel the job with, defaults to the audio URL
+    :param duration: float, episode duration in seconds if known, used to estimate the job's footprint
+    :return: Transcript object, or None if the transcription failed
     """
+    transcript = None
     try:
         logger.info(f"Starting download_and_transcribe for {podcast_name} - {episode_title}")
-        
-        # Ensure Whisper.cpp is available
-        logger.info("Checking whisper.cpp...")
-        if not os.path.exists(os.path.join(WHISPER_CPP_DIR, "main")):
-            logger.info("Cloning and building whisper.cpp...")
-            subprocess.run(["git", "clone", WHISPER_CPP_REPO, WHISPER_CPP_DIR], check=True)
-            os.chdir(WHISPER_CPP_DIR)
-            subprocess.run(["make"], check=True)
-            os.chdir(settings.BASE_DIR)
-        
-        logger.info("Downloading model if necessary...")
-        download_model()
-
-        logger.info(f"Downloading audio file from {audio_url}...")
-        decoded_audio_url = unquote(audio_url)
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-            'Referer': urlparse(decoded_audio_url).scheme + '://' + urlparse(decoded_audio_url).netloc,
-        }
 
-        # Implement retry mechanism for robustness
-        max_retries = 3
-        retry_delay = 5  # seconds
-
-        for attempt in range(max_retries):
-            try:
-                with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as temp_mp3:
-                    response = requests.get(decoded_audio_url, stream=True, timeout=30, headers=headers)
-                    response.raise_for_status()
-                    for chunk in response.iter_content(chunk_size=8192):
-                        temp_mp3.write(chunk)
-                    input_file = temp_mp3.name
-                logger.info(f"Audio file downloaded: {input_file}")
-                break
-            except RequestException as e:
-                if attempt < max_retries - 1:
-                    logger.warning(f"Download attempt {attempt + 1} failed: {str(e)}. Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                else:
-                    logger.error(f"Error downloading audio file after {max_retries} attempts: {str(e)}")
+        def on_defer(reason):
+            send_sse_message(sse_url, {"type": "deferred", "message": f"Waiting for resources. {reason}"})
+
+        job_key = job_key or audio_url
+        with profiling.job_profile(job_key, podcast=podcast_name, episode=episode_title):
+            footprint = admission.footprint_for(audio_url, duration)
+            with job_control.run_job(job_key), admission.admit(footprint, on_defer):
+                try:
+                    with profiling.stage('download'):
+                        input_file = download_audio(audio_url)
+                except RequestException as e:
                     send_sse_message(sse_url, {"type": "error", "message": f"Error downloading audio file: {str(e)}"})
-                    return
+                    return None
 
-        logger.info("Converting audio to WAV...")
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_wav:
-            wav_file = temp_wav.name
-        
-        convert_audio(input_file, wav_file)
-        logger.info(f"Audio converted to WAV: {wav_file}")
-        
-        logger.info("Starting transcription...")
-        transcribe_audio(wav_file, sse_url, podcast_name, episode_title, publication_date)
-        
-        logger.info("Cleaning up temporary files...")
-        os.unlink(input_file)
-        os.unlink(wav_file)
+                transcript = convert_and_transcribe(input_file, sse_url, podcast_name, episode_title, publication_date, backend)
         
         logger.info("Transcription process completed successfully")
-        
+
+    except job_control.JobCancelled:
+        logger.info(f"Transcription cancelled for {podcast_name} - {episode_title}")
+        send_sse_message(sse_url, {"type": "error", "message": "Transcription cancelled", "cancelled": True})
+    except admission.AdmissionError as e:
+        logger.warning(f"Transcription not admitted for {podcast_name} - {episode_title}: {str(e)}")
+        send_sse_message(sse_url, {"type": "error", "message": str(e)})
     except Exception as e:
         logger.error(f"Error during transcription: {str(e)}", exc_info=True)
         send_sse_message(sse_url, {"type": "error", "message": f"Error during transcription: {str(e)}"})
     finally:
         logger.info(f"Finished download_and_transcribe for {podcast_name} - {episode_title}")
         send_sse_message(sse_url, {"type": "transcription_complete"})
+    return transcript
+
+@csrf_exempt
+def cancel_transcription(request):
+    """
+    Cancel the running transcription of an episode.
+
+    The download, ffmpeg and whisper processes of the job are stopped and its
+    temporary files removed. In distributed mode the request is stored on the
+    job and the worker running it stops it at its next check.
+
+    :param request: HttpRequest object
+    :return: JsonResponse with whether a job was found
+    :rtype: JsonResponse
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Invalid request method"}, status=400)
+    episode_id = request.POST.get('episode_id')
+    if not episode_id:
+        return JsonResponse({"error": "Missing episode_id"}, status=400)
+
+    if jobs.TRANSCRIPTION_MODE == 'distributed':
+        cancelled = jobs.request_cancel(episode_id)
+    else:
+        cancelled = job_control.cancel_job(episode_id)
+    if not cancelled:
+        return JsonResponse({"error": "No running transcription for this episode"}, status=404)
+    return JsonResponse({"status": "Cancelling transcription"})
 
 def send_sse_message(sse_url, data):
     """
     Send a Server-Sent Event (SSE) message to the client.
     
     This function is used to update the client with the transcription progress
-    and other relevant information.
+    and other relevant information. Jobs started outside of a request, such as
+    the backfill command, have no client and pass None as the URL. Jobs run by
+    worker nodes pass a job target, and their events are stored in the database.
+    Consecutive lines of transcribed text are merged and sent together, every
+    SSE_COALESCE_SECONDS or SSE_COALESCE_MAX_EVENTS lines.
     """
+    if not sse_url:
+        return
+    sse_coalescer.send(sse_url, data)
+
+def deliver_sse_message(sse_url, data):
+    if sse_url.startswith(jobs.EVENT_TARGET_PREFIX):
+        try:
+            jobs.record_event(sse_url, data)
+        except Exception as e:
+            logger.error(f"Error recording job event: {str(e)}")
+        return
     try:
         json_data = json.dumps(data)
-        response = requests.post(sse_url, data=json_data, headers={'Content-Type': 'application/json'})
+        response = requests.post(sse_url, data=json_data, headers={'Content-Type': 'application/json'}, timeout=SSE_POST_TIMEOUT)
         response.raise_for_status()
-        logger.info(f"SSE message sent successfully: {json_data}")
+        sse_logger.info("SSE message sent: %s", data.get('type'))
     except requests.RequestException as e:
         logger.error(f"Error sending SSE message: {str(e)}")
     except Exception as e:
         logger.error(f"Unexpected error sending SSE message: {str(e)}")
 
+sse_coalescer = events.Coalescer(deliver_sse_message)
+
+def readiness_view(request):
+    """
+    Report whether this host is ready to run transcription jobs.
+
+    Responds with 503 until whisper.cpp is built and the model is downloaded, so
+    load balancers and deploy scripts can wait for the bootstrap to finish.
+
+    :param request: HttpRequest object
+    :return: JsonResponse with the readiness of each dependency
+    :rtype: JsonResponse
+    """
+    status = bootstrap.readiness()
+    return JsonResponse(status, status=200 if status['ready'] else 503)
+
 def search_itunes(query):
     """
     Search for podcasts on iTunes using the given query.
     
     This function is used to fetch podcast search results from iTunes.
+
+    :raises: itunes.ItunesUnavailable if iTunes is throttling us or failing
     """
-    url = f"https://itunes.apple.com/search?term={query}&entity=podcast&limit=10"
-    logger.info(f"Sending request to iTunes API: {url}")
-    try:
-        response = requests.get(url, timeout=300)  # Set a 5-minute timeout
-        response.raise_for_status()  # This will raise an exception for HTTP errors
-        data = response.json()
-        logger.info(f"Received {len(data.get('results', []))} results from iTunes API")
-        return data.get('results', [])
-    except Timeout:
-        logger.error("Timeout error when fetching data from iTunes API")
-        return []
-    except RequestException as e:
-        logger.error(f"Error fetching data from iTunes API: {str(e)}")
-        return []
-    except ValueError as e:
-        logger.error(f"Error parsing JSON response from iTunes API: {str(e)}")
-        return []
+    data = itunes.get('search', {'term': query, 'entity': 'podcast', 'limit': 10}, itunes.INTERACTIVE)
+    logger.info(f"Received {len(data.get('results', []))} results from iTunes API")
+    return data.get('results', [])
 
-def get_podcast_episodes(podcast_id):
+def get_podcast_episodes(podcast_id, priority=itunes.INTERACTIVE):
     """
     Get the episodes of a podcast from iTunes using the podcast ID.
     
     This function is used to fetch the episodes of a specific podcast from iTunes.
+
+    :param priority: int, itunes.INTERACTIVE or itunes.BACKGROUND
+    :raises: itunes.ItunesUnavailable if iTunes is throttling us or failing
+    """
+    data = itunes.get('lookup', {'id': podcast_id, 'entity': 'podcastEpisode', 'limit': 50}, priority)
+    return data.get('results', [])[1:]  # Skip the first result as it's the podcast info
+
+def itunes_unavailable_response(error):
+    """
+    Build the 503 response for an iTunes request that could not be served.
+
+    :param error: itunes.ItunesUnavailable
+    :return: JsonResponse with a Retry-After header when the wait is known
     """
-    url = f"https://itunes.apple.com/lookup?id={podcast_id}&entity=podcastEpisode&limit=50"
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        return data.get('results', [])[1:]  # Skip the first result as it's the podcast info
-    return []
+    response = JsonResponse({'error': str(error)}, status=503)
+    if error.retry_after is not None:
+        response['Retry-After'] = str(max(1, round(error.retry_after)))
+    return response
 
 @register.filter
 def duration_in_minutes(milliseconds):
@@ -357,13 +693,20 @@ def search_view(request):
     episodes = []
     podcast_name = ''
     page_obj = None
+    itunes_error = None
 
     if search_result:
-        podcasts = search_itunes(search_result)
+        try:
+            podcasts = search_itunes(search_result)
+        except itunes.ItunesUnavailable as e:
+            itunes_error = str(e)
 
     podcast_id = request.GET.get('podcast_id')
     if podcast_id:
-        episodes = get_podcast_episodes(podcast_id)
+        try:
+            episodes = get_podcast_episodes(podcast_id)
+        except itunes.ItunesUnavailable as e:
+            itunes_error = str(e)
         if episodes:
             podcast_name = episodes[0]['collectionName']
         paginator = Paginator(episodes, 10)  # Show 10 episodes per page
@@ -373,44 +716,23 @@ def search_view(request):
     # Get library items from the database and sort them alphabetically
     library_items = LibraryItem.objects.all().order_by('name')
 
-    # Get the transcription queue from the session and remove completed items
-    transcription_queue = request.session.get('transcription_queue', [])
-    transcription_queue = [item for item in transcription_queue if item['status'] != 'success']
-    
-    modified = False
-    for item in transcription_queue:
-        if item['status'] == 'in-progress':
-            item['status'] = 'pending'
-            modified = True
-    
-    if modified or len(transcription_queue) != len(request.session.get('transcription_queue', [])):
-        request.session['transcription_queue'] = transcription_queue
-        request.session.modified = True
-
-    # Get latest episodes from all library podcasts
-    latest_episodes = []
-    for item in library_items:
-        podcast_episodes = get_podcast_episodes(item.collection_id)
-        for episode in podcast_episodes[:5]:
-            episode['duration_minutes'] = duration_in_minutes(episode.get('trackTimeMillis', 0))
-        latest_episodes.extend(podcast_episodes[:5])  # Get top 5 episodes from each podcast
-    
-    # Sort latest episodes by publication date
-    latest_episodes.sort(key=lambda x: x['releaseDate'], reverse=True)
-    
-    # Paginate latest episodes
-    latest_paginator = Paginator(latest_episodes, 10)
-    latest_page_number = request.GET.get('latest_page')
-    latest_page_obj = latest_paginator.get_page(latest_page_number)
+    # Get the user's transcription queue, removing completed items and resetting interrupted ones
+    owner = get_queue_owner(request)
+    owned_items = QueueItem.objects.filter(owner=owner)
+    owned_items.filter(status='success').delete()
+    if owned_items.filter(status='in-progress').update(status='pending'):
+        http_cache.bump(http_cache.queue_key(owner))
+    transcription_queue = json.dumps(list(owned_items.values(*QUEUE_FIELDS)))
 
+    # The latest episodes are loaded by the page from latest_episodes_view
     context = {
         'search_result': search_result,
         'podcasts': podcasts,
         'episodes': page_obj,
-        'latest_episodes': latest_page_obj,
         'podcast_name': podcast_name,
         'library_items': library_items,
         'transcription_queue': transcription_queue,
+        'itunes_error': itunes_error,
     }
     return render(request, 'podcast_transcriber_app/search.html', context)
 
@@ -442,11 +764,16 @@ def add_to_library(request):
             return JsonResponse({"status": "already_exists"})
     return JsonResponse({"status": "error"}, status=400)
 
+@http_cache.compress_page
+@cache_control(max_age=0, must_revalidate=True)
+@condition(etag_func=http_cache.library_etag, last_modified_func=http_cache.library_last_modified)
 def get_library_items(request):
     """
     Get the library items from the database.
     
     This function is used to retrieve the library items from the database.
+    Unchanged libraries are answered with 304 Not Modified, based on the
+    library version rather than its contents.
     """
     library_items = LibraryItem.objects.all().order_by('name')
     return JsonResponse({"library_items": list(library_items.values())})
@@ -472,25 +799,52 @@ def sse_stream(request, episode_id):
     
     This view function handles the Server-Sent Events (SSE) for transcription updates,
     allowing the client to receive real-time updates on the transcription process.
+    Every event carries an id. Browsers send the id of the last event they received
+    in a Last-Event-ID header when they reconnect, and the stream resumes after it.
     """
     if request.method == 'POST':
         try:
             data = json.loads(request.body)
-            message = f"data: {json.dumps(data)}\n\n"
-            StreamingHttpResponse.sse_queue.put(message)
+            events.logs.publish(episode_id, data)
             return HttpResponse(status=204)
         except json.JSONDecodeError:
             return HttpResponse("Invalid JSON", status=400)
-    
+
+    last_event_id = events.parse_last_event_id(request)
+
     def event_stream():
+        yield f"retry: {events.RETRY_MILLISECONDS}\n\n"
+        cursor = last_event_id
         while True:
-            try:
-                message = StreamingHttpResponse.sse_queue.get(timeout=20)
-                yield message
-            except queue.Empty:
-                yield 'data: {"type": "keepalive"}\n\n'
-    
-    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+            new_events, missed = events.logs.wait(episode_id, cursor, events.KEEPALIVE_SECONDS)
+            if missed:
+                yield events.format_event({"type": "events_missed", "count": missed})
+            for event_id, data in new_events:
+                cursor = event_id
+                yield events.format_event(data, event_id)
+            if not new_events:
+                yield events.format_event({"type": "keepalive"})
+
+    def job_event_stream():
+        # Jobs run on worker nodes, so poll the events they store in the database
+        yield f"retry: {events.RETRY_MILLISECONDS}\n\n"
+        cursor = last_event_id
+        idle_since = time.monotonic()
+        while True:
+            job = jobs.latest_job(episode_id)
+            job_events = jobs.events_after(job.pk, cursor) if job else []
+            for event in job_events:
+                cursor = event['id']
+                yield events.format_event(event['data'], event['id'])
+            if job_events:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since >= events.KEEPALIVE_SECONDS:
+                idle_since = time.monotonic()
+                yield events.format_event({"type": "keepalive"})
+            time.sleep(JOB_EVENT_POLL_SECONDS)
+
+    stream = job_event_stream() if jobs.TRANSCRIPTION_MODE == 'distributed' else event_stream()
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
     response['Cache-Control'] = 'no-cache'
     response['X-Accel-Buffering'] = 'no'
     return response
@@ -511,23 +865,45 @@ def set_media_permissions():
         for f in files:
             os.chmod(os.path.join(root, f), stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP | stat.S_IWGRP | stat.S_IROTH)
 
+@http_cache.compress_page
+@conditional_page
 def search_podcasts(request):
     """
     Handle the request to search for podcasts.
     
     This view function handles the request to search for podcasts using the iTunes API.
+    Results may be reused by the browser for SEARCH_MAX_AGE seconds.
     """
     query = request.GET.get('q', '')
     logger.info(f"Received search query: {query}")
     
     if query:
-        podcasts = search_itunes(query)
+        try:
+            podcasts = search_itunes(query)
+        except itunes.ItunesUnavailable as e:
+            logger.warning(f"iTunes search for {query} failed: {str(e)}")
+            return itunes_unavailable_response(e)
         logger.info(f"Found {len(podcasts)} podcasts")
-        return JsonResponse({'podcasts': podcasts, 'debug_info': {'query': query, 'podcast_count': len(podcasts)}})
+        response = JsonResponse({'podcasts': podcasts, 'debug_info': {'query': query, 'podcast_count': len(podcasts)}})
+        patch_cache_control(response, max_age=http_cache.SEARCH_MAX_AGE)
+        return response
     
     logger.warning("No query provided for podcast search")
     return JsonResponse({'podcasts': [], 'debug_info': {'query': query, 'podcast_count': 0}})
 
+def get_queue_owner(request):
+    """
+    Identify the owner of a transcription queue by the session key.
+
+    A session is created if the client does not have one yet.
+
+    :param request: HttpRequest object
+    :return: str, session key
+    """
+    if not request.session.session_key:
+        request.session.create()
+    return request.session.session_key
+
 @csrf_exempt
 def add_to_queue(request):
     """
@@ -537,24 +913,18 @@ def add_to_queue(request):
     """
     if request.method == 'POST':
         episode_id = request.POST.get('episode_id')
-        episode_title = request.POST.get('episode_title')
-        audio_url = request.POST.get('audio_url')
-        podcast_name = request.POST.get('podcast_name')
-        publication_date = request.POST.get('publication_date')
-        
-        queue = request.session.get('transcription_queue', [])
-        if not any(item['episode_id'] == episode_id for item in queue):
-            new_item = {
-                'episode_id': episode_id,
-                'episode_title': episode_title,
-                'audio_url': audio_url,
-                'podcast_name': podcast_name,
-                'publication_date': publication_date,
-                'status': 'pending'
+        _, created = QueueItem.objects.get_or_create(
+            owner=get_queue_owner(request),
+            episode_id=episode_id,
+            defaults={
+                'episode_title': request.POST.get('episode_title') or '',
+                'audio_url': request.POST.get('audio_url') or '',
+                'podcast_name': request.POST.get('podcast_name') or '',
+                'publication_date': request.POST.get('publication_date') or '',
+                'status': 'pending',
             }
-            queue.append(new_item)
-            request.session['transcription_queue'] = queue
-            request.session.modified = True
+        )
+        if created:
             return JsonResponse({'status': 'success'})
         else:
             return JsonResponse({'status': 'already_in_queue'})
@@ -568,21 +938,28 @@ def remove_from_queue(request):
     """
     if request.method == 'POST':
         episode_id = request.POST.get('episode_id')
-        queue = request.session.get('transcription_queue', [])
-        queue = [item for item in queue if item['episode_id'] != episode_id]
-        request.session['transcription_queue'] = queue
-        request.session.modified = True
+        QueueItem.objects.filter(owner=get_queue_owner(request), episode_id=episode_id).delete()
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'}, status=400)
 
+def queue_etag(request):
+    return http_cache.version_etag(http_cache.queue_key(get_queue_owner(request)))
+
+def queue_last_modified(request):
+    return http_cache.current_version(http_cache.queue_key(get_queue_owner(request)))[1]
+
+@http_cache.compress_page
+@cache_control(private=True, max_age=0, must_revalidate=True)
+@condition(etag_func=queue_etag, last_modified_func=queue_last_modified)
 def get_queue(request):
     """
-    Get the transcription queue from the session.
+    Get the transcription queue of the current user.
     
-    This function is used to retrieve the transcription queue from the user's session.
+    This function is used to retrieve the transcription queue owned by the user's session.
+    Unchanged queues are answered with 304 Not Modified, based on the queue version.
     """
-    queue = request.session.get('transcription_queue', [])
-    return JsonResponse({'queue': queue})
+    queue = QueueItem.objects.filter(owner=get_queue_owner(request)).values(*QUEUE_FIELDS)
+    return JsonResponse({'queue': list(queue)})
 
 def update_queue_status(request):
     """
@@ -593,13 +970,11 @@ def update_queue_status(request):
     if request.method == 'POST':
         episode_id = request.POST.get('episode_id')
         new_status = request.POST.get('status')
-        queue = request.session.get('transcription_queue', [])
-        for item in queue:
-            if item['episode_id'] == episode_id:
-                item['status'] = new_status
-                break
-        request.session['transcription_queue'] = queue
-        request.session.modified = True
+        if new_status not in dict(QueueItem.STATUS_CHOICES):
+            return JsonResponse({'status': 'error'}, status=400)
+        owner = get_queue_owner(request)
+        if QueueItem.objects.filter(owner=owner, episode_id=episode_id).update(status=new_status):
+            http_cache.bump(http_cache.queue_key(owner))
         return JsonResponse({'status': 'success'})
     return JsonResponse({'status': 'error'}, status=400)
 
@@ -618,30 +993,29 @@ class MyAppConfig(AppConfig):
         reset_transcription_queue()
 
 @receiver(post_migrate)
-def on_post_migrate(sender, **kwargs):
-    # This ensures the queue is reset after migrations
+def on_post_migrate(sender, apps=None, **kwargs):
+    # This ensures the queue is reset after migrations. post_migrate is sent once
+    # per app, so only react to our own, and only once the queue table exists.
+    # flush sends it too, without the apps argument.
+    if sender.name != 'podcast_transcriber_app':
+        return
+    try:
+        (apps or sender.apps).get_model('podcast_transcriber_app', 'QueueItem')
+    except LookupError:
+        return
     reset_transcription_queue()
 
 def reset_transcription_queue():
-    from django.contrib.sessions.models import Session
-    from django.contrib.sessions.backends.db import SessionStore
-    
-    # Iterate through all sessions
-    for session in Session.objects.all():
-        session_data = session.get_decoded()
-        if 'transcription_queue' in session_data:
-            queue = session_data['transcription_queue']
-            modified = False
-            # Remove completed transcriptions and reset 'in-progress' to 'pending'
-            queue = [item for item in queue if item['status'] != 'success']
-            for item in queue:
-                if item['status'] == 'in-progress':
-                    item['status'] = 'pending'
-                    modified = True
-            if modified or len(queue) != len(session_data['transcription_queue']):
-                session_store = SessionStore(session_key=session.session_key)
-                session_store['transcription_queue'] = queue
-                session_store.save()
+    """
+    Remove completed transcriptions and reset interrupted ones to pending for all users.
+
+    This is two indexed statements, independent of the number of sessions.
+    """
+    QueueItem.objects.filter(status='success').delete()
+    interrupted = QueueItem.objects.filter(status='in-progress')
+    owners = list(interrupted.values_list('owner', flat=True).distinct())
+    interrupted.update(status='pending')
+    http_cache.bump_queues(owners)
 
 import os
 from django.http import JsonResponse
@@ -668,7 +1042,8 @@ def export_transcripts(request):
         base_path = '/Users/tejaskale/Library/Mobile Documents/com~apple~CloudDocs/Documents/Archive/Podcasts'
         
         try:
-            transcripts = Transcript.objects.all()
+            # The text is only loaded for transcripts that are not exported yet
+            transcripts = Transcript.objects.filter(is_preview=False).defer('transcript_text')
             exported_count = 0
             skipped_count = 0
             failed_count = 0
@@ -716,13 +1091,226 @@ def export_transcripts(request):
         'message': 'Invalid request method'
     })
 
+def stream_transcripts(request):
+    """
+    Stream finished transcripts as JSON Lines or CSV.
+
+    Rows are read from a server-side cursor and written as they arrive, so exports
+    of any size use constant memory. Each row carries a cursor; passing the last
+    one received as `cursor` resumes an interrupted or incremental pull. Supports
+    `since`/`until` (ISO 8601, on the last update time), repeatable `podcast`
+    filters, gzip compression and ETag revalidation.
+
+    :param request: HttpRequest object
+    :return: StreamingHttpResponse with the transcripts, 304 if unchanged, or 400 for invalid parameters
+    :rtype: StreamingHttpResponse
+    """
+    export_format = request.GET.get('format', 'jsonl')
+    if export_format not in exports.EXPORT_FORMATS:
+        return JsonResponse({"error": f"Unknown format: {export_format}"}, status=400)
+    try:
+        transcripts = exports.export_queryset(request.GET)
+    except exports.ExportError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    use_gzip = http_cache.accepts_encoding(request, 'gzip')
+    etag = exports.export_etag(transcripts, export_format, 'gzip' if use_gzip else 'identity')
+    # If-None-Match uses the weak comparison: W/"x" matches "x"
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in if_none_match or etag in [tag.removeprefix('W/') for tag in if_none_match]:
+        response = HttpResponse(status=304)
+        response['ETag'] = etag
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+    rows = exports.export_rows(transcripts)
+    if export_format == 'csv':
+        content, content_type = exports.stream_csv(rows), 'text/csv; charset=utf-8'
+    else:
+        content, content_type = exports.stream_jsonl(rows), 'application/x-ndjson; charset=utf-8'
+
+    response = StreamingHttpResponse(exports.gzip_stream(content) if use_gzip else content, content_type=content_type)
+    if use_gzip:
+        response['Content-Encoding'] = 'gzip'
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Content-Disposition'] = f'attachment; filename="transcripts.{export_format}"'
+    return response
+
+def list_transcripts_view(request):
+    """
+    List finished transcripts, newest publication first, without their text.
+
+    :param request: HttpRequest object with optional `podcast` (repeatable),
+                    `limit` (default 50, at most 200) and `cursor` from the previous page
+    :return: JsonResponse with the transcripts and the cursor of the next page, or 400 for invalid parameters
+    :rtype: JsonResponse
+    """
+    try:
+        transcripts, next_cursor = browse.list_transcripts(request.GET)
+    except browse.BrowseError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse({"transcripts": transcripts, "next_cursor": next_cursor})
+
+def transcript_text_view(request, transcript_id):
+    """
+    Read a page of a transcript's text.
+
+    Pages are ranges of characters (`unit=chars`, the default, from `start`) or
+    of timed segments (`unit=segments`). Each page carries the cursor of the next
+    one; cursors of a transcript that was transcribed again since get 409.
+
+    :param request: HttpRequest object with optional `unit`, `start`, `limit` and `cursor`
+    :param transcript_id: int, id of the transcript
+    :return: JsonResponse with the page, 404 if the transcript is unknown, 409 for outdated cursors
+    :rtype: JsonResponse
+    """
+    try:
+        page = browse.text_page(transcript_id, request.GET)
+    except browse.BrowseError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except browse.TranscriptChanged as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    if page is None:
+        return JsonResponse({"error": "Transcript not found"}, status=404)
+    return JsonResponse(page)
+
+def stream_transcript_text(request, transcript_id):
+    """
+    Stream the text of a transcript as plain text, reading it from the database
+    in pieces, from character `start` onwards.
+
+    :param request: HttpRequest object with optional `start`
+    :param transcript_id: int, id of the transcript
+    :return: StreamingHttpResponse with the text, or 404 if the transcript is unknown
+    :rtype: StreamingHttpResponse
+    """
+    try:
+        start = max(int(request.GET.get('start', 0)), 0)
+    except ValueError:
+        return JsonResponse({"error": "Invalid start"}, status=400)
+    version = browse.get_version(transcript_id)
+    if version is None:
+        return JsonResponse({"error": "Transcript not found"}, status=404)
+    updated_at, text_length = version
+    response = StreamingHttpResponse(
+        browse.stream_text(transcript_id, updated_at, text_length, start), content_type='text/plain; charset=utf-8'
+    )
+    response['Last-Modified'] = http_date(updated_at.timestamp())
+    return response
+
+def related_episodes_view(request):
+    """
+    Find the episodes whose transcripts are most similar to a transcript.
+
+    The transcript is given by `transcript_id`, or by `podcast_name` and
+    `episode_title`. Similarity is the cosine of TF-IDF vectors served from the
+    precomputed related episodes index, so no other transcript is read.
+
+    :param request: HttpRequest object with optional `k` (default 10, at most 50)
+                    and `other_podcasts` to leave out episodes of the same podcast
+    :return: JsonResponse with the related episodes, best first, or 404 if the transcript is unknown
+    :rtype: JsonResponse
+    """
+    transcripts = Transcript.objects.filter(is_preview=False)
+    try:
+        if request.GET.get('transcript_id'):
+            transcripts = transcripts.filter(pk=int(request.GET['transcript_id']))
+        else:
+            transcripts = transcripts.filter(
+                podcast_name=request.GET.get('podcast_name', ''), episode_title=request.GET.get('episode_title', '')
+            )
+        k = min(max(int(request.GET.get('k', 10)), 1), 50)
+    except ValueError:
+        return JsonResponse({"error": "Invalid transcript_id or k"}, status=400)
+    transcript = transcripts.first()
+    if transcript is None:
+        return JsonResponse({"error": "Transcript not found"}, status=404)
+
+    other_podcasts = request.GET.get('other_podcasts', '').lower() in ('1', 'true', 'yes')
+    episodes = related.related_episodes(transcript, k, other_podcasts)
+    return JsonResponse({'transcript_id': transcript.pk, 'related': episodes})
+
+def build_latest_episodes():
+    """
+    Merge the latest episodes of every podcast in the library, newest first.
+
+    :return: tuple of (list of episode dicts with LATEST_EPISODE_FIELDS, bool complete)
+    """
+    latest_episodes = []
+    complete = True
+    for item in LibraryItem.objects.all().order_by('name'):
+        try:
+            podcast_episodes = get_podcast_episodes(item.collection_id, itunes.BACKGROUND)
+        except itunes.ItunesUnavailable as e:
+            logger.warning(f"Skipping latest episodes of {item.name}: {str(e)}")
+            complete = False
+            continue
+        for episode in podcast_episodes[:LATEST_EPISODES_PER_PODCAST]:
+            episode['duration_minutes'] = duration_in_minutes(episode.get('trackTimeMillis', 0))
+            # iTunes leaves out fields it has no value for; the page expects strings
+            latest_episodes.append({field: '' if episode.get(field) is None else episode[field] for field in LATEST_EPISODE_FIELDS})
+    latest_episodes.sort(key=lambda x: x['releaseDate'] or '', reverse=True)
+    return latest_episodes, complete
+
+def cached_latest_episodes():
+    """
+    Return the merged latest episodes from the cache, building them on a miss.
+
+    The cache key contains the library and feed versions, so adding or removing a
+    podcast, or refreshing feeds, starts a new list. Only one request per process
+    builds the list; the others wait for it.
+
+    :return: list of episode dicts
+    """
+    key = f"latest_episodes:{http_cache.version_etag(http_cache.LIBRARY)}:{http_cache.version_etag(http_cache.FEEDS)}"
+    latest_episodes = cache.get(key)
+    if latest_episodes is not None:
+        return latest_episodes
+    with _latest_episodes_lock:
+        latest_episodes = cache.get(key)
+        if latest_episodes is None:
+            with profiling.stage('latest_episodes'):
+                latest_episodes, complete = build_latest_episodes()
+            cache.set(key, latest_episodes, LATEST_EPISODES_TTL if complete else LATEST_EPISODES_PARTIAL_TTL)
+    return latest_episodes
+
+@http_cache.compress_page
+@conditional_page
+def latest_episodes_view(request):
+    """
+    Get a page of the latest episodes of all podcasts in the library.
+
+    The home page loads this after rendering, so it does not wait for iTunes.
+    Pages are slices of a cached list, see cached_latest_episodes.
+
+    :param request: HttpRequest object with an optional `page`
+    :return: JsonResponse with the episodes and pagination information
+    :rtype: JsonResponse
+    """
+    paginator = Paginator(cached_latest_episodes(), 10)
+    episodes_page = paginator.get_page(request.GET.get('page'))
+    return JsonResponse({
+        'episodes': list(episodes_page),
+        'current_page': episodes_page.number,
+        'total_pages': paginator.num_pages,
+        'has_next': episodes_page.has_next(),
+        'has_previous': episodes_page.has_previous(),
+        'next_page': episodes_page.next_page_number() if episodes_page.has_next() else None,
+        'previous_page': episodes_page.previous_page_number() if episodes_page.has_previous() else None,
+    })
+
+@http_cache.compress_page
+@conditional_page
 def get_podcast_episodes_view(request):
     """
     Get podcast episodes for a given podcast ID.
 
     This function retrieves the episodes of a podcast from iTunes
     based on the provided podcast ID. The episodes are paginated and
-    sorted by release date in descending order.
+    sorted by release date in descending order. Pages carry the release
+    date of the latest episode as Last-Modified and may be reused by the
+    browser for EPISODES_MAX_AGE seconds.
 
     :param request: HttpRequest object
     :return: JsonResponse with the podcast episodes and pagination information
@@ -731,7 +1319,11 @@ def get_podcast_episodes_view(request):
     podcast_id = request.GET.get('podcast_id')
     page = request.GET.get('page', 1)
     
-    episodes = get_podcast_episodes(podcast_id)
+    try:
+        episodes = get_podcast_episodes(podcast_id)
+    except itunes.ItunesUnavailable as e:
+        logger.warning(f"iTunes lookup of podcast {podcast_id} failed: {str(e)}")
+        return itunes_unavailable_response(e)
     for episode in episodes:
         episode['duration_minutes'] = duration_in_minutes(episode.get('trackTimeMillis', 0))
     episodes.sort(key=lambda x: x['releaseDate'], reverse=True)
@@ -745,7 +1337,7 @@ def get_podcast_episodes_view(request):
     except EmptyPage:
         episodes_page = paginator.page(paginator.num_pages)
     
-    return JsonResponse({
+    response = JsonResponse({
         'episodes': list(episodes_page),
         'current_page': episodes_page.number,
         'total_pages': paginator.num_pages,
@@ -754,3 +1346,9 @@ def get_podcast_episodes_view(request):
         'next_page': episodes_page.next_page_number() if episodes_page.has_next() else None,
         'previous_page': episodes_page.previous_page_number() if episodes_page.has_previous() else None,
     })
+    # The catalogue only changes when a new episode is released
+    latest_release = parse_datetime(episodes[0]['releaseDate']) if episodes else None
+    if latest_release:
+        response['Last-Modified'] = http_date(latest_release.timestamp())
+    patch_cache_control(response, max_age=http_cache.EPISODES_MAX_AGE)
+    return response